@@ -7,25 +7,51 @@ import altair as alt
 import numpy as np
 import plotly.express as px
 
+from data_loader import load_songs, load_main, load_classification
+from aggregates import load_aggregates, month_slice, month_size, article_slice
+from song_search import load_search_index
+from scatter_view import scatter_figure, selected_window
+from paged_table import paged_table
+from pageview_engine import DEFAULT_PROJECT, DEFAULT_YEAR, available_partitions, build_source
+from daily_store import load_daily_store, load_song_metrics
+from artist_credits import CREDIT_RULES, load_artist_rollups
+from genre_taxonomy import ROOT, children, genre_months, load_genre_cube, taxonomy_version
+from lyrics_embeddings import PrototypeLabeller, load_lyrics_index
+from profiling import start_profiler
+from chart_cache import altair_spec, cached, dataset_version, stats as chart_cache_stats
+
 # --- 1. Load Data ---
 
 st.set_page_config(layout="wide", page_title="Song Pageview Leaderboard & Artist Analysis")
-data = pd.read_csv("song_st.csv")
-data2 =  pd.read_csv("main.csv")
-data3 = pd.read_csv("clean_classification.csv")
-
-# Creating tabs so that each section is organized
 
-intro, data_summary, features, classification, hypothesis, visuals, summary = st.tabs(["1. Introduction",
-        "2. Data Summary",
-        "3. New Features",
-        "4. Text Classification",
-        "5. Hypothesis Testing",
-        "6. Interactive Visualization",
-        "7. Summary"
-        ])
-
-with intro:
+# Timing spans for this rerun (a no-op unless profiling is turned on, see profiling.py)
+profiler = start_profiler()
+
+# With pageview dumps for other years or wikis (see pageview_engine.py), the
+# sidebar picks which one the pageview sections show; without them it's song_st.csv.
+# song_st.csv (the 2024 English data) stays in the choices next to the dumps.
+partitions = available_partitions()
+if partitions:
+    partitions = sorted(set(partitions) | {(DEFAULT_PROJECT, DEFAULT_YEAR)})
+    projects = sorted({project for project, _ in partitions})
+    project_index = projects.index(DEFAULT_PROJECT) if DEFAULT_PROJECT in projects else 0
+    selected_project = st.sidebar.selectbox("Wikipedia", projects, index=project_index)
+    years = sorted({year for project, year in partitions if project == selected_project}, reverse=True)
+    selected_year = st.sidebar.selectbox("Year", years)
+    with profiler.span("build pageview source"):
+        songs_path = build_source(selected_project, selected_year)
+else:
+    selected_project, selected_year = DEFAULT_PROJECT, DEFAULT_YEAR
+    songs_path = "song_st.csv"
+
+# Each section below is a function that loads what it needs itself. The loaders
+# cache the parsed files for the whole server process, so a rerun only parses a
+# file again if it changed on disk, and a file only one section uses is only
+# read once someone opens that section.
+
+# --- 2. Sections ---
+
+def intro_section():
 
     # -- Title ---
     st.title("🎶 Interactive Song Pageview Leaderboard & Artist Analysis 🏆")
@@ -61,7 +87,10 @@ with intro:
     st.write("We might see about 80 percent of the total pageview data being dominated by the top artists.")        
 
 
-with data_summary:
+def data_summary_section():
+    with profiler.span("load data") as span:
+        data = span.measure(load_songs(songs_path))
+
     st.header("Data Summary")
     st.write("""
     The data I worked with consists of the 2024 Wikipedia DPDP data for "en.wikipedia" in the US.
@@ -89,11 +118,12 @@ with data_summary:
     st.markdown("-- Descriptive Statistics --")
 
     # Getting the number of unique artists, songs, and genres in my dataset
-    total_unique_artists = data["artist"].nunique()
+    with profiler.span("unique counts"):
+        total_unique_artists = data["artist"].nunique()
 
-    total_unique_songs = data["qid"].nunique()
+        total_unique_songs = data["qid"].nunique()
 
-    total_unique_genres = data["genre"].nunique()
+        total_unique_genres = data["genre"].nunique()
     col1, col2, col3 = st.columns(3)
 
     # Creating columns to display my descriptive statistics
@@ -120,7 +150,10 @@ with data_summary:
         
     st.markdown("---")
 
-with features:
+def features_section():
+    with profiler.span("load main.csv") as span:
+        data2 = span.measure(load_main())
+
     st.header("Features")
     st.write("""
     The new feature that I will be adding to my dataset is theme of the song. 
@@ -131,11 +164,12 @@ with features:
 
     """)
     # Descriptive statistics for this new dataset
-    total_unique_artists2 = data2["artist"].nunique()
+    with profiler.span("unique counts"):
+        total_unique_artists2 = data2["artist"].nunique()
 
-    total_unique_songs2 = data2["qid"].nunique()
+        total_unique_songs2 = data2["qid"].nunique()
 
-    total_unique_genres2 = data2["genre"].nunique()
+        total_unique_genres2 = data2["genre"].nunique()
 
     col4, col5, col6 = st.columns(3)
     # Creating columns to display my descriptive statistics
@@ -163,31 +197,44 @@ with features:
 
     # Showing what the Kaggle data combined with my main csv looks like
     st.markdown("-- My Kaggle datasets merged with main csv --")
-    st.dataframe(data2, use_container_width=True)
+    # Only the visible page is sent to the browser, with the lyrics cut to a preview
+    with profiler.span("main table"):
+        paged_table(data2, key="main_table", label_column="song")
 
     st.markdown("-- The lyrics column in my data -")
-    lyrics_col = data2["lyrics"]
-    st.dataframe(lyrics_col, use_container_width=True, hide_index=True)
+    with profiler.span("lyrics table"):
+        paged_table(data2, key="main_lyrics", columns=["lyrics"], hide_index=True)
+
 
+def classification_section():
+    with profiler.span("load clean_classification.csv") as span:
+        data3 = span.measure(load_classification())
+    # Charts and tables built from the file are shared between sessions (see chart_cache.py)
+    classification_version = dataset_version("clean_classification.csv")
 
-with classification:
     st.header("Classification Results")
     st.write("It is important to note that there will be less songs and artists in this dataset as it is the same one from the previous section but with the classification results added.")
 
     # Showing what the dataset looks like
     st.markdown("-- My dataset with classification label --")
-    st.dataframe(data3, use_container_width=True)
+    with profiler.span("classification table"):
+        paged_table(data3, key="classification_table", label_column="song")
 
     # Showing what is in the column
     st.markdown("-- The column in my data -")
-    song_theme_col = data3["theme"]
-    st.dataframe(song_theme_col, use_container_width=True, hide_index=True)
+    with profiler.span("theme table"):
+        paged_table(data3, key="classification_theme", columns=["theme"], hide_index=True)
+
+    def count_themes():
+        counts = data3["theme"].value_counts().reset_index()
+        counts.columns = ["theme", 'Count'] # Renaming columns for Altair
+        return counts
 
-    distribution_df = data3["theme"].value_counts().reset_index()
-    distribution_df.columns = ["theme", 'Count'] # Renaming columns for Altair
+    with profiler.span("theme counts"):
+        distribution_df = cached("theme_counts", classification_version, (), count_themes)
     
     st.subheader(f"Distribution of Labels in: **{"theme"}**")
-    st.dataframe(distribution_df, use_container_width=True, hide_index=True)
+    profiler.show("theme counts table", st.dataframe, distribution_df, use_container_width=True, hide_index=True)
     chart = alt.Chart(distribution_df).mark_bar().encode(
         # X-axis is theme, sorting by count with y-axis descending
         x=alt.X("theme", sort='-y', title="theme"), 
@@ -204,11 +251,64 @@ with classification:
         title=f"Label Distribution for '{"theme"}'"
     ).interactive() # Zooming and panning
 
-    # Display the chart in Streamlit
-    st.altair_chart(chart, use_container_width=True)
+    # Display the chart in Streamlit (the finished spec is built once and shared)
+    theme_spec = altair_spec("theme_chart", classification_version, (), lambda: chart)
+    profiler.show("theme chart", st.vega_lite_chart, theme_spec, use_container_width=True)
+
+    # --- Songs Like This ---
+    st.subheader("Songs Like This")
+    # Memory-mapped lyrics embeddings (see lyrics_embeddings.py), or None if they haven't been built
+    with profiler.span("load lyrics index"):
+        lyrics_index = load_lyrics_index()
+    if lyrics_index is None:
+        st.info("Run `python lyrics_embeddings.py` to build the lyrics index for this section.")
+        return
+
+    st.write("Songs whose lyrics are closest to the chosen song's (cosine similarity of their lyrics embeddings). "
+             "The prototype theme is the theme whose songs' lyrics are, on average, closest to this song's, "
+             "a much cheaper guess than running the zero-shot model again.")
+    song_options = lyrics_index.songs['qid'].tolist()
+    song_names = dict(zip(lyrics_index.songs['qid'], lyrics_index.songs['song'] + " - " + lyrics_index.songs['artist']))
+    similar_qid = st.selectbox(
+        "Find songs like:",
+        options=song_options,
+        format_func=song_names.get,
+        key='similar_song'
+    )
+    index_version = dataset_version(lyrics_index.path)
+    song_themes = data3[['qid', 'theme']].astype(str).drop_duplicates('qid')
+
+    def find_similar():
+        similar = lyrics_index.similar(similar_qid, 10)
+        # The zero-shot theme of each similar song, next to its similarity ("—" for songs
+        # the index has but clean_classification.csv no longer does)
+        return similar.merge(song_themes, on='qid', how='left').fillna({'theme': "—"})
+
+    with profiler.span("similar songs"):
+        similar_songs = cached("similar_songs", (index_version, classification_version), (similar_qid,), find_similar)
+        labeller = cached(
+            "theme_prototypes", (index_version, classification_version), (),
+            lambda: PrototypeLabeller(lyrics_index, song_themes.set_index('qid')['theme'])
+        )
+        prototype_theme = labeller.predict(lyrics_index.vector(similar_qid))[0]
+
+    zero_shot_theme = song_themes.set_index('qid')['theme'].get(similar_qid, "—")
+    st.markdown(f"Zero-shot theme: **{zero_shot_theme}** · Prototype theme: **{prototype_theme}**")
+    profiler.show(
+        "similar songs table", st.dataframe,
+        similar_songs[['song', 'artist', 'theme', 'similarity']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "song": "Song",
+            "artist": "Artist",
+            "theme": "Theme",
+            "similarity": st.column_config.ProgressColumn("Similarity", format="%.2f", min_value=0.0, max_value=1.0),
+        }
+    )
 
 
-with hypothesis:
+def hypothesis_section():
     st.write("Below is the way I investigated the distribution of page views across all the artists in the data.")
     # --- Top N Artist Total Pageview Analysis ---
     st.header("Top N Artist Total Accumulated Pageview Analysis (All Months)")
@@ -216,55 +316,69 @@ with hypothesis:
 
 
     # --- Data Preparation for Artist Analysis (Uses ALL data for ACCUMULATED total) ---
-    # 1. Summarize and Sort
-    artist_summary = data.groupby('artist')['monthly_pageviews'].sum().reset_index()
-    artist_summary.columns = ['artist', 'total_pageviews']
-    artist_summary = artist_summary.sort_values(by='total_pageviews', ascending=False).reset_index(drop=True)
-
-    # 2. Calculate Programmatic Jump Detection
-
-    # 2a. Calculate the drop-off rate between sequential artists
-    # Shift(-1) brings the pageviews of the *next* artist into the current artist's row
-    artist_summary['next_artist_views'] = artist_summary['total_pageviews'].shift(-1)
-    artist_summary['view_drop'] = artist_summary['total_pageviews'] - artist_summary['next_artist_views']
-
-    # Calculate the percentage drop from the current artist's views to the next artist's views
-    artist_summary['pct_drop'] = (artist_summary['view_drop'] / artist_summary['total_pageviews']) * 100
-
-    # Drop the last row which will have NaN for the next artist's views
-    artist_summary_analysis = artist_summary.dropna(subset=['next_artist_views']).copy() 
-
-    # 2b. Define and Identify the Jump
-    # Setting a threshold of 60 percent
-    JUMP_THRESHOLD_PCT = 60 
-
-    # Find the first major separation point
-    jump_point = artist_summary_analysis[artist_summary_analysis['pct_drop'] >= JUMP_THRESHOLD_PCT].head(1)
-
-    # 2c. Display the Jump Detection Result
-    # Initialize a safe default value for the jump artist
-    jump_artist = "" 
-    jump_index = -1
+    # Songs with several performers can be credited in different ways (see artist_credits.py)
+    credit_rule = st.radio(
+        "Credit songs with several performers to:",
+        list(CREDIT_RULES),
+        format_func=CREDIT_RULES.get,
+        horizontal=True,
+        key='artist_credit_rule'
+    )
+    # Artist tables under the chosen rule, built once per rule and shared
+    with profiler.span("artist rollups") as span:
+        artist_rollups = span.measure(load_artist_rollups(songs_path, credit_rule))
+    # Charts are shared between sessions, keyed by the data and the widget values (see chart_cache.py)
+    songs_version = dataset_version(songs_path)
+
+    # 1. Summarized and sorted artist totals
+    # The drop-off to the next artist (next_artist_views, view_drop, pct_drop) is
+    # precomputed with them, so this is shared and must not be modified
+    artist_summary = artist_rollups['artist_totals']
+
+    # 2. Tier Detection
+    # Every natural break in the artist totals (1-D k-means, see concentration.py)
+    # and the Gini coefficient are precomputed with the other rollups
+    artist_tiers = artist_rollups['artist_tiers']
+    concentration_stats = artist_rollups['concentration'].iloc[0]
+
+    # 2b. Display the Tier Detection Result
+    # The artist at the end of the top tier is highlighted in the chart
+    jump_artist = ""
+
+    if len(artist_tiers) > 1:
+        top_tier = artist_tiers.iloc[0]
+        jump_artist = top_tier['last_artist']
+        if top_tier['artists'] == 1:
+            first_tier = f"**{jump_artist}** alone"
+        else:
+            first_tier = f"the top {top_tier['artists']:,} artists, ending with **{jump_artist}**"
 
-    if not jump_point.empty:
-        jump_artist = jump_point['artist'].iloc[0]
-        jump_percentage = jump_point['pct_drop'].iloc[0]
-        
         st.markdown(f"""
         ### 🚨 Major Viewership Separation Detected!
-        The most significant drop-off occurs after **{jump_artist}**.
+        The artists split into **{len(artist_tiers)} tiers**. The first tier is {first_tier}.
         
-        Pageviews dropped by **<span style='color:red; font-size: 1.2em;'>{jump_percentage:,.2f}%</span>** to the next artist, indicating a clear tier separation.
+        Pageviews dropped by **<span style='color:red; font-size: 1.2em;'>{top_tier['pct_drop_to_next']:,.2f}%</span>** to the next tier, indicating a clear tier separation.
         """, unsafe_allow_html=True)
-        
-        # Store the index of the detected jump for visualization later
-        jump_index = artist_summary[artist_summary['artist'] == jump_artist].index[0]
-    else:
-        st.info("No significant 'big jump' (a drop greater than 60%) was detected between sequential artists.")
-        # jump_artist remains "" and jump_index remains -1, which is safe.
 
-    # 3. Calculate Grand Total and Percentage Metrics
-    grand_total_pageviews = artist_summary['total_pageviews'].sum()
+        profiler.show(
+            "tier table", st.dataframe,
+            artist_tiers[['tier', 'artists', 'first_artist', 'last_artist', 'min_pageviews', 'max_pageviews', 'percent_share', 'pct_drop_to_next']],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "tier": "Tier",
+                "artists": "Artists",
+                "first_artist": "First Artist",
+                "last_artist": "Last Artist",
+                "min_pageviews": st.column_config.NumberColumn("Lowest Total", format="%d"),
+                "max_pageviews": st.column_config.NumberColumn("Highest Total", format="%d"),
+                "percent_share": st.column_config.NumberColumn("% of Pageviews", format="%.2f%%"),
+                "pct_drop_to_next": st.column_config.NumberColumn("Drop to Next Tier", format="%.2f%%"),
+            }
+        )
+    else:
+        st.info("No separate tiers were detected between the artists.")
+        # jump_artist remains "", which is safe.
 
     # --- Artist Analysis Controls ---
     max_artists = len(artist_summary)
@@ -281,9 +395,8 @@ with hypothesis:
     # --- Visualization for Top N Artists ---
     df_top_artists = artist_summary.head(artist_n_slider).copy()
 
-    # Calculate and display the percentage metric
-    top_n_pageviews = df_top_artists['total_pageviews'].sum()
-    percentage_of_total = (top_n_pageviews / grand_total_pageviews) * 100
+    # The share of the top N is read from the precomputed Pareto curve
+    percentage_of_total = artist_summary['cumulative_share'].iloc[artist_n_slider - 1]
 
     st.markdown(f"""
     ### 📊 Key Performance Metric
@@ -308,19 +421,40 @@ with hypothesis:
         # Color based on the jump condition
         color=color_condition,
         # Tooltip setup
-        tooltip=['artist', alt.Tooltip('total_pageviews', format=',', title='Total Pageviews')] 
+        tooltip=['artist', alt.Tooltip('total_pageviews', format=',', title='Total Pageviews'), alt.Tooltip('tier', title='Tier')] 
     ).properties(
         title=f"Top {artist_n_slider} Artists by Total Accumulated Pageviews (All Data)"
     ).interactive()
 
-    st.altair_chart(chart_artists, use_container_width=True)
+    artists_spec = altair_spec("top_artists_chart", songs_version, (credit_rule, artist_n_slider), lambda: chart_artists)
+    profiler.show("top artists chart", st.vega_lite_chart, artists_spec, use_container_width=True)
+
+    # 5. Lorenz Curve: how far the distribution is from every artist getting the same views
+    st.subheader("Lorenz Curve of Artist Pageviews")
+    st.write(f"The Gini coefficient of the artist totals is **{concentration_stats['gini']:.3f}** "
+             "(0 means every artist has the same pageviews, 1 means one artist has all of them).")
+    lorenz = artist_rollups['lorenz']
+    chart_lorenz = alt.Chart(lorenz).mark_line(color='#E91E63').encode(
+        x=alt.X('population_share', title='Share of Artists (smallest first)', axis=alt.Axis(format='%')),
+        y=alt.Y('views_share', title='Share of Pageviews', axis=alt.Axis(format='%')),
+        tooltip=[
+            alt.Tooltip('population_share', format='.1%', title='Artists'),
+            alt.Tooltip('views_share', format='.1%', title='Pageviews'),
+        ]
+    )
+    equality = alt.Chart(pd.DataFrame({'population_share': [0, 1], 'views_share': [0, 1]})).mark_line(
+        color='gray', strokeDash=[4, 4]
+    ).encode(x='population_share', y='views_share')
+    lorenz_spec = altair_spec("lorenz_chart", songs_version, (credit_rule,), lambda: chart_lorenz + equality)
+    profiler.show("lorenz chart", st.vega_lite_chart, lorenz_spec, use_container_width=True)
 
-    # 5. Raw Data Table with Percentage and Cumulative % (as before)
-    df_top_artists['Percentage of Grand Total'] = (df_top_artists['total_pageviews'] / grand_total_pageviews) * 100
-    df_top_artists['Cumulative %'] = df_top_artists['Percentage of Grand Total'].cumsum()
+    # 6. Raw Data Table with Percentage and Cumulative % (precomputed)
+    df_top_artists['Percentage of Grand Total'] = df_top_artists['percent_share']
+    df_top_artists['Cumulative %'] = df_top_artists['cumulative_share']
 
     st.subheader("Raw Data for Top Artists (All Data)")
-    st.dataframe(
+    profiler.show(
+        "top artists table", st.dataframe,
         df_top_artists[['artist', 'total_pageviews', 'Percentage of Grand Total', 'Cumulative %']]
             .rename(columns={'total_pageviews': 'Total Accumulated Pageviews'}), 
         use_container_width=True,
@@ -337,15 +471,28 @@ with hypothesis:
     )
 
 
-with visuals:
+def visuals_section():
+    # Precomputed artist/song rollups (see aggregates.py)
+    with profiler.span("load aggregates") as span:
+        aggs = span.measure(load_aggregates(songs_path))
+
+    # Typeahead index over titles, artists and QIDs for the song comparison picker
+    with profiler.span("load search index"):
+        search_index = load_search_index(songs_path)
+
+    # Memory-mapped daily views (see daily_store.py), or None if it hasn't been built
+    with profiler.span("load daily store"):
+        daily_store = load_daily_store(selected_project, selected_year)
+
+    # Charts are shared between sessions, keyed by the data and the widget values (see chart_cache.py)
+    songs_version = dataset_version(songs_path)
 
     # --- Song Leaderboard Controls ---
     st.header("Top N Song Leaderboard")
     st.markdown("Adjust the controls below to customize the top songs visualization, including selecting a month.")
 
-    # Get unique months for selection
-    # Sorts months and then reverses the order
-    unique_months = sorted(data['month'].unique(), reverse=False) 
+    # Get unique months for selection (already sorted in the precomputed month offsets)
+    unique_months = aggs['month_offsets']['month'].tolist()
 
     col_month, col_count, col_sort = st.columns([1, 1, 1])
 
@@ -359,14 +506,14 @@ with visuals:
 
     with col_count:
         # Leaderboard Count Slider
-        # Filter data for the selected month for accurate length count
-        data_filtered_month = data[data['month'] == selected_month]
+        # Number of songs in the selected month for accurate length count
+        month_song_count = month_size(aggs, selected_month)
         
         leaderboard_count = st.slider(
             "Select **Top N** Songs:",
             min_value=10,
             # Max limited to 100 or the total number of songs in the selected month
-            max_value=min(100, len(data_filtered_month)), 
+            max_value=min(100, month_song_count), 
             value=20,
             step=5,
             key='top_n_slider'
@@ -385,11 +532,9 @@ with visuals:
 
     # --- Interactive Top N Leaderboard Visualization (Horizontal Bar Chart) ---
 
-    # Filter the data based on the selected month
-    df_leaderboard = data_filtered_month.sort_values(
-        by='monthly_pageviews', 
-        ascending=False
-    ).head(leaderboard_count).copy()
+    # The month's songs are already ranked, so this is just a slice of the top rows
+    with profiler.span("month slice"):
+        df_leaderboard = month_slice(aggs, selected_month, leaderboard_count).copy()
 
 
     if sort_option == 'Song Name (Alphabetical)':
@@ -411,11 +556,13 @@ with visuals:
         title=f"Top {leaderboard_count} Songs by Monthly Pageviews in {selected_month}"
     ).interactive()
 
-    st.altair_chart(chart_leaderboard, use_container_width=True)
+    leaderboard_spec = altair_spec("leaderboard_chart", songs_version,
+                                   (selected_month, leaderboard_count, sort_option), lambda: chart_leaderboard)
+    profiler.show("leaderboard chart", st.vega_lite_chart, leaderboard_spec, use_container_width=True)
 
     st.subheader(f"Raw Data for Top Songs in {selected_month}")
     # Display the raw data for the visualized subset
-    st.dataframe(df_leaderboard[['article', 'monthly_pageviews']].rename(
+    profiler.show("leaderboard table", st.dataframe, df_leaderboard[['article', 'monthly_pageviews']].rename(
         columns={'article': 'Song Name', 'monthly_pageviews': 'Monthly Pageviews'}), 
         use_container_width=True
     )
@@ -424,13 +571,8 @@ with visuals:
     # --- TOTAL ACCUMULATION SECTION ---
     st.write("## 🏆 Overall Top Songs")
 
-    # 1. Aggregate by BOTH Article and Artist
-    df_total_stats = data.groupby(['article', 'artist'])['monthly_pageviews'].sum().reset_index()
-    df_total_stats.rename(columns={'monthly_pageviews': 'total_pageviews'}, inplace=True)
-
-    # Calculate the % share
-    total_site_views = df_total_stats['total_pageviews'].sum()
-    df_total_stats['percent_share'] = (df_total_stats['total_pageviews'] / total_site_views) * 100
+    # 1. Totals by BOTH Article and Artist, with the % share (precomputed, sorted high to low)
+    df_total_stats = aggs['song_totals']
 
     # 2. Controls
     col_acc_1, col_acc_2 = st.columns([1, 1])
@@ -453,13 +595,14 @@ with visuals:
 
     # 3. Sorting Logic
     if total_sort == 'Song Name (A-Z)':
-        df_display_total = df_total_stats.nlargest(total_n, 'total_pageviews').sort_values('article')
+        df_display_total = df_total_stats.head(total_n).sort_values('article')
         y_sort_acc = None
     else:
-        df_display_total = df_total_stats.nlargest(total_n, 'total_pageviews')
+        df_display_total = df_total_stats.head(total_n)
         y_sort_acc = alt.EncodingSortField(field="total_pageviews", order='descending')
 
     # 4. Visualization 
+    df_display_total = df_display_total[['article', 'artist', 'total_pageviews', 'percent_share']]
     chart_total = alt.Chart(df_display_total).mark_bar(color='#29b5e8').encode(
         y=alt.Y('article:N', sort=y_sort_acc, title=None),
         x=alt.X('total_pageviews:Q', title='Total Accumulated Pageviews', axis=alt.Axis(format='~s')),
@@ -474,11 +617,13 @@ with visuals:
         height=400
     ).interactive()
 
-    st.altair_chart(chart_total, use_container_width=True)
+    total_spec = altair_spec("overall_songs_chart", songs_version, (total_n, total_sort), lambda: chart_total)
+    profiler.show("overall songs chart", st.vega_lite_chart, total_spec, use_container_width=True)
 
     # 5. Raw Data 
     st.write("### Data Summary")
-    st.dataframe(
+    profiler.show(
+        "overall songs table", st.dataframe,
         df_display_total.rename(columns={
             'article': 'Song Name', 
             'artist': 'Artist', 
@@ -495,41 +640,63 @@ with visuals:
     st.markdown("---")
     st.subheader("🎯 Viral Hits vs. Steady Favorites")
 
-    # 1. Aggregate data (Removed 'genre' and 'qid' to keep it simple)
-    df_total_stats = data.groupby(['article', 'artist']).agg({
-        'monthly_pageviews': 'sum'
-    }).reset_index()
-    df_total_stats.rename(columns={'monthly_pageviews': 'total_pageviews'}, inplace=True)
-
-    # 2. Get the Peak Monthly views
-    peak_monthly = data.groupby('article')['monthly_pageviews'].max().reset_index()
-    peak_monthly.rename(columns={'monthly_pageviews': 'peak_month_views'}, inplace=True)
-
-    # 3. Merge 
-    df_scatter = pd.merge(df_total_stats, peak_monthly, on='article')
-
-    # 4. Visualization 
-    fig_scatter = px.scatter(
-        df_scatter, 
-        x="total_pageviews", 
-        y="peak_month_views",
-        hover_name="article", 
-        hover_data={
-            "artist": True,
-            "total_pageviews": ":,",
-            "peak_month_views": ":,"
-        },
-        title="Song Performance: Total Volume vs. Highest Monthly Spike",
-        labels={
-            "total_pageviews": "Total Yearly Views",
-            "peak_month_views": "Highest Monthly Peak"
-        }
+    # 1. Total and Peak Monthly views per song are both precomputed in song_totals
+    df_scatter = df_total_stats[['article', 'artist', 'total_pageviews', 'peak_month_views']]
+
+    # 2. Visualization
+    # The top songs and outliers are drawn as dots and the crowded low-traffic
+    # songs as hexagon bins (WebGL), so the chart stays light with any number of songs.
+    # Drawing a box zooms in, and the songs inside are split and binned again.
+    scatter_window = st.session_state.get('scatter_window')
+    # The window is a dict, so the cache key uses its ranges
+    window_key = (tuple(scatter_window['x']), tuple(scatter_window['y'])) if scatter_window else None
+    with profiler.span("scatter build"):
+        fig_scatter, scatter_stats = cached("scatter_chart", songs_version, (window_key,), lambda: scatter_figure(
+            df_scatter,
+            x="total_pageviews",
+            y="peak_month_views",
+            hover_name="article",
+            hover_data=("artist",),
+            title="Song Performance: Total Volume vs. Highest Monthly Spike",
+            labels={
+                "total_pageviews": "Total Yearly Views",
+                "peak_month_views": "Highest Monthly Peak",
+                "artist": "artist"
+            },
+            window=scatter_window
+        ))
+
+    # Zooming and resetting happen in widget callbacks, so only this tab's
+    # fragment is redrawn with the new window, not the whole app
+    scatter_key = f"scatter_chart_{scatter_window}"
+
+    def zoom_in():
+        new_window = selected_window(st.session_state[scatter_key])
+        if new_window is not None:
+            st.session_state['scatter_window'] = new_window
+
+    def reset_zoom():
+        st.session_state.pop('scatter_window', None)
+
+    profiler.show(
+        "scatter chart", st.plotly_chart,
+        fig_scatter,
+        use_container_width=True,
+        on_select=zoom_in,
+        selection_mode="box",
+        key=scatter_key
     )
 
-    # Setting a single color for all dots 
-    fig_scatter.update_traces(marker=dict(size=12, color='#29b5e8', opacity=0.7))
-
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    col_zoom, col_reset = st.columns([4, 1])
+    with col_zoom:
+        st.caption(
+            f"{scatter_stats['songs']:,} songs in view: {scatter_stats['points']:,} shown as dots, "
+            f"{scatter_stats['binned_songs']:,} counted in {scatter_stats['bins']:,} hexagons. "
+            "Draw a box to zoom in."
+        )
+    with col_reset:
+        if scatter_window is not None:
+            st.button("Reset zoom", on_click=reset_zoom, key="scatter_reset")
 
     
     # Last visual:
@@ -538,15 +705,23 @@ with visuals:
     # 1. Setup the Selection Controls
     col_select, col_slider = st.columns([2, 1])
 
-    # Get all unique songs for the multiselect
-    all_songs = sorted(data['article'].unique())
-
     with col_select:
+        # Only the songs matching the search (plus the ones already chosen) are
+        # sent to the browser as options, instead of every title
+        search_query = st.text_input(
+            "Search songs by title, artist or QID:",
+            key='comparison_search'
+        )
+        default_songs = df_total_stats.head(3)['article'].tolist() # Default to look at Top 3
+        chosen = st.session_state.get('comparison_multiselect', default_songs)
+        with profiler.span("song search"):
+            options = list(dict.fromkeys(chosen + search_index.titles(search_query, k=20)))
+
         # Search and select specific songs
         selected_songs = st.multiselect(
             "Choose specific songs to compare:",
-            options=all_songs,
-            default=df_total_stats.nlargest(3, 'total_pageviews')['article'].tolist(), # Default to look at Top 3
+            options=options,
+            default=default_songs,
             key='comparison_multiselect'
         )
 
@@ -562,79 +737,223 @@ with visuals:
 
     # 2. Combine the logic
     if top_n_to_add > 0:
-        top_songs = df_total_stats.nlargest(top_n_to_add, 'total_pageviews')['article'].tolist()
+        top_songs = df_total_stats.head(top_n_to_add)['article'].tolist()
         # Using set() to ensure we don't have duplicate song names
         final_song_list = list(set(selected_songs + top_songs))
     else:
         final_song_list = selected_songs
 
+    # Daily and weekly trends need the daily store; otherwise only monthly is available
+    resolution = "Monthly"
+    if daily_store is not None:
+        resolution = st.radio(
+            "Resolution:",
+            ["Monthly", "Weekly", "Daily"],
+            horizontal=True,
+            key='trend_resolution'
+        )
+
     # 3. Filter and Plot
     if not final_song_list:
         st.warning("Please select at least one song to see the trend.")
-    else:
-        # Filter original data based on the chosen list
-        df_trends = data[data['article'].isin(final_song_list)]
+    elif resolution == "Monthly":
+        def build_monthly_trends():
+            # Only the chosen songs' rows are read, through the article index
+            df_trends = article_slice(aggs, final_song_list)
+
+            # Create the Line Chart
+            fig = px.line(
+                df_trends,
+                x='month',
+                y='monthly_pageviews',
+                color='article',
+                markers=True,
+                title="Monthly View Trends: Comparison",
+                labels={'monthly_pageviews': 'Views', 'month': 'Month'}
+            )
+            
+            fig.update_layout(
+                hovermode="x unified",
+                xaxis={'categoryorder':'category ascending'} # Ensures Jan comes before Feb
+            )
+            return fig
+
+        with profiler.span("trend chart build"):
+            fig_trends = cached("monthly_trends", songs_version, tuple(sorted(final_song_list)), build_monthly_trends)
         
-        # Create the Line Chart
-        fig_trends = px.line(
-            df_trends,
+        profiler.show("trend chart", st.plotly_chart, fig_trends, use_container_width=True)
+    else:
+        def build_daily_trends():
+            # Only the chosen songs' rows of the daily matrix are read
+            df_trends = daily_store.series(final_song_list, freq="W" if resolution == "Weekly" else "D")
+
+            fig = px.line(
+                df_trends,
+                x='date',
+                y='views',
+                color='article',
+                title=f"{resolution} View Trends: Comparison",
+                labels={'views': 'Views', 'date': 'Week of' if resolution == "Weekly" else 'Day'}
+            )
+            fig.update_layout(hovermode="x unified")
+            return fig
+
+        with profiler.span("trend chart build"):
+            fig_trends = cached(f"{resolution.lower()}_trends", dataset_version(daily_store.path),
+                                tuple(sorted(final_song_list)), build_daily_trends)
+        profiler.show("trend chart", st.plotly_chart, fig_trends, use_container_width=True)
+
+        # Spike and decay metrics of the chosen songs, computed for every song at once
+        with profiler.span("song metrics") as span:
+            song_metrics = span.measure(load_song_metrics(selected_project, selected_year))
+            chosen_metrics = song_metrics[song_metrics['article'].isin(final_song_list)].copy()
+            chosen_metrics['peak_share'] = chosen_metrics['peak_share'] * 100
+        profiler.show(
+            "song metrics table", st.dataframe,
+            chosen_metrics[['article', 'total_views', 'peak_date', 'peak_views', 'peak_share',
+                            'spike_days', 'longest_burst', 'half_life_days']],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "peak_share": st.column_config.NumberColumn("Best Day Share", format="%.1f%%"),
+                "spike_days": "Spike Days",
+                "longest_burst": "Longest Burst (days)",
+                "half_life_days": "Days to Half of Peak Week",
+            }
+        )
+
+
+def genres_section():
+    st.header("Genres: Drill Down and Roll Up")
+    st.write("Genres are grouped into a hierarchy (see genre_taxonomy.py), so you can start from the genre "
+             "families and drill down to the individual genres, then roll back up. A genre can belong to "
+             "several families (synth-pop is both pop and electronic music), so the children of a genre "
+             "can add up to more than the genre itself.")
+
+    # Genre x month pageviews, precomputed for every level of the hierarchy
+    with profiler.span("load genre cube") as span:
+        genre_cube = span.measure(load_genre_cube(songs_path))
+    # The cube (and so its charts) changes with the data and with the taxonomy
+    genre_version = (dataset_version(songs_path), taxonomy_version())
+
+    # The genres drilled into so far, from the top; the last one is shown.
+    # It starts over when a genre in it is gone (another source or taxonomy).
+    genre_path = st.session_state.get('genre_path') or [ROOT]
+    if not set(genre_path) <= set(genre_cube['nodes']['genre']):
+        genre_path = [ROOT]
+    st.session_state['genre_path'] = genre_path
+    current_genre = genre_path[-1]
+
+    def drill_down():
+        if st.session_state['genre_drill']:
+            st.session_state['genre_path'] = genre_path + [st.session_state['genre_drill']]
+            st.session_state['genre_drill'] = ""
+
+    def roll_up():
+        st.session_state['genre_path'] = genre_path[:-1]
+
+    # Only the current genre's children are read from the cube
+    with profiler.span("genre children"):
+        genre_children = children(genre_cube, current_genre)
+
+    st.markdown("**" + " › ".join(genre_path) + "**")
+    col_up, col_drill = st.columns([1, 3])
+    with col_up:
+        st.button("⬆ Roll Up", on_click=roll_up, disabled=len(genre_path) == 1, key='genre_up')
+    with col_drill:
+        st.selectbox(
+            "Drill down into:",
+            options=[""] + genre_children.loc[genre_children['children'] > 0, 'genre'].tolist(),
+            key='genre_drill',
+            on_change=drill_down
+        )
+
+    if genre_children.empty:
+        st.info(f"{current_genre} has no sub-genres.")
+        return
+
+    def build_genre_chart():
+        return alt.Chart(genre_children).mark_bar(color='#E91E63').encode(
+            x=alt.X('genre', sort='-y', title='Genre', axis=alt.Axis(labelAngle=-45)),
+            y=alt.Y('total_pageviews', title='Total Pageviews', axis=alt.Axis(format='~s')),
+            tooltip=['genre', alt.Tooltip('total_pageviews', format=',', title='Total Pageviews'),
+                     alt.Tooltip('songs', title='Songs'), alt.Tooltip('children', title='Sub-genres')]
+        ).properties(title=f"Pageviews by Genre under {current_genre}")
+
+    genre_spec = altair_spec("genre_chart", genre_version, (current_genre,), build_genre_chart)
+    profiler.show("genre chart", st.vega_lite_chart, genre_spec, use_container_width=True)
+
+    def build_genre_trends():
+        # The ten biggest children, month by month
+        top_genres = genre_children['genre'].head(10).tolist()
+        fig = px.line(
+            genre_months(genre_cube, top_genres),
             x='month',
             y='monthly_pageviews',
-            color='article',
+            color='genre',
             markers=True,
-            title="Monthly View Trends: Comparison",
+            title=f"Monthly Pageviews of the Top Genres under {current_genre}",
             labels={'monthly_pageviews': 'Views', 'month': 'Month'}
         )
-        
-        fig_trends.update_layout(
-            hovermode="x unified",
-            xaxis={'categoryorder':'category ascending'} # Ensures Jan comes before Feb
-        )
-        
-        st.plotly_chart(fig_trends, use_container_width=True)
+        fig.update_layout(hovermode="x unified")
+        return fig
 
+    with profiler.span("genre trend build"):
+        fig_genres = cached("genre_trends", genre_version, (current_genre,), build_genre_trends)
+    profiler.show("genre trend chart", st.plotly_chart, fig_genres, use_container_width=True)
 
-with summary:
+    profiler.show(
+        "genre table", st.dataframe,
+        genre_children[['genre', 'songs', 'total_pageviews', 'children']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "genre": "Genre",
+            "songs": "Songs",
+            "total_pageviews": st.column_config.NumberColumn("Total Pageviews", format="%d"),
+            "children": "Sub-genres",
+        }
+    )
+
+
+def summary_section():
     st.header("Summary & Ethical Considerations ")
     
+    # The lists and percentages come from the precomputed rollups, so they follow the selected data
+    with profiler.span("artist rollups"):
+        summary_rollups = load_artist_rollups(songs_path)
+    with profiler.span("load aggregates"):
+        aggs = load_aggregates(songs_path)
+    summary_artists = summary_rollups['artist_totals']
+    top_ten_artists = summary_artists['artist'].head(10).tolist()
+    top_ten_songs = aggs['song_totals']['article'].drop_duplicates().head(10).tolist()
+    top_artist = top_ten_artists[0] if top_ten_artists else ""
+    top_artist_share = summary_artists['percent_share'].iloc[0] if len(summary_artists) else 0.0
+    top_ten_share = summary_artists['cumulative_share'].iloc[len(top_ten_artists) - 1] if top_ten_artists else 0.0
+    summary_stats = summary_rollups['concentration'].iloc[0]
+
     col7, col8 = st.columns(2)
 
     with col7:
-        st.markdown("""
-        The key takeaways from my investigation show that the top artists are: 
-        1. Taylor Swift
-        2. The Beatles
-        3. Eminem
-        4. Sabrina Carpenter
-        5. Fleetwood Mac
-        6. Kendrick Lamar
-        7. Connie Francis
-        8. Beyonce
-        9. Billie Eilish
-        10. Usher
-        """)
+        st.markdown(
+            "The key takeaways from my investigation show that the top artists are: \n"
+            + "\n".join(f"{number}. {artist}" for number, artist in enumerate(top_ten_artists, start=1))
+        )
     with col8:    
-        st.markdown("""
-        The top songs of 2024 are:
-        1. Clara Bow
-        2. The Twelve Days of Christmas
-        3. American Pie
-        4. Hallelujah
-        5. Yeah!
-        6. Espresso
-        7. Zombie
-        8. Texas Hold'Em
-        9. Y.M.C.A.
-        10. Houdini
-        """)         
-    st.markdown("""
-    These top 10 artists account for **14.88** percent of the total accumulated pageviews.
+        st.markdown(
+            f"The top songs of {selected_year} are:\n"
+            + "\n".join(f"{number}. {song}" for number, song in enumerate(top_ten_songs, start=1))
+        )
+    st.markdown(f"""
+    These top {len(top_ten_artists)} artists account for **{top_ten_share:.2f}** percent of the total accumulated pageviews.
     
-    The most interesting find is the big drop between Taylor Swift and the next person.
+    The most interesting find is the big drop between {top_artist} and the next person.
     
-    Taylor makes up **3.89** percent of the total accumulated pageviews in 2024. 
+    {top_artist} makes up **{top_artist_share:.2f}** percent of the total accumulated pageviews in {selected_year}. 
              
-    Therefore, that means that the rest of the artists make up **96.11** percent of the rest of the accumulated pageviews in 2024.
+    Therefore, that means that the rest of the artists make up **{100 - top_artist_share:.2f}** percent of the rest of the accumulated pageviews in {selected_year}.
+
+    Across all {int(summary_stats['artists']):,} artists, the Gini coefficient of pageviews is **{summary_stats['gini']:.3f}**.
 
     I'm fairly confident that the results are for the most part reliable because in recent times pop artists, especially Taylor Swift, have been dominating the music industry. 
 
@@ -644,4 +963,42 @@ with summary:
 
     My results show that there isn't as big of a bias towards more popular artists in the music industry as I expected. 
 
-    """)
\ No newline at end of file
+    """)
+
+
+# --- 3. Tabs ---
+
+# Creating tabs so that each section is organized
+SECTIONS = {
+    "1. Introduction": intro_section,
+    "2. Data Summary": data_summary_section,
+    "3. New Features": features_section,
+    "4. Text Classification": classification_section,
+    "5. Hypothesis Testing": hypothesis_section,
+    "6. Interactive Visualization": visuals_section,
+    "7. Genres": genres_section,
+    "8. Summary": summary_section,
+}
+
+
+@st.fragment
+def run_section(name, section):
+    """
+    Runs one section as a fragment: a widget inside it reruns only this
+    function, not the whole script or the other sections.
+    """
+    with profiler.section(name):
+        section()
+
+
+# With on_change="rerun" the tabs are lazy: switching tabs reruns the script and
+# only the open tab's section runs (the others aren't built or sent at all)
+tabs = st.tabs(list(SECTIONS), key='section', on_change='rerun')
+for tab, (name, section) in zip(tabs, SECTIONS.items()):
+    if tab.open:
+        with tab:
+            run_section(name, section)
+
+# Profiling waterfall in the sidebar and the span log, with the chart cache's
+# hit rates (only when profiling is on)
+profiler.finish(metrics={"Chart cache": chart_cache_stats})
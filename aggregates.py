@@ -0,0 +1,272 @@
+# Description: Precomputed leaderboard rollups for the Streamlit app
+#
+# The Hypothesis Testing and Interactive Visualization tabs used to group the
+# whole of song_st.csv on every rerun. This module builds those rollups once:
+#   - artist_totals:  total pageviews per artist, sorted, with the drop to the next artist,
+#                     its % share, the cumulative (Pareto) share and its tier
+#   - artist_tiers:   the natural tiers of artist totals (see concentration.py)
+#   - lorenz:         Lorenz curve of artist totals
+#   - concentration:  one row with the Gini coefficient and the tier count
+#   - song_totals:    total pageviews, % share and peak month per (song, artist), sorted
+#   - monthly_ranked: every monthly row, grouped by month and ranked within the month
+#   - month_offsets:  where each month starts and stops inside monthly_ranked
+#   - article_rows:   every monthly row, grouped by song title (for the trend chart)
+#   - article_offsets: where each title starts and stops inside article_rows
+#
+# Build the files with:
+#     python aggregates.py
+# The app calls load_aggregates(), which reads the files in aggregates/ and falls
+# back to building them in memory when they are missing or older than the csv.
+import bisect
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from concentration import build_concentration
+from data_loader import DATA_DIR, _file_signature, load_cached, load_songs, songs_source
+
+AGGREGATES_DIR = os.path.join(DATA_DIR, "aggregates")
+TABLES = (
+    "artist_totals", "artist_tiers", "lorenz", "concentration",
+    "song_totals", "monthly_ranked", "month_offsets", "article_rows", "article_offsets",
+)
+
+
+def build_aggregates(data):
+    """
+    Computes every leaderboard rollup from the monthly pageview table.
+
+    Args:
+        data (pd.DataFrame): Rows shaped like song_st.csv.
+
+    Returns:
+        dict: Table name -> DataFrame (see TABLES).
+    """
+    # --- 1. Artist totals (Hypothesis Testing tab) ---
+    artist_totals = data.groupby('artist', observed=True)['monthly_pageviews'].sum().reset_index()
+    artist_totals.columns = ['artist', 'total_pageviews']
+    artist_tables = build_artist_tables(artist_totals)
+
+    # --- 2. Song totals and peak month (leaderboard and scatter) ---
+    song_totals = data.groupby(['article', 'artist'], observed=True)['monthly_pageviews'].agg(
+        total_pageviews='sum',
+        peak_month_views='max',
+    ).reset_index()
+    total_site_views = song_totals['total_pageviews'].sum()
+    song_totals['percent_share'] = (song_totals['total_pageviews'] / total_site_views) * 100
+    song_totals = song_totals.sort_values(
+        by=['total_pageviews', 'article'],
+        ascending=[False, True]
+    ).reset_index(drop=True)
+
+    # --- 3. Ranked songs per month (Song Leaderboard) ---
+    monthly_ranked = data[['month', 'article', 'artist', 'qid', 'monthly_pageviews']].sort_values(
+        by=['month', 'monthly_pageviews', 'article'],
+        ascending=[True, False, True],
+        kind='mergesort'
+    ).reset_index(drop=True)
+    monthly_ranked['rank'] = (monthly_ranked.groupby('month').cumcount() + 1).astype('int32')
+
+    # --- 4. Start/stop row of each month inside monthly_ranked ---
+    months = np.sort(monthly_ranked['month'].unique())
+    month_values = monthly_ranked['month'].to_numpy()
+    month_offsets = pd.DataFrame({
+        'month': months.astype('int32'),
+        'start': np.searchsorted(month_values, months, side='left').astype('int64'),
+        'stop': np.searchsorted(month_values, months, side='right').astype('int64'),
+    })
+
+    # --- 5. Rows grouped by song title (comparison trend chart) ---
+    # A stable sort keeps each title's rows in their original (month) order
+    article_rows = data[['year', 'month', 'article', 'artist', 'monthly_pageviews']].reset_index(drop=True)
+    first_seen = pd.Series(np.arange(len(article_rows)), dtype='int64')
+    order = article_rows['article'].argsort(kind='stable').to_numpy()
+    article_rows = article_rows.iloc[order].reset_index(drop=True)
+    first_seen = first_seen.iloc[order].to_numpy()
+
+    # --- 6. Start/stop row of each title inside article_rows ---
+    article_values = article_rows['article'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, article_values[1:] != article_values[:-1]])
+    if not len(article_values):
+        starts = starts[:0]
+    article_offsets = pd.DataFrame({
+        'article': article_values[starts],
+        'start': starts.astype('int64'),
+        'stop': np.r_[starts[1:], len(article_values)].astype('int64'),
+        # Row of the title's first appearance in the data, to keep the chart's legend order
+        'first_seen': first_seen[starts],
+    })
+
+    return {
+        **artist_tables,
+        'song_totals': song_totals,
+        'monthly_ranked': monthly_ranked,
+        'month_offsets': month_offsets,
+        'article_rows': article_rows,
+        'article_offsets': article_offsets,
+    }
+
+
+def build_artist_tables(artist_totals):
+    """
+    Sorts artist totals and adds the drop-off, shares and concentration tables.
+
+    Args:
+        artist_totals (pd.DataFrame): artist and total_pageviews, one row per artist
+            (from song_st.csv, or from artist_credits.py under another credit rule).
+
+    Returns:
+        dict: artist_totals, artist_tiers, lorenz and concentration.
+    """
+    artist_totals = artist_totals.sort_values(by='total_pageviews', ascending=False, kind='mergesort').reset_index(drop=True)
+
+    # Drop-off between each artist and the next one down the ranking
+    artist_totals['next_artist_views'] = artist_totals['total_pageviews'].shift(-1)
+    artist_totals['view_drop'] = artist_totals['total_pageviews'] - artist_totals['next_artist_views']
+    artist_totals['pct_drop'] = (artist_totals['view_drop'] / artist_totals['total_pageviews']) * 100
+
+    # Shares, Pareto curve, Lorenz curve, Gini and tiers in one pass over the sorted totals
+    concentration = build_concentration(artist_totals)
+    artist_totals = pd.concat([artist_totals, concentration.pop('artist_shares')], axis=1)
+    return {'artist_totals': artist_totals, **concentration}
+
+
+def save_aggregates(aggs, out_dir=AGGREGATES_DIR):
+    """Writes each rollup to out_dir/<table>.parquet."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in TABLES:
+        aggs[name].to_parquet(os.path.join(out_dir, f"{name}.parquet"), index=False)
+
+
+def _is_fresh(out_dir, source_path):
+    """True if every aggregate file exists and is newer than the source data."""
+    source_mtime = _file_signature(source_path)[0]
+    for name in TABLES:
+        path = os.path.join(out_dir, f"{name}.parquet")
+        if not os.path.exists(path) or os.stat(path).st_mtime_ns < source_mtime:
+            return False
+    return True
+
+
+def _read_or_build(source_path, out_dir):
+    if _is_fresh(out_dir, source_path):
+        return {name: pd.read_parquet(os.path.join(out_dir, f"{name}.parquet")) for name in TABLES}
+
+    aggs = build_aggregates(load_songs(source_path))
+    try:
+        save_aggregates(aggs, out_dir)
+    except OSError:
+        # Read-only deployments just keep the in-memory copy
+        pass
+    return aggs
+
+
+def aggregates_dir(source="song_st.csv"):
+    """
+    Folder of source's rollups: aggregates/ for song_st.csv, aggregates/<source
+    name>/ for any other source (e.g. another year from pageview_engine.py).
+    """
+    name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    return AGGREGATES_DIR if name == "song_st" else os.path.join(AGGREGATES_DIR, name)
+
+
+def load_aggregates(source="song_st.csv", out_dir=None):
+    """
+    Returns the leaderboard rollups for source, cached for the whole server process.
+
+    The tables are shared between sessions, so .copy() before modifying them.
+    They are saved in aggregates_dir(source) unless out_dir is given.
+    """
+    if out_dir is None:
+        out_dir = aggregates_dir(source)
+    return load_cached(
+        songs_source(source),
+        lambda source_path: _read_or_build(source_path, out_dir),
+        name="aggregates"
+    )
+
+
+def _month_range(aggs, month):
+    """(start, stop) of a month inside monthly_ranked, or None."""
+    offsets = aggs['month_offsets']
+    months = offsets['month'].to_numpy()
+    position = int(np.searchsorted(months, month))
+    if position == len(months) or months[position] != month:
+        return None
+    return int(offsets['start'].iat[position]), int(offsets['stop'].iat[position])
+
+
+def month_slice(aggs, month, n=None):
+    """
+    Returns the top n songs of a month (all of them if n is None), highest views first.
+
+    This is a plain row slice of monthly_ranked, so it costs O(n) no matter
+    how many months or songs are in the data.
+    """
+    month_range = _month_range(aggs, month)
+    if month_range is None:
+        return aggs['monthly_ranked'].iloc[0:0]
+
+    start, stop = month_range
+    if n is not None:
+        stop = min(stop, start + n)
+    return aggs['monthly_ranked'].iloc[start:stop]
+
+
+def month_size(aggs, month):
+    """Number of songs with pageviews in the given month."""
+    month_range = _month_range(aggs, month)
+    if month_range is None:
+        return 0
+    return month_range[1] - month_range[0]
+
+
+def article_slice(aggs, articles):
+    """
+    Returns every monthly row of the given song titles.
+
+    Only the rows of those titles are touched (found with a binary search),
+    instead of scanning the whole table with isin(). The rows are the same as
+    data[data['article'].isin(articles)], grouped by title: titles in the order
+    they first appear in the data, each title's rows in their original order.
+    Charts that split lines by article draw exactly the same thing.
+
+    Args:
+        aggs (dict): Output of load_aggregates().
+        articles (list): Song titles.
+
+    Returns:
+        pd.DataFrame: year, month, article, artist, monthly_pageviews.
+    """
+    offsets = aggs['article_offsets']
+    # bisect on the column's array reads ~20 titles per lookup; converting the
+    # whole column with to_numpy() or searchsorted() would copy every title
+    titles = offsets['article'].array
+    positions = []
+    for article in set(articles):
+        position = bisect.bisect_left(titles, article)
+        if position < len(titles) and titles[position] == article:
+            positions.append(position)
+
+    found = offsets.iloc[positions].sort_values('first_seen')
+    rows = [np.arange(start, stop) for start, stop in zip(found['start'].tolist(), found['stop'].tolist())]
+    if not rows:
+        return aggs['article_rows'].iloc[0:0]
+    return aggs['article_rows'].iloc[np.concatenate(rows)]
+
+
+def song_titles(aggs):
+    """Every song title, sorted (the same as sorted(data['article'].unique()))."""
+    return aggs['article_offsets']['article'].tolist()
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "song_st.csv"
+    out_dir = aggregates_dir(source)
+    aggs = build_aggregates(load_songs(source))
+    save_aggregates(aggs, out_dir)
+    for name in TABLES:
+        print(f"{name}: {len(aggs[name]):,} rows")
+    print(f"Saved to {out_dir}")
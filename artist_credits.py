@@ -0,0 +1,278 @@
+# Description: Artist resolution and multi-performer credits for the artist totals
+#
+# song_st.csv has one artist per song: the first Wikidata "performer" value,
+# which is sometimes a bare QID ("Q303") when the fetcher had no label for it,
+# and which drops every other performer of a collaboration. This module:
+#   - resolves performer QIDs to names through a local QID -> label table
+#     (artist_labels.csv, the Wikidata fetcher's label cache and MANUAL_LABELS)
+#   - keeps every performer of every song as a (song, position, artist) relation,
+#     with songs and artists stored as integer codes
+#   - turns that relation into a sparse songs x artists credit matrix, so the
+#     artist totals are one matrix product with the song totals
+#
+# How a song with several performers is credited is a rule (CREDIT_RULES):
+# only the first performer (what song_st.csv does), every performer in full, or
+# an equal split. Changing the rule only changes the matrix weights.
+#
+# Usage:
+#     python artist_credits.py                  # artist totals under every rule
+#     python artist_credits.py --fetch-labels   # look up unresolved performer QIDs on Wikidata
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_loader import DATA_DIR, load_cached, load_songs, songs_source
+from entity_extract import explode_attribute
+
+ENTITIES_PATH = os.path.join(DATA_DIR, "entity_results3.jsonl")
+
+# Local QID -> label table for performers (written by --fetch-labels)
+LABELS_PATH = os.path.join(DATA_DIR, "artist_labels.csv")
+
+# Label cache kept by wikidata_fetcher.py
+FETCHER_LABELS_PATH = os.path.join(DATA_DIR, "wikidata_cache", "labels.json")
+
+# Labels that used to be patched in by hand in the notebook
+MANUAL_LABELS = {"Q1299": "The Beatles"}
+
+QID_PATTERN = re.compile(r"^Q\d+$")
+
+# Rule -> description shown in the app
+CREDIT_RULES = {
+    "first": "First performer only",
+    "full": "Every performer, in full",
+    "split": "Split equally between performers",
+}
+
+
+# --- 1. QID -> label table ---
+
+def load_labels(path=LABELS_PATH):
+    """
+    Returns every known QID -> label.
+
+    The local table wins over the fetcher's cache, which wins over MANUAL_LABELS.
+    """
+    labels = dict(MANUAL_LABELS)
+    if os.path.exists(FETCHER_LABELS_PATH):
+        with open(FETCHER_LABELS_PATH, encoding="utf-8") as file:
+            labels.update(json.load(file))
+    if os.path.exists(path):
+        table = pd.read_csv(path, dtype=str).dropna()
+        labels.update(zip(table["qid"], table["label"]))
+    return labels
+
+
+def fetch_labels(qids, path=LABELS_PATH):
+    """
+    Looks up the labels of qids on Wikidata and adds them to the local table.
+
+    Returns:
+        int: Number of new labels.
+    """
+    # Only needed (with network access) when labels are actually fetched
+    from wikidata_fetcher import WikidataFetcher
+
+    found = WikidataFetcher().fetch_labels(list(dict.fromkeys(qids)))
+
+    table = pd.read_csv(path, dtype=str) if os.path.exists(path) else pd.DataFrame({"qid": [], "label": []})
+    new = {qid: label for qid, label in found.items() if qid not in set(table["qid"])}
+    table = pd.concat([table, pd.DataFrame({"qid": list(new), "label": list(new.values())})], ignore_index=True)
+    table.sort_values("qid").to_csv(path, index=False)
+    return len(new)
+
+
+def resolve_artists(values, labels):
+    """
+    Replaces performer values that are bare QIDs with their label.
+
+    Args:
+        values (pd.Series): Performer names (some may be QIDs).
+        labels (dict): QID -> label.
+
+    Returns:
+        pd.Series: Same index; QIDs without a label are kept as they are.
+    """
+    values = values.astype(object)
+    is_qid = values.astype(str).str.fullmatch(QID_PATTERN.pattern) & values.notna()
+    resolved = values.copy()
+    resolved[is_qid] = values[is_qid].map(lambda qid: labels.get(qid, qid))
+    return resolved
+
+
+# --- 2. Song -> performers relation ---
+
+def performer_relation(songs, entities_path=ENTITIES_PATH, labels=None):
+    """
+    Every (song, performer) pair, with performer QIDs resolved to names.
+
+    Performers come from the "performer" attribute in entity_results3.jsonl
+    (every value when the fetcher kept several). Songs that aren't in the file
+    keep the single artist of the pageview table.
+
+    Args:
+        songs (pd.DataFrame): qid and artist per song (e.g. song_st.csv rows).
+        entities_path (str): jsonl file written by wikidata_fetcher.py.
+        labels (dict): QID -> label (default: load_labels()).
+
+    Returns:
+        pd.DataFrame: qid, position (0 = first performer) and artist, one row per pair.
+    """
+    if labels is None:
+        labels = load_labels()
+
+    songs = songs[["qid", "artist"]].dropna(subset=["qid"]).astype({"qid": object, "artist": object})
+    songs = songs.drop_duplicates(subset="qid")
+
+    if os.path.exists(entities_path):
+        performers = explode_attribute(entities_path, key="performer", column="artist")
+        performers = performers.astype({"artist": object})
+        performers = performers[performers["qid"].isin(set(songs["qid"]))]
+    else:
+        performers = pd.DataFrame({"qid": [], "position": [], "artist": []})
+
+    fallback = songs[~songs["qid"].isin(set(performers["qid"]))].dropna(subset=["artist"])
+    fallback = fallback.assign(position=0)[["qid", "position", "artist"]]
+
+    relation = pd.concat([performers[["qid", "position", "artist"]], fallback], ignore_index=True)
+    relation["position"] = relation["position"].astype("int32")
+    relation["artist"] = resolve_artists(relation["artist"], labels)
+    # The same performer listed twice on one song is credited once
+    relation = relation.drop_duplicates(subset=["qid", "artist"]).reset_index(drop=True)
+    return relation
+
+
+class ArtistCredits:
+    """
+    Integer-coded song x artist relation and the credit matrices built from it.
+
+    Args:
+        relation (pd.DataFrame): Output of performer_relation().
+    """
+
+    def __init__(self, relation):
+        song_codes, self.songs = pd.factorize(relation["qid"], sort=True)
+        artist_codes, self.artists = pd.factorize(relation["artist"], sort=True)
+        self.song_codes = song_codes.astype(np.int32)
+        self.artist_codes = artist_codes.astype(np.int32)
+        self.positions = relation["position"].to_numpy(dtype=np.int32)
+        # Number of performers of each row's song
+        self.performers = np.bincount(self.song_codes, minlength=len(self.songs))[self.song_codes]
+        self._matrices = {}
+
+    @property
+    def nbytes(self):
+        return int(self.song_codes.nbytes * 4 + self.songs.memory_usage(deep=True) + self.artists.memory_usage(deep=True))
+
+    def weights(self, rule="first"):
+        """Credit each (song, performer) pair gets under a rule (see CREDIT_RULES)."""
+        if rule == "first":
+            # The lowest position of each song (0, unless a duplicate performer was dropped)
+            lowest = np.full(len(self.songs), np.iinfo(np.int32).max, dtype=np.int32)
+            np.minimum.at(lowest, self.song_codes, self.positions)
+            return (self.positions == lowest[self.song_codes]).astype(np.float64)
+        if rule == "full":
+            return np.ones(len(self.song_codes))
+        if rule == "split":
+            return 1.0 / self.performers
+        raise ValueError(f"Unknown credit rule {rule!r}, expected one of {', '.join(CREDIT_RULES)}")
+
+    def matrix(self, rule="first"):
+        """Sparse songs x artists matrix of the credit weights (built once per rule)."""
+        if rule not in self._matrices:
+            self._matrices[rule] = sparse.csr_matrix(
+                (self.weights(rule), (self.song_codes, self.artist_codes)),
+                shape=(len(self.songs), len(self.artists))
+            )
+        return self._matrices[rule]
+
+    def artist_totals(self, song_views, rule="first"):
+        """
+        Total pageviews per artist.
+
+        Args:
+            song_views (pd.Series): Pageviews per song, indexed by qid.
+            rule (str): Credit rule (see CREDIT_RULES).
+
+        Returns:
+            pd.DataFrame: artist and total_pageviews, sorted like aggregates.py's artist_totals.
+        """
+        views = song_views.reindex(self.songs).fillna(0).to_numpy(dtype=np.float64)
+        totals = self.matrix(rule).T @ views
+        result = pd.DataFrame({"artist": self.artists.to_numpy(), "total_pageviews": totals})
+        result = result[result["total_pageviews"] > 0]
+        if rule != "split":
+            result["total_pageviews"] = result["total_pageviews"].round().astype("int64")
+        return result.sort_values(
+            by=["total_pageviews", "artist"], ascending=[False, True], kind="mergesort"
+        ).reset_index(drop=True)
+
+
+def build_artist_rollups(data, rule="first", credits=None):
+    """
+    Artist tables of the Hypothesis tab (like aggregates.py) under a credit rule.
+
+    Args:
+        data (pd.DataFrame): Rows shaped like song_st.csv.
+        rule (str): Credit rule (see CREDIT_RULES).
+        credits (ArtistCredits): Reused when given.
+
+    Returns:
+        dict: artist_totals, artist_tiers, lorenz and concentration.
+    """
+    from aggregates import build_artist_tables
+
+    if credits is None:
+        credits = ArtistCredits(performer_relation(data))
+    song_views = data.groupby("qid", observed=True)["monthly_pageviews"].sum()
+    song_views.index = song_views.index.astype(object)
+    return build_artist_tables(credits.artist_totals(song_views, rule))
+
+
+def load_artist_credits(source="song_st.csv"):
+    """ArtistCredits of a pageview source, cached for the whole server process."""
+    return load_cached(
+        songs_source(source),
+        lambda source_path: ArtistCredits(performer_relation(load_songs(source))),
+        name="artist_credits"
+    )
+
+
+def load_artist_rollups(source="song_st.csv", rule="first"):
+    """build_artist_rollups() of a pageview source, cached per rule."""
+    return load_cached(
+        songs_source(source),
+        lambda source_path: build_artist_rollups(load_songs(source), rule, load_artist_credits(source)),
+        name=f"artist_rollups_{rule}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve performers and compare artist totals under each credit rule.")
+    parser.add_argument("--source", default="song_st.csv", help="Pageview table")
+    parser.add_argument("--fetch-labels", action="store_true", help="Look up unresolved performer QIDs on Wikidata")
+    parser.add_argument("--top", type=int, default=10, help="Artists listed per rule")
+    args = parser.parse_args()
+
+    data = load_songs(args.source)
+    relation = performer_relation(data)
+    unresolved = relation.loc[relation["artist"].astype(str).str.fullmatch(QID_PATTERN.pattern), "artist"].unique().tolist()
+    if args.fetch_labels and unresolved:
+        added = fetch_labels(unresolved)
+        print(f"Added {added:,} label(s) to {os.path.relpath(LABELS_PATH, DATA_DIR)}")
+        relation = performer_relation(data)
+        unresolved = relation.loc[relation["artist"].astype(str).str.fullmatch(QID_PATTERN.pattern), "artist"].unique().tolist()
+
+    credits = ArtistCredits(relation)
+    collaborations = int((np.bincount(credits.song_codes) > 1).sum())
+    print(f"{len(credits.songs):,} songs, {len(credits.artists):,} artists, {len(relation):,} credits "
+          f"({collaborations:,} songs with several performers, {len(unresolved):,} unresolved QIDs)")
+    for rule, description in CREDIT_RULES.items():
+        tables = build_artist_rollups(data, rule, credits)
+        print(f"\n{description}:")
+        print(tables["artist_totals"][["artist", "total_pageviews", "percent_share"]].head(args.top).to_string(index=False))
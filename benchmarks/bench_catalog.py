@@ -0,0 +1,115 @@
+# Description: Benchmark and golden-output check for song_catalog.py
+#
+# Runs the notebook's title repair (three full passes, copied below as they are
+# in my_collection.ipynb) and its "if qid not in unique_list" QID loop next to
+# song_catalog.split_titles() and build_catalog(), on the same rows, times
+# both, and fails if a single title or the QID order differs.
+#
+# The raw titles are rebuilt from articles_song3.csv the way they come out of
+# the 2024 database: "Title_(Artist_song)", with UTF-8 read as Latin-1.
+#
+# Usage:
+#     python benchmarks/bench_catalog.py               # 1x 10x
+#     python benchmarks/bench_catalog.py --scales 1 10 100 --skip-loop-above 10   # the loop takes minutes at 10x
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import DATA_DIR  # noqa: E402
+from song_catalog import build_catalog, split_titles  # noqa: E402
+
+# --- Reference implementations (verbatim from the notebook) ---
+
+
+def clean_articles(article_title):
+    clean_title = article_title.split("_(")[0]
+    return clean_title
+
+
+def notebook_titles(result):
+    result["article"] = (result["article"].astype(str).str
+                         .encode('latin-1', errors='replace') # Treat the string characters as raw 'latin-1' bytes
+                        .str.decode('utf-8', errors='replace')   # Re-decode the resulting bytes as UTF-8
+    )
+    result["article"] = result["article"].apply(lambda x: clean_articles(x))
+    result["article"] = result["article"].str.replace("_", " ")
+    return result["article"]
+
+
+def notebook_qids(result):
+    qid_list = [qid for qid in result["qid"]]
+    unique_list = []
+    for qid in qid_list:
+        if qid not in unique_list:
+            unique_list.append(qid)
+        else:
+            continue
+    return unique_list
+
+
+# --- Test rows ---
+
+def raw_rows(scale):
+    """articles_song3.csv scale times over, with the titles turned back into raw database titles."""
+    base = pd.read_csv(os.path.join(DATA_DIR, "articles_song3.csv"), usecols=lambda col: not col.startswith("Unnamed"))
+    songs = pd.read_csv(os.path.join(DATA_DIR, "song_st.csv"), usecols=["qid", "artist"]).drop_duplicates("qid")
+    base = base.merge(songs, on="qid", how="left")
+    copies = []
+    for copy in range(scale):
+        part = base.copy()
+        suffix = f"_{copy}" if copy else ""
+        artist = part["artist"].fillna("unknown").astype(str).str.replace(" ", "_", regex=False)
+        raw = part["article"].astype(str).str.replace(" ", "_", regex=False) + suffix + "_(" + artist + "_song)"
+        # UTF-8 bytes read back as Latin-1, like the 2024 database stored them
+        part["article"] = raw.str.encode("utf-8").str.decode("latin-1")
+        part["qid"] = part["qid"].where(part["qid"].isna(), part["qid"].astype(str) + suffix)
+        copies.append(part[["year", "month", "article", "qid", "monthly_pageviews"]])
+    return pd.concat(copies, ignore_index=True)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the notebook's title/QID steps with song_catalog.py.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="Sizes relative to articles_song3.csv")
+    parser.add_argument("--skip-loop-above", type=int, default=1,
+                        help="Skip the notebook's quadratic QID loop above this scale")
+    args = parser.parse_args()
+
+    print(f"{'scale':>5} {'rows':>10} {'songs':>8} {'notebook titles':>16} {'split_titles':>13} "
+          f"{'notebook qids':>14} {'build_catalog':>14}")
+    failed = False
+    for scale in args.scales:
+        rows = raw_rows(scale)
+
+        expected_titles, old_titles = timed(notebook_titles, rows.copy())
+        titles, new_titles = timed(lambda frame: split_titles(frame["article"])["title"], rows)
+        if not expected_titles.equals(titles.rename("article")):
+            failed = True
+            print(f"{scale}x: {(expected_titles != titles).sum():,} titles differ")
+
+        catalog, new_catalog = timed(build_catalog, rows)
+        old_qids = float("nan")
+        if scale <= args.skip_loop_above:
+            expected_qids, old_qids = timed(notebook_qids, rows)
+            # The notebook also wrote the missing QID as "None"/"nan"; the catalog leaves it out
+            expected_qids = [str(qid) for qid in expected_qids if isinstance(qid, str)]
+            if expected_qids != catalog["qid"].tolist():
+                failed = True
+                print(f"{scale}x: the QID order differs")
+
+        print(f"{scale:>4}x {len(rows):>10,} {len(catalog):>8,} {old_titles * 1000:>14.1f}ms {new_titles * 1000:>11.1f}ms "
+              f"{old_qids * 1000:>12.1f}ms {new_catalog * 1000:>12.1f}ms")
+
+    if failed:
+        sys.exit(1)
+    print("\nTitles and QID order match the notebook")
@@ -0,0 +1,97 @@
+# Description: Micro-benchmark for the month and song lookups in aggregates.py
+#
+# Times one interaction of the Song Leaderboard ("top N in month M") and of the
+# comparison trend chart ("rows of these songs") two ways:
+#   - scan:  the original code, data[data['month'] == M] + sort, and
+#            data[data['article'].isin(songs)]
+#   - index: month_slice() and article_slice() on the prebuilt rollups
+# at 1x, 10x and 100x the size of song_st.csv. The larger tables are made by
+# copying every song under a new title, so each copy has its own rows.
+#
+# Usage:
+#     python benchmarks/bench_lookups.py
+#     python benchmarks/bench_lookups.py --scales 1 10 100 --repeat 20
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import article_slice, build_aggregates, month_slice  # noqa: E402
+from data_loader import load_songs  # noqa: E402
+
+
+def scaled(data, scale):
+    """data repeated scale times, with " (copy i)" added to the titles of every extra copy."""
+    if scale == 1:
+        return data
+    copies = []
+    for copy in range(scale):
+        part = data.copy()
+        if copy:
+            part['article'] = part['article'] + f" (copy {copy})"
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True)
+
+
+def median_time(function, repeat):
+    """Median seconds of repeat calls of function()."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the leaderboard and trend lookups with and without the index.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Sizes relative to song_st.csv")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed calls per lookup")
+    parser.add_argument("--top", type=int, default=10, help="Leaderboard size")
+    args = parser.parse_args()
+
+    base = load_songs()
+    rng = np.random.default_rng(234)
+    print(f"{'scale':>5} {'rows':>11} {'build (s)':>10} {'lookup':<12} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8}")
+    for scale in args.scales:
+        data = scaled(base, scale)
+        start = time.perf_counter()
+        aggs = build_aggregates(data)
+        build_time = time.perf_counter() - start
+
+        month = int(data['month'].iloc[0])
+        titles = data['article'].unique()
+        songs = list(rng.choice(titles, size=5, replace=False))
+
+        # Both versions have to give the same rows before their times mean anything
+        scan_top = data[data['month'] == month].sort_values('monthly_pageviews', ascending=False).head(args.top)
+        index_top = month_slice(aggs, month, args.top)
+        assert scan_top['monthly_pageviews'].tolist() == index_top['monthly_pageviews'].tolist()
+        scan_rows = data[data['article'].isin(songs)]
+        index_rows = article_slice(aggs, songs)
+        assert sorted(scan_rows['monthly_pageviews'].tolist()) == sorted(index_rows['monthly_pageviews'].tolist())
+
+        lookups = {
+            "leaderboard": (
+                lambda: data[data['month'] == month].sort_values('monthly_pageviews', ascending=False).head(args.top),
+                lambda: month_slice(aggs, month, args.top),
+            ),
+            "trend": (
+                lambda: data[data['article'].isin(songs)],
+                lambda: article_slice(aggs, songs),
+            ),
+        }
+        for name, (scan, index) in lookups.items():
+            scan_time = median_time(scan, args.repeat)
+            index_time = median_time(index, args.repeat)
+            print(f"{scale:>4}x {len(data):>11,} {build_time:>10.2f} {name:<12} "
+                  f"{scan_time * 1000:>10.2f} {index_time * 1000:>11.3f} {scan_time / index_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# Description: Benchmark and golden-output check for lyrics_clean.py
+#
+# Runs the original notebook cleaning functions (copied below exactly as they
+# are in song_classification.ipynb) and the compiled single-pass versions from
+# lyrics_clean.py on the same lyrics, times both, and fails if a single cleaned
+# text is different.
+#
+# The three Kaggle sources are downloaded with kagglehub when it's installed;
+# otherwise the lyrics in clean_classification.csv are dressed up to look like
+# each source (prefixes, "Edit" suffixes, line breaks) and used instead.
+#
+# Usage:
+#     python benchmarks/bench_lyrics_clean.py                 # all sources, 1x
+#     python benchmarks/bench_lyrics_clean.py --scale 10 --workers 4
+import argparse
+import os
+import re
+import string
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lyrics_clean  # noqa: E402
+from data_loader import DATA_DIR  # noqa: E402
+
+# --- Reference implementations (verbatim from the notebook) ---
+
+STOPWORDS = set(lyrics_clean.STOPWORDS)
+
+
+def cleaning_stopwords(text):
+    return " ".join([word for word in str(text).split() if word not in STOPWORDS])
+
+
+english_punctuations = string.punctuation
+punctuations_list = english_punctuations
+
+
+def cleaning_punctuations(text):
+    translator = str.maketrans('', '', punctuations_list)
+    return text.translate(translator)
+
+
+def regexp_tokenize(text):
+    # nltk's RegexpTokenizer(r'\w+').tokenize
+    return re.findall(r'\w+', text, re.UNICODE | re.MULTILINE | re.DOTALL)
+
+
+def clean_lyrics(text_data: str) -> str:
+    if not isinstance(text_data, str):
+        return ""
+    match = re.search(r'lyrics\s*(.*)', text_data, flags=re.IGNORECASE | re.DOTALL)
+    if not match:
+        return ""
+    raw_lyrics = match.group(1).strip()
+    cleanup_pattern = re.compile(
+        r'\s*(?:Edit|Report a problem|Thanks to .*\.)\s*$',
+        re.IGNORECASE | re.DOTALL
+    )
+    cleaned_lyrics = cleanup_pattern.sub('', raw_lyrics)
+    cleaned_lyrics = re.sub(r'[\r\n]+', '\n', cleaned_lyrics).strip()
+    return cleaned_lyrics
+
+
+def extract_lyrics_after_marker(text, marker="lyrics"):
+    if pd.isna(text) or not isinstance(text, str):
+        return text
+    pattern = r'(.*?)(' + re.escape(marker) + r')(.*)'
+    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    if match:
+        extracted_text = match.group(3).strip()
+        if extracted_text and extracted_text[0] in [':', '-', '>', '|', ' ']:
+            extracted_text = extracted_text.lstrip(':->| ').strip()
+        return extracted_text
+    return text.strip()
+
+
+def clean_lyric_ultimate_final(lyric_text):
+    if not isinstance(lyric_text, str) or pd.isna(lyric_text):
+        return lyric_text
+    split_pattern = r'(lyrics\s*:\s*[\w\s]*)|([\w\s]*?[:])|(\w*lyrics\s*[:\s\-\(\)\w]*)|(\w*Instrumental\s*[:\s\-\(\)\w]*)'
+    parts = re.split(split_pattern, lyric_text, maxsplit=1, flags=re.IGNORECASE | re.DOTALL)
+    clean_lyric = lyric_text
+    if len(parts) > 1:
+        for part in reversed(parts):
+            if isinstance(part, str) and part.strip():
+                clean_lyric = part.strip()
+                break
+    junk_suffix_pattern = r'(\s*Instrumental\s*[:\s\w]*|\s*See\s*[\w\s]+Live|\s*Get\s*tickets|\s*You\s*might\s*also\s*like|\s*Post\-\s*|^\s*$)[\w\W]*'
+    match_suffix = re.search(junk_suffix_pattern, clean_lyric, re.IGNORECASE | re.DOTALL)
+    if match_suffix:
+        clean_lyric = clean_lyric[:match_suffix.start()].strip()
+    clean_lyric = re.sub(r'\$\d+', '', clean_lyric).strip()
+    return clean_lyric
+
+
+def clean_lyric_by_replacement(lyric_text):
+    if not isinstance(lyric_text, str) or pd.isna(lyric_text):
+        return lyric_text
+    junk_patterns = [
+        r'^[\W\s]*(?:Lyrics|Deutsch|Español|Türkçe|[\w\s]*?:)[\w\W]*?(?=[A-Z]{2,}\s|\n)',
+        r'^\s*\w+\s*:\s*\w+[\s\w]*',
+        r'^\s*Lyrics\s*:\s*[\w\s]*',
+        r'(\s*Instrumental\s*[:\s\w]*)+',
+        r'(\s*See\s*[\w\s]+Live|\s*Get\s*tickets|\s*You\s*might\s*also\s*like|\s*Post\-\s*)+[\w\W]*$',
+        r'\$\d+',
+        r'online\s+lyrics\s*:\s*',
+        r'Lyrics\s*:\s*',
+        r'Lyrics\s*Instrumental\s*',
+        r'Lyrics\s*',
+    ]
+    clean_text = lyric_text
+    for pattern in junk_patterns:
+        clean_text = re.sub(pattern, ' ', clean_text, flags=re.IGNORECASE | re.DOTALL).strip()
+    clean_text = re.sub(r'\s+', ' ', clean_text).strip()
+    return clean_text
+
+
+def reference(source, column):
+    """The notebook's way: one .apply pass per step."""
+    if source == "kaggle1":
+        column = column.apply(lambda text: cleaning_stopwords(text))
+        column = column.apply(lambda x: cleaning_punctuations(x))
+        return column.apply(regexp_tokenize)
+    if source == "kaggle2":
+        return column.apply(clean_lyrics)
+    if source == "kaggle3":
+        return column.str.replace(r'[\n\r]+', ' ', regex=True)
+    if source == "merged":
+        return column.apply(lambda x: extract_lyrics_after_marker(x, marker="lyrics"))
+    if source == "baseline":
+        return column.apply(clean_lyric_ultimate_final)
+    if source == "replacement":
+        return column.apply(clean_lyric_by_replacement)
+    raise ValueError(source)
+
+
+# --- Lyrics sources ---
+
+def kaggle_sources():
+    """The three Kaggle datasets from the notebook, or None if kagglehub isn't available."""
+    try:
+        import kagglehub
+        from kagglehub import KaggleDatasetAdapter
+    except ImportError:
+        return None
+    try:
+        path = kagglehub.dataset_download("uvaissaifi/top-artist-songs-with-lyrics-20172024")
+        kaggle1 = pd.read_csv(os.path.join(path, "top_and_famous_artist_songs_with_lyrics.csv"))
+        kaggle2 = kagglehub.load_dataset(KaggleDatasetAdapter.PANDAS, "evabot/spotify-lyrics-dataset", "lyrics_10k.csv")
+        kaggle3 = kagglehub.load_dataset(
+            KaggleDatasetAdapter.PANDAS,
+            "suparnabiswas/billboard-hot-1002000-2023-data-with-features",
+            "billboard_24years_lyrics_spotify.csv"
+        )
+    except Exception as e:
+        print(f"Could not download the Kaggle datasets ({e}), using local lyrics instead")
+        return None
+    return {
+        "kaggle1": kaggle1["songs_lyrics"],
+        "kaggle2": kaggle2["lyrics"],
+        "kaggle3": kaggle3["lyrics"],
+        "merged": pd.concat([kaggle1["songs_lyrics"], kaggle2["lyrics"]], ignore_index=True),
+        "baseline": kaggle1["songs_lyrics"],
+        "replacement": kaggle1["songs_lyrics"],
+    }
+
+
+def local_sources():
+    """Lyrics from clean_classification.csv made to look like each source."""
+    lyrics = pd.read_csv(os.path.join(DATA_DIR, "clean_classification.csv"))
+    songs = lyrics["song"].astype(str)
+    text = lyrics["lyrics"].astype(str)
+    with_breaks = text.str.replace("  ", "\n", regex=False)
+    return {
+        "kaggle1": text,
+        "kaggle2": songs + " Lyrics\n" + with_breaks + "\nEdit",
+        "kaggle3": with_breaks,
+        "merged": "Contributors " + songs + " Lyrics: " + text,
+        "baseline": "Lyrics : " + lyrics["artist"].astype(str) + "\n" + text + " You might also like $5",
+        "replacement": "Lyrics : " + lyrics["artist"].astype(str) + "\n" + text + " See Them Live",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lyrics_clean.py against the notebook functions.")
+    parser.add_argument("--scale", type=int, default=1, help="Repeat each source this many times")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for the compiled version")
+    parser.add_argument("--local", action="store_true", help="Don't try to download the Kaggle datasets")
+    args = parser.parse_args()
+
+    sources = None if args.local else kaggle_sources()
+    if sources is None:
+        sources = local_sources()
+
+    failures = 0
+    print(f"{'source':<12} {'rows':>8} {'notebook (s)':>13} {'compiled (s)':>13} {'speedup':>8}  output")
+    for source, column in sources.items():
+        column = pd.concat([column] * args.scale, ignore_index=True)
+
+        start = time.perf_counter()
+        expected = reference(source, column)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = lyrics_clean.normalize_column(column, source, workers=args.workers)
+        new_time = time.perf_counter() - start
+
+        # Golden check: every cleaned text must be exactly the same
+        mismatches = sum(1 for a, b in zip(expected.tolist(), actual.tolist()) if not (a == b or (a != a and b != b)))
+        failures += mismatches
+        status = "identical" if mismatches == 0 else f"{mismatches} DIFFERENT"
+        print(f"{source:<12} {len(column):>8,} {old_time:>13.3f} {new_time:>13.3f} {old_time / new_time:>7.1f}x  {status}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
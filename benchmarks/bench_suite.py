@@ -0,0 +1,269 @@
+# Description: Benchmark suite and regression check for the app and pipeline stages
+#
+# Times every stage the dashboard and the notebooks go through, on synthetic
+# data at 1x, 10x and 100x the size of the real files (see synthetic.py):
+#   - load:              parsing song_st.csv with data_loader's column types
+#   - aggregation:       build_aggregates() (every leaderboard rollup)
+#   - leaderboard:       the top 10 of every month through month_slice()
+#   - trend_filter:      the rows of 5 songs through article_slice()
+#   - lyrics_cleaning:   the notebook's baseline cleaning (lyrics_clean.py)
+#   - entity_extraction: extract_entities() over entity_results3.jsonl
+#   - classification:    ThemeClassifier with a stub model (chunking, batching
+#                        and bookkeeping without the cost of BART)
+#
+# Each stage is run --repeat times and the median time is kept. One more run
+# with tracemalloc records the stage's peak Python/NumPy memory.
+#
+# The results are written as JSON. Every stage is compared with the baseline
+# file and the script exits with status 1 if a stage got slower (or bigger) than
+# the tolerance allows, so it can run before a deploy. Timings depend on the
+# machine, so the baseline isn't committed: save one on the deploy machine with
+# --save-baseline first. Without one the script stops with an error instead of
+# passing without comparing anything.
+#
+# Usage:
+#     python benchmarks/bench_suite.py --save-baseline          # once per machine, writes benchmarks/baseline.json
+#     python benchmarks/bench_suite.py                          # 1x 10x 100x, compare with benchmarks/baseline.json
+#     python benchmarks/bench_suite.py --stages load aggregation --tolerance 0.5
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic  # noqa: E402
+from aggregates import article_slice, build_aggregates, month_slice  # noqa: E402
+from data_loader import SONG_DTYPES, _read_csv  # noqa: E402
+from entity_extract import extract_entities  # noqa: E402
+from lyrics_clean import normalize_column  # noqa: E402
+from theme_classifier import ThemeClassifier, classify_songs  # noqa: E402
+
+STAGES = ("load", "aggregation", "leaderboard", "trend_filter", "lyrics_cleaning", "entity_extraction", "classification")
+
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# A stage counts as a regression when it is this much slower than the baseline...
+TOLERANCE = 0.25
+# ...and slower by at least this many seconds (so 1 ms -> 2 ms is just noise)
+MIN_SECONDS = 0.01
+# Same for its peak memory
+MEMORY_TOLERANCE = 0.25
+MIN_MEGABYTES = 5.0
+
+
+def stub_scorer(texts, labels, template):
+    """Stand-in for the zero-shot model: scores each label by how often its word appears."""
+    results = []
+    for text in texts:
+        lowered = text.lower()
+        counts = np.array([lowered.count(label) + 1.0 for label in labels])
+        results.append(dict(zip(labels, (counts / counts.sum()).tolist())))
+    return results
+
+
+def prepare(scale, data_dir, seed):
+    """Writes the synthetic files and builds what the stages work on (not timed)."""
+    paths = synthetic.write_dataset(scale, data_dir, seed)
+    data = _read_csv(paths["pageviews"], SONG_DTYPES)
+    aggs = build_aggregates(data)
+    lyrics = pd.read_csv(paths["lyrics"])
+    # Dressed up like the Kaggle source the notebook cleaned with clean_lyric_ultimate_final
+    dressed = "Lyrics : " + lyrics["artist"].astype(str) + "\n" + lyrics["lyrics"].astype(str) + " You might also like $5"
+    rng = np.random.default_rng(seed)
+    titles = aggs["article_offsets"]["article"].to_numpy()
+    return {
+        "paths": paths,
+        "data": data,
+        "aggs": aggs,
+        "lyrics": lyrics,
+        "dressed": dressed,
+        "months": sorted(data["month"].unique().tolist()),
+        "songs": list(rng.choice(titles, size=min(5, len(titles)), replace=False)),
+    }
+
+
+def stage_functions(context):
+    """Stage name -> (function to time, number of items it handles)."""
+    paths, aggs = context["paths"], context["aggs"]
+
+    def classify():
+        classifier = ThemeClassifier(scorer=stub_scorer, cache_path=None)
+        return classify_songs(context["lyrics"], classifier)
+
+    return {
+        "load": (lambda: _read_csv(paths["pageviews"], SONG_DTYPES), len(context["data"])),
+        "aggregation": (lambda: build_aggregates(context["data"]), len(context["data"])),
+        "leaderboard": (lambda: [month_slice(aggs, month, 10) for month in context["months"]], len(context["months"])),
+        "trend_filter": (lambda: article_slice(aggs, context["songs"]), len(context["songs"])),
+        "lyrics_cleaning": (lambda: normalize_column(context["dressed"], "baseline"), len(context["dressed"])),
+        "entity_extraction": (lambda: extract_entities(paths["entities"]), None),
+        "classification": (classify, len(context["lyrics"])),
+    }
+
+
+def measure(function, repeat, memory):
+    """Median seconds over repeat runs, and the peak traced memory of one more run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    items = len(result) if hasattr(result, "__len__") else None
+    del result
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return float(np.median(times)), peak, items
+
+
+def run_scale(scale, stages, data_dir, repeat, memory, seed):
+    context = prepare(scale, data_dir, seed)
+    functions = stage_functions(context)
+    results = {}
+    for stage in stages:
+        function, items = functions[stage]
+        seconds, peak, returned = measure(function, repeat, memory)
+        items = items if items is not None else returned
+        results[stage] = {
+            "seconds": seconds,
+            "items": items,
+            "items_per_second": items / seconds if items and seconds else None,
+            "peak_mb": peak,
+        }
+        peak_text = f"{peak:>10.1f}" if peak is not None else f"{'-':>10}"
+        print(f"{scale:>4}x {stage:<18} {seconds * 1000:>12.2f} {peak_text} {items or 0:>12,}")
+    return results
+
+
+def environment():
+    """Where the results came from, to tell apart machines and commits."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Compares every stage with the baseline.
+
+    Returns:
+        list: One description per regression (empty when nothing got worse).
+    """
+    regressions = []
+    print(f"\n{'stage':<24} {'baseline (ms)':>14} {'now (ms)':>10} {'ratio':>7} {'baseline MB':>12} {'now MB':>8}")
+    for scale, stages in results["results"].items():
+        for stage, now in stages.items():
+            before = baseline.get("results", {}).get(scale, {}).get(stage)
+            if before is None:
+                continue
+            ratio = now["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            flags = []
+            if now["seconds"] > before["seconds"] * (1 + tolerance) and now["seconds"] - before["seconds"] > MIN_SECONDS:
+                flags.append("SLOWER")
+            if (now.get("peak_mb") is not None and before.get("peak_mb") is not None
+                    and now["peak_mb"] > before["peak_mb"] * (1 + memory_tolerance)
+                    and now["peak_mb"] - before["peak_mb"] > MIN_MEGABYTES):
+                flags.append("MORE MEMORY")
+
+            name = f"{scale} {stage}"
+            before_mb = f"{before['peak_mb']:>12.1f}" if before.get("peak_mb") is not None else f"{'-':>12}"
+            now_mb = f"{now['peak_mb']:>8.1f}" if now.get("peak_mb") is not None else f"{'-':>8}"
+            print(f"{name:<24} {before['seconds'] * 1000:>14.2f} {now['seconds'] * 1000:>10.2f} {ratio:>6.2f}x "
+                  f"{before_mb} {now_mb}  {' '.join(flags)}")
+            if flags:
+                regressions.append(f"{name}: {', '.join(flags).lower()} ({ratio:.2f}x the baseline time)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every dashboard and pipeline stage on synthetic data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Sizes relative to the real files")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES, help="Stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--seed", type=int, default=synthetic.SEED)
+    parser.add_argument("--data-dir", default=None, help="Keep the synthetic files here (default: a temporary folder)")
+    parser.add_argument("--output", default=RESULTS_PATH, help="JSON file for the results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Also save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE, help="Allowed peak memory growth")
+    args = parser.parse_args()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}: run with --save-baseline first")
+
+    data_root = args.data_dir or tempfile.mkdtemp(prefix="song_bench_")
+    results = {"environment": environment(), "settings": {"repeat": args.repeat, "seed": args.seed}, "results": {}}
+    print(f"{'scale':>5} {'stage':<18} {'median (ms)':>12} {'peak (MB)':>10} {'items':>12}")
+    try:
+        for scale in args.scales:
+            data_dir = os.path.join(data_root, f"{scale}x")
+            results["results"][f"{scale}x"] = run_scale(scale, args.stages, data_dir, args.repeat, not args.no_memory, args.seed)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_root, ignore_errors=True)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["environment"]["max_rss_mb"] = max_rss / (1e6 if sys.platform == "darwin" else 1e3)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nSaved to {args.output} (process peak RSS {results['environment']['max_rss_mb']:.0f} MB)")
+
+    regressions = []
+    if not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+        else:
+            print(f"\nNo regressions against {args.baseline}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved as the baseline in {args.baseline}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
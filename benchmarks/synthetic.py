@@ -0,0 +1,137 @@
+# Description: Synthetic pageview, entity and lyrics data for the benchmarks
+#
+# Makes copies of song_st.csv, entity_results3.jsonl and clean_classification.csv
+# at any multiple of their size, keeping their shape: the same columns, the same
+# number of monthly rows per song, the same long-tailed pageviews, the same
+# attributes per entity and the same lyric lengths. Copy i of a song gets
+# a new QID, " (copy i)" added to its title and " i" added to its artist, so a
+# 10x table has 10x the songs and 10x the artists rather than 10 rows per song.
+# Pageviews get some random noise, and the words of each lyric are shuffled so
+# no two copies are the same text.
+#
+# Usage:
+#     python benchmarks/synthetic.py --scale 10 --out /tmp/bench_10x
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import DATA_DIR  # noqa: E402
+
+SEED = 234
+
+# Added to the number of a QID for every copy, so copies never collide with real QIDs
+QID_OFFSET = 1_000_000_000
+
+FILES = {
+    "pageviews": "song_st.csv",
+    "entities": "entity_results3.jsonl",
+    "lyrics": "clean_classification.csv",
+}
+
+
+def _copy_qids(qids, copy):
+    """QIDs of copy number copy ("Q42" -> "Q3000000042" for copy 3)."""
+    if not copy:
+        return qids
+    numbers = pd.to_numeric(qids.astype(str).str[1:], errors="coerce")
+    return ("Q" + (numbers + copy * QID_OFFSET).astype("Int64").astype(str)).where(numbers.notna(), qids)
+
+
+def _copy_names(names, copy, suffix):
+    return names if not copy else names.where(names.isna(), names.astype(str) + suffix)
+
+
+def synthetic_pageviews(scale, seed=SEED):
+    """song_st.csv scale times over (see the top of this file)."""
+    base = pd.read_csv(os.path.join(DATA_DIR, FILES["pageviews"]), usecols=lambda col: not col.startswith("Unnamed"))
+    rng = np.random.default_rng(seed)
+    copies = []
+    for copy in range(scale):
+        part = base.copy()
+        part["article"] = _copy_names(part["article"], copy, f" (copy {copy})")
+        part["qid"] = _copy_qids(part["qid"], copy)
+        part["artist"] = _copy_names(part["artist"], copy, f" {copy}")
+        if copy:
+            noise = rng.lognormal(0.0, 0.3, len(part))
+            part["monthly_pageviews"] = np.maximum(np.round(part["monthly_pageviews"] * noise), 1.0)
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True)
+
+
+def synthetic_entities(scale):
+    """entity_results3.jsonl scale times over, as a list of records."""
+    with open(os.path.join(DATA_DIR, FILES["entities"]), encoding="utf-8") as file:
+        base = [json.loads(line) for line in file if line.strip()]
+    records = []
+    for copy in range(scale):
+        for record in base:
+            if copy:
+                record = dict(record)
+                qid = record.get("QID", "")
+                if qid[1:].isdigit():
+                    record["QID"] = f"Q{int(qid[1:]) + copy * QID_OFFSET}"
+                if record.get("label"):
+                    record["label"] = f"{record['label']} (copy {copy})"
+                attributes = dict(record.get("attributes") or {})
+                if isinstance(attributes.get("performer"), str):
+                    attributes["performer"] = f"{attributes['performer']} {copy}"
+                record["attributes"] = attributes
+            records.append(record)
+    return records
+
+
+def synthetic_lyrics(scale, seed=SEED):
+    """clean_classification.csv scale times over, with the words of every copied lyric shuffled."""
+    base = pd.read_csv(os.path.join(DATA_DIR, FILES["lyrics"]))
+    rng = np.random.default_rng(seed)
+    copies = []
+    for copy in range(scale):
+        part = base.copy()
+        part["song"] = _copy_names(part["song"], copy, f" (copy {copy})")
+        part["qid"] = _copy_qids(part["qid"], copy)
+        part["artist"] = _copy_names(part["artist"], copy, f" {copy}")
+        if copy:
+            part["lyrics"] = [
+                " ".join(rng.permutation(text.split())) if isinstance(text, str) else text
+                for text in part["lyrics"]
+            ]
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True)
+
+
+def write_dataset(scale, out_dir, seed=SEED):
+    """
+    Writes the three synthetic files into out_dir (skipping files already there).
+
+    Returns:
+        dict: "pageviews", "entities" and "lyrics" -> file path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, file_name) for name, file_name in FILES.items()}
+
+    if not os.path.exists(paths["pageviews"]):
+        # Written the way the notebook wrote song_st.csv (with the index column)
+        synthetic_pageviews(scale, seed).to_csv(paths["pageviews"], index=True)
+    if not os.path.exists(paths["entities"]):
+        with open(paths["entities"], "w", encoding="utf-8") as file:
+            for record in synthetic_entities(scale):
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if not os.path.exists(paths["lyrics"]):
+        synthetic_lyrics(scale, seed).to_csv(paths["lyrics"], index=False)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic copies of the project's data files.")
+    parser.add_argument("--scale", type=int, default=10, help="Size relative to the real files")
+    parser.add_argument("--out", required=True, help="Folder for the files")
+    args = parser.parse_args()
+
+    for name, path in write_dataset(args.scale, args.out).items():
+        print(f"{name}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
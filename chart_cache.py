@@ -0,0 +1,181 @@
+# Description: Shared cache of built charts and tables for the Streamlit app
+#
+# Most sessions look at the same views (the default month, the Top 10 artists,
+# the Top 15 songs overall), and every one of them used to build the same Altair
+# charts and Plotly figures again. This module keeps what a view produced, keyed
+# by (view name, dataset version, widget values), so the next session asking for
+# the same view reuses it instead of building it:
+#   - Altair charts are stored as their finished Vega-Lite spec (chart.to_dict()),
+#     which skips both building the chart and Altair's validation of it
+#   - Plotly figures and DataFrames are stored as they are
+# Like data_loader's cache it lives at module level, so every session of the
+# server process shares it. Entries are dropped least recently used first once
+# the cache is over its memory budget, and the budget grows with the number of
+# sessions active in the last few minutes (more sessions, more distinct views).
+#
+# Everything returned is shared between sessions, so treat it as read-only.
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from data_loader import _file_signature, _frame_bytes, songs_source
+
+# Memory the cache may always use, and how much more it may use per active session.
+# Can be changed with the SONGS_CHART_CACHE_MB and SONGS_CHART_CACHE_SESSION_MB environment variables.
+BASE_BUDGET_BYTES = int(os.environ.get("SONGS_CHART_CACHE_MB", "32")) * 1024 * 1024
+SESSION_BUDGET_BYTES = int(os.environ.get("SONGS_CHART_CACHE_SESSION_MB", "4")) * 1024 * 1024
+
+# The budget never grows past this
+MAX_BUDGET_BYTES = 256 * 1024 * 1024
+
+# A session counts as active for this many seconds after its last rerun
+SESSION_TIMEOUT_SECONDS = 300
+
+# (name, version, widgets) -> (value, size in bytes)
+_entries = OrderedDict()
+# name -> {"hits", "misses", "evictions"}
+_counts = {}
+# session id -> time of its last rerun
+_sessions = {}
+_lock = threading.Lock()
+
+
+def dataset_version(path):
+    """
+    Version of a data file (or Parquet dataset): its path and (mtime, size).
+
+    Part of every key, so a changed file never serves charts built from the old one.
+    """
+    source = songs_source(path)
+    return (source, _file_signature(source))
+
+
+def _value_bytes(value):
+    """Approximate memory used by a cached value."""
+    if isinstance(value, tuple):
+        return sum(_value_bytes(item) for item in value)
+    if isinstance(value, pd.DataFrame):
+        return _frame_bytes(value)
+    if isinstance(value, dict):
+        return len(json.dumps(value, default=str))
+    if hasattr(value, "to_json"):
+        return len(value.to_json())
+    return 0
+
+
+def _session_id():
+    """Id of the current Streamlit session (None outside of the app)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def active_sessions(now=None):
+    """Number of sessions that reran in the last SESSION_TIMEOUT_SECONDS."""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        for session, seen in list(_sessions.items()):
+            if now - seen > SESSION_TIMEOUT_SECONDS:
+                del _sessions[session]
+        return max(len(_sessions), 1)
+
+
+def budget():
+    """Current memory budget in bytes (grows with the active sessions)."""
+    return min(BASE_BUDGET_BYTES + SESSION_BUDGET_BYTES * active_sessions(), MAX_BUDGET_BYTES)
+
+
+def _evict(limit):
+    """Drops the least recently used entries until the cache fits limit (call with _lock held)."""
+    total = sum(entry[1] for entry in _entries.values())
+    while total > limit and len(_entries) > 1:
+        (name, _, _), (_, nbytes) = _entries.popitem(last=False)
+        _counts[name]["evictions"] += 1
+        total -= nbytes
+
+
+def cached(name, version, widgets, build):
+    """
+    Returns build(), reusing the result of an earlier call with the same key.
+
+    Args:
+        name (str): Name of the view (e.g. "leaderboard_chart").
+        version: Version of the data the view is built from (see dataset_version()).
+        widgets (tuple): Values of every widget the view depends on.
+        build (callable): Takes no arguments and builds the value.
+
+    Returns:
+        The (possibly shared) result of build.
+    """
+    key = (name, version, widgets)
+    session = _session_id()
+    with _lock:
+        if session is not None:
+            _sessions[session] = time.monotonic()
+        counts = _counts.setdefault(name, {"hits": 0, "misses": 0, "evictions": 0})
+        entry = _entries.get(key)
+        if entry is not None:
+            counts["hits"] += 1
+            _entries.move_to_end(key)
+            return entry[0]
+        counts["misses"] += 1
+
+    # Build outside of the lock so a slow chart doesn't hold up the other sessions
+    value = build()
+    nbytes = _value_bytes(value)
+    limit = budget()
+
+    with _lock:
+        _entries[key] = (value, nbytes)
+        _entries.move_to_end(key)
+        _evict(limit)
+    return value
+
+
+def altair_spec(name, version, widgets, build_chart):
+    """Vega-Lite spec of the chart build_chart() returns, for st.vega_lite_chart (cached)."""
+    return cached(name, version, widgets, lambda: build_chart().to_dict())
+
+
+def stats():
+    """
+    Hit-rate metrics of the cache.
+
+    Returns:
+        pd.DataFrame: One row per view (and a "total" row): hits, misses,
+        evictions, hit_rate (0-1), entries and bytes held, plus the budget and
+        active sessions in the total row.
+    """
+    with _lock:
+        counts = {name: dict(value) for name, value in _counts.items()}
+        held = {}
+        for (name, _, _), (_, nbytes) in _entries.items():
+            entries, total = held.get(name, (0, 0))
+            held[name] = (entries + 1, total + nbytes)
+
+    rows = [{"view": name, **value, "entries": held.get(name, (0, 0))[0], "bytes": held.get(name, (0, 0))[1]}
+            for name, value in sorted(counts.items())]
+    table = pd.DataFrame(rows, columns=["view", "hits", "misses", "evictions", "entries", "bytes"])
+    total = table[["hits", "misses", "evictions", "entries", "bytes"]].sum()
+    table = pd.concat([table, pd.DataFrame([{"view": "total", **total.to_dict()}])], ignore_index=True)
+    lookups = table["hits"] + table["misses"]
+    table["hit_rate"] = (table["hits"] / lookups.where(lookups > 0)).fillna(0.0)
+    table["budget_bytes"] = None
+    table["active_sessions"] = None
+    table.loc[table.index[-1], ["budget_bytes", "active_sessions"]] = [budget(), active_sessions()]
+    return table
+
+
+def clear():
+    """Empties the cache and its counters."""
+    with _lock:
+        _entries.clear()
+        _counts.clear()
+        _sessions.clear()
@@ -0,0 +1,199 @@
+# Description: Concentration statistics of the artist pageview distribution
+#
+# The Hypothesis Testing tab asks how much of the attention goes to the top
+# artists. This module answers it for the whole sorted list of artist totals at
+# once, and aggregates.py stores the results next to the other rollups so they
+# are computed once per dataset:
+#   - Pareto shares:  % of all views held by the top N artists, for every N
+#   - Lorenz curve:   share of views held by the bottom x% of artists
+#   - Gini coefficient (0 = every artist has the same views, 1 = one artist has all)
+#   - tiers:          natural breaks in the totals, found with 1-D k-means.
+#                     The number of tiers is the smallest one that explains
+#                     TIER_FIT of the variance (Jenks' goodness of variance fit).
+import numpy as np
+import pandas as pd
+
+# Most tiers tried
+MAX_TIERS = 8
+
+# Goodness of variance fit the tiers have to reach
+TIER_FIT = 0.9
+
+# Lloyd iterations per k-means run (1-D k-means usually settles in a few dozen)
+MAX_ITERATIONS = 100
+
+
+def pareto_shares(totals):
+    """
+    % of the grand total held by the first N values, for every N.
+
+    Args:
+        totals (np.ndarray): Values sorted from largest to smallest.
+
+    Returns:
+        np.ndarray: Element N-1 is the share of the top N.
+    """
+    totals = np.asarray(totals, dtype=np.float64)
+    grand_total = totals.sum()
+    if not grand_total:
+        return np.zeros(len(totals))
+    return np.cumsum(totals) / grand_total * 100
+
+
+def lorenz_curve(totals):
+    """
+    Lorenz curve of the values.
+
+    Returns:
+        pd.DataFrame: population_share and views_share (both 0-1), starting at (0, 0).
+    """
+    ascending = np.sort(np.asarray(totals, dtype=np.float64))
+    grand_total = ascending.sum()
+    cumulative = np.cumsum(ascending) / grand_total if grand_total else np.zeros(len(ascending))
+    return pd.DataFrame({
+        'population_share': np.arange(len(ascending) + 1) / max(len(ascending), 1),
+        'views_share': np.r_[0.0, cumulative],
+    })
+
+
+def gini(totals):
+    """Gini coefficient of the values (0 for an empty or all-zero list)."""
+    ascending = np.sort(np.asarray(totals, dtype=np.float64))
+    count, grand_total = len(ascending), ascending.sum()
+    if not count or not grand_total:
+        return 0.0
+    ranks = np.arange(1, count + 1)
+    return float((2 * (ranks * ascending).sum()) / (count * grand_total) - (count + 1) / count)
+
+
+def kmeans_breaks(values, k, max_iterations=MAX_ITERATIONS):
+    """
+    Splits sorted values into k groups of neighbours with 1-D k-means.
+
+    In one dimension every group is a run of the sorted values, so each Lloyd
+    step is a binary search of the midpoints between the centers instead of a
+    distance to every center.
+
+    Args:
+        values (np.ndarray): Values sorted from smallest to largest.
+        k (int): Number of groups.
+
+    Returns:
+        np.ndarray: Index where each group after the first starts (k - 1 of them,
+        fewer if some groups came out empty).
+    """
+    count = len(values)
+    if k <= 1 or count <= 1:
+        return np.zeros(0, dtype=np.int64)
+
+    # Centers spread evenly over the range, so the few very large values of a
+    # long-tailed list get their own groups instead of sharing the top one
+    centers = np.linspace(values[0], values[-1], k)
+    prefix = np.r_[0.0, np.cumsum(values)]
+    starts = None
+    for _ in range(max_iterations):
+        new_starts = np.searchsorted(values, (centers[1:] + centers[:-1]) / 2, side='left')
+        if starts is not None and np.array_equal(new_starts, starts):
+            break
+        starts = new_starts
+        bounds = np.r_[0, starts, count]
+        sizes = np.diff(bounds)
+        sums = prefix[bounds[1:]] - prefix[bounds[:-1]]
+        # An empty group keeps its old center
+        centers = np.where(sizes > 0, sums / np.maximum(sizes, 1), centers)
+    return np.unique(starts[(starts > 0) & (starts < count)])
+
+
+def variance_fit(values, starts):
+    """
+    Jenks' goodness of variance fit of a split: 1 - (within-group squared
+    deviations / total squared deviations).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    total = ((values - values.mean()) ** 2).sum()
+    if not total:
+        return 1.0
+    within = sum(((group - group.mean()) ** 2).sum() for group in np.split(values, starts) if len(group))
+    return float(1 - within / total)
+
+
+def natural_tiers(totals, max_tiers=MAX_TIERS, fit=TIER_FIT):
+    """
+    Tier of every value, from the natural breaks of the values.
+
+    Args:
+        totals (np.ndarray): Values sorted from largest to smallest.
+        max_tiers (int): Most tiers tried.
+        fit (float): Goodness of variance fit the tiers have to reach.
+
+    Returns:
+        (np.ndarray, float): Tier per value (1 = the top tier) and the fit reached.
+    """
+    totals = np.asarray(totals, dtype=np.float64)
+    if not len(totals):
+        return np.zeros(0, dtype=np.int32), 1.0
+
+    ascending = totals[::-1]
+    starts, reached = np.zeros(0, dtype=np.int64), variance_fit(ascending, [])
+    for k in range(2, max_tiers + 1):
+        starts = kmeans_breaks(ascending, k)
+        reached = variance_fit(ascending, starts)
+        if reached >= fit:
+            break
+
+    # Group number in ascending order, flipped so the top tier is 1
+    ascending_group = np.zeros(len(ascending), dtype=np.int32)
+    ascending_group[starts] = 1
+    ascending_group = np.cumsum(ascending_group)
+    tiers = (ascending_group.max() - ascending_group + 1)[::-1]
+    return tiers.astype(np.int32), reached
+
+
+def build_concentration(artist_totals):
+    """
+    Concentration tables for the sorted artist totals (aggregates.py's artist_totals).
+
+    Returns:
+        dict: 'artist_shares' (rank, percent_share, cumulative_share and tier per
+        artist, in artist_totals order), 'artist_tiers' (one row per tier),
+        'lorenz' (the Lorenz curve) and 'concentration' (a single row with the
+        Gini coefficient, the tier fit and the number of artists and tiers).
+    """
+    totals = artist_totals['total_pageviews'].to_numpy(dtype=np.float64)
+    grand_total = totals.sum()
+    tiers, reached = natural_tiers(totals)
+
+    artist_shares = pd.DataFrame({
+        'rank': np.arange(1, len(totals) + 1, dtype=np.int32),
+        'percent_share': totals / grand_total * 100 if grand_total else np.zeros(len(totals)),
+        'cumulative_share': pareto_shares(totals),
+        'tier': tiers,
+    })
+
+    frame = pd.DataFrame({'artist': artist_totals['artist'].astype(object).to_numpy(), 'total_pageviews': totals, 'tier': tiers})
+    artist_tiers = frame.groupby('tier', sort=True).agg(
+        artists=('artist', 'size'),
+        first_artist=('artist', 'first'),
+        last_artist=('artist', 'last'),
+        max_pageviews=('total_pageviews', 'max'),
+        min_pageviews=('total_pageviews', 'min'),
+        total_pageviews=('total_pageviews', 'sum'),
+    ).reset_index()
+    artist_tiers['percent_share'] = artist_tiers['total_pageviews'] / grand_total * 100 if grand_total else 0.0
+    # Drop from the last artist of a tier to the first of the next one
+    next_max = artist_tiers['max_pageviews'].shift(-1)
+    artist_tiers['pct_drop_to_next'] = (artist_tiers['min_pageviews'] - next_max) / artist_tiers['min_pageviews'] * 100
+
+    concentration = pd.DataFrame({
+        'artists': [len(totals)],
+        'total_pageviews': [grand_total],
+        'gini': [gini(totals)],
+        'tiers': [int(tiers.max()) if len(tiers) else 0],
+        'tier_fit': [reached],
+    })
+    return {
+        'artist_shares': artist_shares,
+        'artist_tiers': artist_tiers,
+        'lorenz': lorenz_curve(totals),
+        'concentration': concentration,
+    }
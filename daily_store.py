@@ -0,0 +1,426 @@
+# Description: Daily pageview store (songs x days) with rolling, spike and decay metrics
+#
+# Everything else in this project starts from monthly totals, which hides
+# release-day spikes: a song that got a million views in the two days after an
+# album came out looks the same as one with a steady 30k a day. This module
+# keeps the daily counts of one project-year as a single int32 matrix:
+#
+#     pageviews/daily_en_wikipedia_2024/views.npy     songs x days, int32
+#     pageviews/daily_en_wikipedia_2024/songs.parquet row, key, qid, article, total_views
+#     pageviews/daily_en_wikipedia_2024/meta.json     first day, number of days
+#
+# Row i of the matrix is song i of songs.parquet (most viewed first), column j
+# is day j of the year. The matrix is opened memory-mapped, so loading it costs
+# nothing and reading a few songs only touches their rows. Songs are keyed by
+# QID (titles of articles without a QID are used instead), so renamed or
+# duplicated articles of the same song add up on one row. The folder is a link
+# to the latest build (storage.publish_dir()), so a rebuild never touches files
+# a running server has open.
+#
+# The metrics work on many rows at once with NumPy (cumulative sums instead of
+# per-song pandas rolling/resample):
+#   - rolling_sum():    trailing N-day totals
+#   - weekly_totals():  Monday-to-Sunday totals
+#   - detect_spikes():  days far above the song's trailing average
+#   - longest_runs():   longest stretch of consecutive spike days (a "burst")
+#   - decay():          days until the smoothed views halve after the peak,
+#                       and the fitted daily decay rate
+#   - song_metrics():   all of the above for every song, one row per song
+#
+# Usage:
+#     python daily_store.py --project en.wikipedia --year 2024                # from the Parquet dumps
+#     python daily_store.py --database my.duckdb --year 2024                  # from the DuckDB database
+import argparse
+import json
+import os
+import shutil
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from data_loader import load_cached
+from ingest import connect
+from pageview_engine import DEFAULT_PROJECT, DEFAULT_YEAR, DUMPS_DIR, PROJECT_PATTERNS, REPAIR_TITLES, partition_path
+from song_catalog import catalog_titles, load_catalog
+from storage import dataset_path, publish_dir, staging_dir
+
+# Days in the trailing window a day is compared with for spike detection
+SPIKE_WINDOW = 28
+
+# A spike day has more than SPIKE_FACTOR times the trailing average...
+SPIKE_FACTOR = 3.0
+
+# ...and at least this many views (so 2 -> 9 views isn't a spike)
+SPIKE_MIN_VIEWS = 1000
+
+# Days of history a day needs before it can be a spike (so January 1 of a
+# steady song isn't compared with nothing)
+SPIKE_MIN_HISTORY = 7
+
+# Days of smoothing before looking for the peak and the decay after it
+SMOOTH_DAYS = 7
+
+# Days after the peak the decay rate is fitted on
+DECAY_DAYS = 28
+
+# Songs processed at a time by song_metrics(), to bound the temporary arrays
+CHUNK_ROWS = 4096
+
+DAILY_QUERY = """
+SELECT
+    COALESCE(qid, article) AS key,
+    MIN(qid) AS qid,
+    arg_max(article, pageviews) AS article,
+    date_diff('day', make_date(?, 1, 1), CAST(date AS DATE)) AS day,
+    SUM(pageviews) AS views
+FROM
+    {source}
+WHERE
+    article LIKE ?
+    AND date >= make_date(?, 1, 1)
+    AND date < make_date(? + 1, 1, 1)
+GROUP BY
+    COALESCE(qid, article),
+    day
+"""
+
+
+def store_path(project=DEFAULT_PROJECT, year=DEFAULT_YEAR):
+    """Folder of the daily store of one project-year."""
+    return dataset_path(f"daily_{project.replace('.', '_')}_{year}")
+
+
+# --- 1. Building the store ---
+
+def fetch_daily(project=DEFAULT_PROJECT, year=DEFAULT_YEAR, root=DUMPS_DIR, database=None):
+    """
+    Daily views per song of one project-year, aggregated in DuckDB.
+
+    Args:
+        project (str): Wiki, e.g. "en.wikipedia".
+        year (int): Year to read.
+        root (str): Dumps folder (see pageview_engine.py).
+        database (str): DuckDB file or URL with a data_table to read instead of the dumps.
+
+    Returns:
+        pd.DataFrame: key, qid, article (raw title), day (0 = January 1), views.
+    """
+    pattern = PROJECT_PATTERNS.get(project, "%song)")
+    if database is not None:
+        conn = connect(database)
+        params = [year, pattern, year, year]
+        source = "data_table"
+    else:
+        conn = duckdb.connect()
+        params = [year, os.path.join(partition_path(project, year, root), "*.parquet"), pattern, year, year]
+        source = "read_parquet(?)"
+    try:
+        result = conn.execute(DAILY_QUERY.format(source=source), params).df()
+    finally:
+        conn.close()
+    return result
+
+
+def build_daily_store(daily, year, out_dir, repair_encoding=True, catalog=None):
+    """
+    Writes the songs x days matrix and its song index.
+
+    Args:
+        daily (pd.DataFrame): Output of fetch_daily().
+        year (int): Year of the matrix columns.
+        out_dir (str): Store folder (replaced in one step, see storage.publish_dir()).
+        repair_encoding (bool): Passed on to song_catalog.split_titles().
+        catalog (pd.DataFrame): song_catalog.load_catalog() to title songs by QID (None = their own titles).
+
+    Returns:
+        str: out_dir.
+    """
+    start = pd.Timestamp(year=year, month=1, day=1)
+    days = int((pd.Timestamp(year=year + 1, month=1, day=1) - start).days)
+
+    # Songs ordered by their yearly total, so row 0 is the most viewed song
+    totals = daily.groupby("key", sort=False)["views"].sum().sort_values(ascending=False, kind="mergesort")
+    rows = pd.Series(np.arange(len(totals)), index=totals.index)
+
+    # Title of each song: the article with the most views on its best day
+    best = daily.sort_values("views", ascending=False, kind="mergesort").drop_duplicates("key").set_index("key")
+    best = best.reindex(totals.index).reset_index(drop=True)
+    songs = pd.DataFrame({
+        "row": np.arange(len(totals), dtype=np.int32),
+        "key": totals.index.astype(str),
+        "qid": best["qid"].to_numpy(),
+        "article": catalog_titles(best, catalog, repair_encoding=repair_encoding),
+        "total_views": totals.to_numpy().astype("int64"),
+    })
+
+    # Written to a new folder: a running server may have the current views.npy
+    # memory-mapped, and its three files have to change together
+    tmp_dir = staging_dir(out_dir)
+    try:
+        os.makedirs(tmp_dir)
+        views_path = os.path.join(tmp_dir, "views.npy")
+        matrix = np.lib.format.open_memmap(views_path, mode="w+", dtype=np.int32, shape=(len(songs), days))
+        # (key, day) pairs are unique after the GROUP BY, so each cell is set once
+        flat = rows.reindex(daily["key"]).to_numpy() * days + daily["day"].to_numpy()
+        matrix.reshape(-1)[flat] = np.minimum(daily["views"].to_numpy(), np.iinfo(np.int32).max)
+        matrix.flush()
+        del matrix
+
+        songs.to_parquet(os.path.join(tmp_dir, "songs.parquet"), index=False)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump({"start": start.strftime("%Y-%m-%d"), "days": days, "songs": len(songs)}, file)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return publish_dir(tmp_dir, out_dir)
+
+
+# --- 2. Reading the store ---
+
+class DailyStore:
+    """
+    Memory-mapped songs x days matrix with a QID and title index.
+
+    Open one with load_daily_store().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Read all three files from one build, even if a rebuild is published meanwhile
+        path = os.path.realpath(path)
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        self.views = np.load(os.path.join(path, "views.npy"), mmap_mode="r")
+        self.songs = pd.read_parquet(os.path.join(path, "songs.parquet"))
+        self.dates = pd.date_range(meta["start"], periods=meta["days"], freq="D")
+
+        # QID (or title, for songs without one) -> row
+        self._rows = dict(zip(self.songs["key"].tolist(), self.songs["row"].tolist()))
+        # Title -> rows (a title can belong to several songs)
+        self._title_rows = self.songs.groupby("article", sort=False)["row"].apply(list).to_dict()
+
+    def __len__(self):
+        return len(self.songs)
+
+    @property
+    def nbytes(self):
+        """Memory held outside the memory-mapped matrix, for the data_loader cache budget."""
+        return int(self.songs.memory_usage(deep=True).sum()) + 200 * len(self.songs)
+
+    def rows(self, qids):
+        """Rows of the given QIDs (unknown ones are skipped)."""
+        return np.array([self._rows[qid] for qid in qids if qid in self._rows], dtype=np.int64)
+
+    def title_rows(self, titles):
+        """Rows of every song with one of the given titles."""
+        return np.array([row for title in titles for row in self._title_rows.get(title, [])], dtype=np.int64)
+
+    def series(self, titles, freq="D"):
+        """
+        Daily or weekly views of songs by title, for charting.
+
+        Args:
+            titles (list): Song titles (songs sharing a title are added up).
+            freq (str): "D" for daily or "W" for weekly totals.
+
+        Returns:
+            pd.DataFrame: date, article, views (one row per song and day or week).
+        """
+        frames = []
+        for title in titles:
+            rows = self.title_rows([title])
+            if not len(rows):
+                continue
+            values = np.asarray(self.views[np.sort(rows)], dtype=np.int64).sum(axis=0, keepdims=True)
+            dates = self.dates
+            if freq == "W":
+                values, dates = weekly_totals(values, self.dates)
+            frames.append(pd.DataFrame({"date": dates, "article": title, "views": values[0]}))
+        if not frames:
+            return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "article": [], "views": []})
+        return pd.concat(frames, ignore_index=True)
+
+
+def load_daily_store(project=DEFAULT_PROJECT, year=DEFAULT_YEAR):
+    """Returns the DailyStore of one project-year, cached per process, or None if it wasn't built."""
+    path = store_path(project, year)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    return load_cached(path, DailyStore, name="daily")
+
+
+# --- 3. Metrics over many songs at once ---
+
+def rolling_sum(views, window):
+    """
+    Trailing window-day totals of every row (the first days sum what's there).
+
+    Args:
+        views (np.ndarray): songs x days.
+        window (int): Days per total.
+
+    Returns:
+        np.ndarray: int64, same shape as views.
+    """
+    sums = np.cumsum(views, axis=1, dtype=np.int64)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    return sums
+
+
+def weekly_totals(views, dates):
+    """
+    Monday-to-Sunday totals of every row (the first and last weeks may be partial).
+
+    Returns:
+        (np.ndarray, pd.DatetimeIndex): songs x weeks totals and the first day of each week.
+    """
+    starts = np.flatnonzero((dates.dayofweek == 0) | (np.arange(len(dates)) == 0))
+    return np.add.reduceat(np.asarray(views, dtype=np.int64), starts, axis=1), dates[starts]
+
+
+def detect_spikes(views, window=SPIKE_WINDOW, factor=SPIKE_FACTOR, min_views=SPIKE_MIN_VIEWS,
+                  min_history=SPIKE_MIN_HISTORY):
+    """
+    Marks the days with far more views than the song's previous window days.
+
+    The first min_history days of the year are never spikes, since there is too
+    little before them to compare with.
+
+    Returns:
+        np.ndarray: Boolean songs x days mask.
+    """
+    views = np.asarray(views, dtype=np.int64)
+    previous = np.zeros_like(views)
+    previous[:, 1:] = rolling_sum(views, window)[:, :-1]
+    # Average over the days actually before each day (fewer at the start of the year)
+    counts = np.minimum(np.arange(views.shape[1]), window)
+    baseline = np.divide(previous, counts, out=np.zeros(views.shape), where=counts > 0)
+    return (counts >= min_history) & (views >= min_views) & (views > factor * np.maximum(baseline, 1.0))
+
+
+def longest_runs(mask):
+    """Length of the longest stretch of consecutive True values in every row."""
+    if not mask.shape[1]:
+        return np.zeros(mask.shape[0], dtype=np.int64)
+    counts = np.cumsum(mask, axis=1, dtype=np.int64)
+    # Count at the last False before each day, carried forward
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+def decay(views, smooth=SMOOTH_DAYS, days=DECAY_DAYS):
+    """
+    How fast each song falls off after its peak.
+
+    The views are smoothed with a trailing smooth-day average first, so a single
+    odd day isn't the peak.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): Peak day of the smoothed views, days
+        from the peak until they're at half of it (NaN if that never happens), and
+        the fitted decay rate per day (the slope of log views after the peak, as a
+        positive number for a falling song; NaN with fewer than 3 days left).
+    """
+    smoothed = rolling_sum(views, smooth) / smooth
+    count, length = smoothed.shape
+    peak = smoothed.argmax(axis=1)
+    peak_values = smoothed[np.arange(count), peak]
+
+    # --- Half-life ---
+    after = np.arange(length)[None, :] > peak[:, None]
+    below = after & (smoothed <= peak_values[:, None] / 2)
+    half_life = np.where(below.any(axis=1), below.argmax(axis=1) - peak, np.nan)
+
+    # --- Log-linear fit over the days after the peak ---
+    offsets = np.arange(1, days + 1)
+    columns = peak[:, None] + offsets[None, :]
+    valid = columns < length
+    logs = np.log1p(smoothed[np.arange(count)[:, None], np.minimum(columns, length - 1)])
+    n = valid.sum(axis=1)
+    x = np.where(valid, offsets[None, :], 0)
+    y = np.where(valid, logs, 0)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    denominator = n * sxx - sx * sx
+    slope = np.divide(n * sxy - sx * sy, denominator, out=np.full(count, np.nan), where=(n >= 3) & (denominator > 0))
+    return peak, half_life, -slope
+
+
+def song_metrics(store, chunk_rows=CHUNK_ROWS):
+    """
+    Spike and decay metrics for every song of a DailyStore.
+
+    Returns:
+        pd.DataFrame: One row per song with qid, article, total_views, peak_date,
+        peak_views (best single day), peak_share (best day / total), spike_days,
+        longest_burst (consecutive spike days), first_spike (date), peak_week_date,
+        half_life_days and decay_rate.
+    """
+    parts = []
+    for start in range(0, len(store), chunk_rows):
+        views = np.asarray(store.views[start:start + chunk_rows], dtype=np.int64)
+        count = len(views)
+        totals = views.sum(axis=1)
+        peak_day = views.argmax(axis=1)
+        peak_views = views[np.arange(count), peak_day]
+        spikes = detect_spikes(views)
+        spike_days = spikes.sum(axis=1)
+        first_spike = np.where(spike_days > 0, spikes.argmax(axis=1), -1)
+        smoothed_peak, half_life, rate = decay(views)
+
+        parts.append(pd.DataFrame({
+            "total_views": totals,
+            "peak_date": store.dates[peak_day],
+            "peak_views": peak_views,
+            "peak_share": np.divide(peak_views, totals, out=np.zeros(count), where=totals > 0),
+            "spike_days": spike_days,
+            "longest_burst": longest_runs(spikes),
+            "first_spike": store.dates[np.maximum(first_spike, 0)].where(first_spike >= 0),
+            # The smoothed peak is the last day of the best SMOOTH_DAYS-day stretch
+            "peak_week_date": store.dates[np.maximum(smoothed_peak - (SMOOTH_DAYS - 1), 0)],
+            "half_life_days": half_life,
+            "decay_rate": rate,
+        }))
+
+    metrics = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    metrics.insert(0, "article", store.songs["article"].to_numpy())
+    metrics.insert(0, "qid", store.songs["qid"].to_numpy())
+    return metrics
+
+
+def load_song_metrics(project=DEFAULT_PROJECT, year=DEFAULT_YEAR):
+    """song_metrics() of a stored project-year, cached until the store changes (None if it wasn't built)."""
+    store = load_daily_store(project, year)
+    if store is None:
+        return None
+    return load_cached(store.path, lambda path: song_metrics(store), name="daily_metrics")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the daily songs x days store and print its spike metrics.")
+    parser.add_argument("--project", default=DEFAULT_PROJECT, help="Wiki to read")
+    parser.add_argument("--year", type=int, default=DEFAULT_YEAR, help="Year to read")
+    parser.add_argument("--root", default=DUMPS_DIR, help="Dumps folder")
+    parser.add_argument("--database", default=None, help="DuckDB file or URL to read instead of the dumps")
+    parser.add_argument("--top", type=int, default=10, help="Songs listed")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    daily = fetch_daily(args.project, args.year, args.root, args.database)
+    fetched = time.perf_counter() - start
+    out_dir = build_daily_store(daily, args.year, store_path(args.project, args.year),
+                                repair_encoding=args.project in REPAIR_TITLES,
+                                catalog=load_catalog() if args.project == DEFAULT_PROJECT else None)
+    built = time.perf_counter() - start - fetched
+
+    store = DailyStore(out_dir)
+    start = time.perf_counter()
+    metrics = song_metrics(store)
+    measured = time.perf_counter() - start
+    print(f"{len(daily):,} song-days fetched in {fetched:.2f}s; {len(store):,} x {len(store.dates)} matrix "
+          f"({store.views.nbytes / 1e6:.1f} MB) written in {built:.2f}s; metrics in {measured:.2f}s")
+    columns = ["article", "total_views", "peak_date", "peak_share", "spike_days", "longest_burst", "half_life_days", "decay_rate"]
+    print("\nBiggest single-day spikes:")
+    print(metrics.sort_values("peak_views", ascending=False).head(args.top)[columns].to_string(index=False))
@@ -0,0 +1,216 @@
+# Description: Cached data loading for the CS 234 Final Project Streamlit app
+#
+# Streamlit reruns 2024_Songs.py from the top on every widget interaction, but
+# it only imports this module once per server process. The cache below lives at
+# module level, so every session and every rerun shares the same parsed
+# DataFrames. A file is only parsed again when its modification time or size
+# changes on disk.
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Folder that holds the csv files (the same folder as this script)
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Maximum amount of memory the cached DataFrames are allowed to use.
+# Can be changed with the SONGS_CACHE_BUDGET_MB environment variable.
+MEMORY_BUDGET_BYTES = int(os.environ.get("SONGS_CACHE_BUDGET_MB", "512")) * 1024 * 1024
+
+# --- Explicit column types ---
+# Giving pandas the types up front means it does not have to infer them, and the
+# repeated strings (artist, genre, qid) are stored once as categories.
+SONG_DTYPES = {
+    "year": "int32",
+    "month": "int32",
+    "article": "object",
+    "qid": "category",
+    "monthly_pageviews": "float64",  # stored as "41500.0" in the csv, cast to int64 below
+    "genre": "category",
+    "artist": "category",
+}
+
+MAIN_DTYPES = {
+    "year": "int32",
+    "month": "int32",
+    "song": "object",
+    "qid": "category",
+    "monthly_pageviews": "float64",
+    "genre": "category",
+    "artist": "category",
+    "lyrics": "object",
+}
+
+CLASSIFICATION_DTYPES = {
+    "song": "object",
+    "qid": "category",
+    "genre": "category",
+    "artist": "category",
+    "lyrics": "object",
+    "theme": "category",
+}
+
+# (path, name) -> (file signature, DataFrame, size in bytes)
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _file_signature(path):
+    """
+    Returns (mtime, size) for a file, used to notice when the file changes.
+
+    For a folder (a Parquet dataset) this is the newest mtime and the total
+    size of the files inside it.
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    newest, total = os.stat(path).st_mtime_ns, 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            stat = os.stat(os.path.join(root, file))
+            newest = max(newest, stat.st_mtime_ns)
+            total += stat.st_size
+    return (newest, total)
+
+
+def _resolve(path):
+    if os.path.isabs(path):
+        return path
+    return os.path.join(DATA_DIR, path)
+
+
+def _read_csv(path, dtypes):
+    """Parses one csv with the given column types."""
+    df = pd.read_csv(
+        path,
+        # Skip the leftover pandas index column ("Unnamed: 0") if the csv has one
+        usecols=lambda col: not col.startswith("Unnamed"),
+        dtype=dtypes,
+    )
+
+    # Pageviews are whole numbers, so store them as int64
+    if "monthly_pageviews" in df.columns:
+        df["monthly_pageviews"] = df["monthly_pageviews"].astype("int64")
+
+    return df
+
+
+def _frame_bytes(value):
+    """Memory used by a DataFrame, by every DataFrame in a dict of them, or by an object with nbytes."""
+    if isinstance(value, dict):
+        return sum(_frame_bytes(v) for v in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return int(value.memory_usage(deep=True).sum())
+
+
+def _evict(budget):
+    """Drops the least recently used DataFrames until the cache fits the budget."""
+    total = sum(entry[2] for entry in _cache.values())
+    while total > budget and len(_cache) > 1:
+        _, (_, _, nbytes) = _cache.popitem(last=False)
+        total -= nbytes
+
+
+def load_cached(path, reader, name="", budget=None):
+    """
+    Returns reader(path), reusing the cached result while the file is unchanged.
+
+    The result is shared between every session, so treat it as read-only and
+    call .copy() before modifying it.
+
+    Args:
+        path (str): File the result is built from, relative to DATA_DIR unless absolute.
+        reader (callable): Takes the full path and returns a DataFrame (or a dict of them).
+        name (str): Tells apart different results built from the same file.
+        budget (int): Memory budget in bytes (defaults to MEMORY_BUDGET_BYTES).
+
+    Returns:
+        The (possibly cached) result of reader.
+    """
+    full_path = _resolve(path)
+    key = (full_path, name)
+    signature = _file_signature(full_path)
+    if budget is None:
+        budget = MEMORY_BUDGET_BYTES
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == signature:
+            # Cache hit: mark it as recently used
+            _cache.move_to_end(key)
+            return entry[1]
+
+    # Parse outside of the lock so a slow file doesn't block the other loads
+    value = reader(full_path)
+    nbytes = _frame_bytes(value)
+
+    with _lock:
+        _cache[key] = (signature, value, nbytes)
+        _cache.move_to_end(key)
+        _evict(budget)
+
+    return value
+
+
+def load_csv(path, dtypes=None, budget=None):
+    """Returns the parsed csv at path with the given column types (cached, read-only)."""
+    return load_cached(path, lambda full_path: _read_csv(full_path, dtypes), budget=budget)
+
+
+def songs_source(path="song_st.csv"):
+    """
+    Returns the file load_songs() will actually read for path.
+
+    That is the Parquet dataset written by storage.py (pageviews/song_st/) when it
+    exists and is at least as new as the csv, and the csv otherwise.
+    """
+    full_path = _resolve(path)
+    if os.path.isdir(full_path):
+        return full_path
+
+    name = os.path.splitext(os.path.basename(full_path))[0]
+    dataset = os.path.join(DATA_DIR, "pageviews", name)
+    if os.path.isdir(dataset):
+        if not os.path.exists(full_path) or _file_signature(dataset)[0] >= _file_signature(full_path)[0]:
+            return dataset
+    return full_path
+
+
+def load_songs(path="song_st.csv"):
+    """Monthly pageviews per song with genre and artist (song_st.csv or its Parquet dataset)."""
+    source = songs_source(path)
+    if os.path.isdir(source):
+        # Only needs pyarrow when the Parquet dataset is actually there
+        from storage import read_dataset
+        return load_cached(source, read_dataset)
+    return load_csv(source, SONG_DTYPES)
+
+
+def load_main(path="main.csv"):
+    """Songs matched with the Kaggle lyrics (main.csv)."""
+    return load_csv(path, MAIN_DTYPES)
+
+
+def load_classification(path="clean_classification.csv"):
+    """Unique songs with their zero-shot theme label (clean_classification.csv)."""
+    return load_csv(path, CLASSIFICATION_DTYPES)
+
+
+def cache_info():
+    """Returns a small summary of what is currently cached."""
+    with _lock:
+        return {
+            "entries": [os.path.basename(path) + (f" ({name})" if name else "") for path, name in _cache],
+            "bytes": sum(entry[2] for entry in _cache.values()),
+            "budget": MEMORY_BUDGET_BYTES,
+        }
+
+
+def clear_cache():
+    """Forgets every cached DataFrame (the next load parses the files again)."""
+    with _lock:
+        _cache.clear()
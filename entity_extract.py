@@ -0,0 +1,198 @@
+# Description: Streaming extraction of Wikidata attributes from entity_results3.jsonl
+#
+# song_classification.ipynb reads the whole jsonl with pd.read_json and then
+# runs df.apply(safe_value_lookup, axis=1) once per attribute, which walks every
+# row in Python twice and keeps the nested "attributes" dicts in memory. This
+# module reads the file line by line once, pulls every requested attribute at
+# the same time, and only keeps the flat values.
+#
+# Attributes can hold a single value ("Connie Francis") or a list of values
+# (["Beyoncé", "Jay-Z"]). The wide table keeps the first value, which is what
+# the notebook did, and explode_attribute() gives every value as its own row.
+#
+# Usage:
+#     python entity_extract.py                                  # prints a summary
+#     python entity_extract.py entity_results3.jsonl entities.parquet
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from data_loader import DATA_DIR
+
+# Attribute key -> output column, matching the columns used in song_st.csv
+DEFAULT_ATTRIBUTES = {"genre": "genre", "performer": "artist"}
+
+
+def _first(value):
+    """First value of a multi-valued attribute (or the value itself)."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _all(value):
+    """Every value of an attribute as a list."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def iter_entity_chunks(path, attributes=None, chunk_size=50_000, include_failed=False):
+    """
+    Reads the jsonl in one pass and yields flat DataFrames of at most chunk_size rows.
+
+    Only the requested attributes are kept, so memory stays bounded by chunk_size
+    no matter how large the file is.
+
+    Args:
+        path (str): jsonl file written by wikidata_fetcher.py.
+        attributes (dict): Attribute key -> output column (default: genre, artist).
+        chunk_size (int): Rows per yielded DataFrame.
+        include_failed (bool): Also yield rows for failed lookups (with empty attributes).
+
+    Yields:
+        pd.DataFrame: qid, label, description and one column per attribute.
+    """
+    if attributes is None:
+        attributes = DEFAULT_ATTRIBUTES
+    keys = list(attributes)
+
+    def empty_columns():
+        columns = {"qid": [], "label": [], "description": []}
+        for key in keys:
+            columns[attributes[key]] = []
+        return columns
+
+    columns = empty_columns()
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("status") != "success" and not include_failed:
+                continue
+
+            found = record.get("attributes") or {}
+            columns["qid"].append(record.get("QID"))
+            columns["label"].append(record.get("label"))
+            columns["description"].append(record.get("description"))
+            for key in keys:
+                columns[attributes[key]].append(_first(found.get(key)))
+
+            if len(columns["qid"]) >= chunk_size:
+                yield pd.DataFrame(columns)
+                columns = empty_columns()
+
+    if columns["qid"]:
+        yield pd.DataFrame(columns)
+
+
+def extract_entities(path=None, attributes=None, chunk_size=50_000, categorical=True):
+    """
+    Returns one row per entity with the requested attributes as typed columns.
+
+    Args:
+        path (str): jsonl file (default: entity_results3.jsonl).
+        attributes (dict): Attribute key -> output column (default: genre, artist).
+        chunk_size (int): Rows parsed per chunk.
+        categorical (bool): Store the attribute columns as categories.
+
+    Returns:
+        pd.DataFrame: qid, label, description and one column per attribute,
+        ready to merge onto the pageview table on "qid".
+    """
+    if path is None:
+        path = os.path.join(DATA_DIR, "entity_results3.jsonl")
+    if attributes is None:
+        attributes = DEFAULT_ATTRIBUTES
+
+    chunks = list(iter_entity_chunks(path, attributes, chunk_size))
+    if not chunks:
+        return pd.DataFrame(columns=["qid", "label", "description"] + list(attributes.values()))
+    entities = pd.concat(chunks, ignore_index=True)
+
+    if categorical:
+        for column in attributes.values():
+            entities[column] = entities[column].astype("category")
+    return entities
+
+
+def explode_attribute(path=None, key="performer", column=None):
+    """
+    Returns every (qid, value) pair of a multi-valued attribute, in one pass.
+
+    Args:
+        path (str): jsonl file (default: entity_results3.jsonl).
+        key (str): Attribute key, e.g. "performer" or "genre".
+        column (str): Name of the value column (defaults to DEFAULT_ATTRIBUTES or key).
+
+    Returns:
+        pd.DataFrame: qid, position (0 for the first value) and the value column.
+    """
+    if path is None:
+        path = os.path.join(DATA_DIR, "entity_results3.jsonl")
+    if column is None:
+        column = DEFAULT_ATTRIBUTES.get(key, key)
+
+    qids, positions, values = [], [], []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("status") != "success":
+                continue
+            for position, value in enumerate(_all((record.get("attributes") or {}).get(key))):
+                qids.append(record.get("QID"))
+                positions.append(position)
+                values.append(value)
+
+    return pd.DataFrame({
+        "qid": qids,
+        "position": pd.array(positions, dtype="int32"),
+        column: pd.Categorical(values),
+    })
+
+
+def attach_entities(pageviews, entities, columns=None):
+    """
+    Adds the entity attribute columns to the monthly pageview table (left join on qid).
+
+    Args:
+        pageviews (pd.DataFrame): Rows shaped like articles_song3.csv.
+        entities (pd.DataFrame): Output of extract_entities().
+        columns (list): Entity columns to add (default: every attribute column).
+
+    Returns:
+        pd.DataFrame: Rows shaped like song_st.csv.
+    """
+    if columns is None:
+        columns = [col for col in entities.columns if col not in ("qid", "label", "description")]
+    lookup = entities[["qid"] + columns].drop_duplicates(subset="qid")
+    merged = pageviews.merge(lookup, on="qid", how="left", validate="many_to_one")
+    for column in columns:
+        if isinstance(entities[column].dtype, pd.CategoricalDtype):
+            merged[column] = merged[column].astype("category")
+    return merged
+
+
+if __name__ == "__main__":
+    in_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, "entity_results3.jsonl")
+    start = time.perf_counter()
+    table = extract_entities(in_path)
+    elapsed = time.perf_counter() - start
+    print(f"{len(table):,} entities extracted in {elapsed:.2f}s "
+          f"({table['genre'].notna().sum():,} with a genre, {table['artist'].notna().sum():,} with a performer)")
+
+    if len(sys.argv) > 2:
+        out_path = sys.argv[2]
+        if out_path.endswith(".parquet"):
+            table.to_parquet(out_path, index=False)
+        else:
+            table.to_csv(out_path, index=False)
+        print(f"Saved to {out_path}")
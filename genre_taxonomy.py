@@ -0,0 +1,365 @@
+# Description: Genre hierarchy and a precomputed genre x month pageview cube
+#
+# song_st.csv has one genre per song, and there are 320 of them ("pop music",
+# "synth-pop", "crunk&B", ...), too many to compare side by side. This module
+# puts them in a hierarchy so the app can roll them up into families and drill
+# back down:
+#   - the hierarchy is Wikidata's "subclass of" (P279) between genres, fetched
+#     once with --fetch and kept in wikidata_cache/genre_taxonomy.json
+#   - genres the cache doesn't cover (or every genre, without the cache) are put
+#     under their family by keyword rules (FAMILY_RULES), e.g. "synth-pop" under
+#     both "pop music" and "electronic music"
+#   - a genre can have several parents, so the hierarchy is a DAG; its closure
+#     (every genre -> all of its ancestors) is a sparse boolean matrix, and a song
+#     counts once towards each of its genre's ancestors
+#   - the cube is genres x months of pageviews, one sparse matrix product of the
+#     closure with the pageviews of each leaf genre
+# Each genre's children are stored with offsets (like aggregates.py's
+# month_offsets), so drilling into a genre or rolling up from it only reads
+# that genre's children from the cube, however many rows the data has.
+#
+# Usage:
+#     python genre_taxonomy.py            # genre families with their songs and pageviews
+#     python genre_taxonomy.py --fetch    # fetch the subclass-of hierarchy from Wikidata first
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_loader import DATA_DIR, _file_signature, load_cached, load_songs, songs_source
+
+# Genre label -> parent genre labels, written by --fetch
+TAXONOMY_PATH = os.path.join(DATA_DIR, "wikidata_cache", "genre_taxonomy.json")
+
+# How many subclass-of steps above a genre --fetch follows
+MAX_DEPTH = 6
+
+ROOT = "All genres"
+NO_GENRE = "(no genre)"
+# Family of the genres no rule matches
+OTHER = "other genres"
+
+# Classes above the genres that would only join everything into one node
+STOP_LABELS = {
+    "genre", "music genre", "art genre", "musical genre", "music", "style", "musical style",
+    "art style", "concept", "class", "work", "creative work", "culture", "cultural movement",
+    "subculture", "popular culture", "movement", "art movement", "entity", "activity", "art",
+}
+
+# Family -> pattern of the genre labels that belong to it (when the cache doesn't say)
+FAMILY_RULES = {
+    "hip-hop": r"hip[- ]?hop|\brap|trap|drill|crunk|grime|boom bap|gangsta|bounce|horrorcore|snap music|\brage\b",
+    "rock music": r"rock|grunge|punk|metal|hardcore|\bemo\b|shoegaze|britpop|new wave|prog|alternative|surf|härte|skiffle",
+    "pop music": r"\bpop\b|-pop|pop$|popular music|bubblegum|brill building|adult contemporary|easy listening|schlager|kayōkyoku|chanson",
+    "rhythm and blues": r"r&b|rhythm and blues|soul|funk|motown|doo-wop|new jack swing|quiet storm",
+    "country music": r"country|bluegrass|honky|americana|western|outlaw|appalachian",
+    "electronic music": r"electro|house|techno|trance|\bedm\b|dubstep|disco|dance|synth|drum and bass|garage|ambient"
+                        r"|hi-nrg|hyperpop|trip hop|chillwave|future bass|moombahton|big beat|downtempo|balearic|new age",
+    "folk music": r"folk|singer-songwriter|celtic|traditional|carol|ballad|cumulative song|romance|spirituals",
+    "jazz": r"jazz|swing|bop\b|big band|bossa nova|lounge|stride|torch song",
+    "blues": r"(?<!rhythm and )\bblues\b",
+    "Christian music": r"christian|gospel|worship|hymn|christmas|religious|spirituals",
+    "Latin music": r"latin|reggaeton|salsa|bachata|cumbia|bolero|mariachi|regional mexican|corrido|banda|tango|dembow"
+                   r"|samba|mambo|cha-cha|lambada|boogaloo",
+    "reggae": r"reggae|\bska\b|2 tone|dancehall|\bdub\b|ragga|shatta|afrobeat|afroswing|soca|calypso",
+    "classical music": r"classical|opera|orchestra|baroque|symphon|musical|show tune|soundtrack|film score|stage and screen",
+}
+
+
+# --- 1. Taxonomy ---
+
+def load_taxonomy(path=TAXONOMY_PATH):
+    """Genre label -> parent genre labels from the fetched cache (empty without it)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def fetch_taxonomy(genres, path=TAXONOMY_PATH, max_depth=MAX_DEPTH):
+    """
+    Fetches the subclass-of hierarchy above genres from Wikidata and saves it
+    as genre label -> parent labels.
+
+    The genre labels are turned back into QIDs through the fetcher's label
+    cache, so run wikidata_fetcher.py on the songs first. Entities already in
+    the fetcher's cache aren't asked for again.
+
+    Returns:
+        dict: Genre label -> parent labels.
+    """
+    # Only needed (with network access) when the hierarchy is actually fetched
+    from wikidata_fetcher import WikidataFetcher
+
+    fetcher = WikidataFetcher()
+    qids_by_label = {}
+    for qid, label in fetcher.labels.items():
+        qids_by_label.setdefault(label, qid)
+    frontier = sorted({qids_by_label[genre] for genre in genres if genre in qids_by_label})
+
+    # Walk up one level at a time, only asking for QIDs not seen yet
+    parents, seen = {}, set()
+    for _ in range(max_depth):
+        frontier = [qid for qid in frontier if qid not in seen]
+        if not frontier:
+            break
+        seen.update(frontier)
+        found = fetcher.fetch_subclass_of(frontier)
+        parents.update(found)
+        frontier = sorted({parent for qids in found.values() for parent in qids})
+    fetcher.fetch_labels(sorted({parent for qids in parents.values() for parent in qids}))
+
+    labels = fetcher.labels
+    taxonomy = {}
+    for qid, parent_qids in parents.items():
+        if qid not in labels:
+            continue
+        taxonomy[labels[qid]] = sorted({labels[parent] for parent in parent_qids
+                                        if parent in labels and labels[parent] != labels[qid]})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(taxonomy, file, ensure_ascii=False, indent=1, sort_keys=True)
+    return taxonomy
+
+
+def family_parents(genre):
+    """Families whose FAMILY_RULES pattern matches genre (not counting the genre itself)."""
+    lowered = genre.lower()
+    return [family for family, pattern in FAMILY_RULES.items()
+            if family != genre and re.search(pattern, lowered)]
+
+
+def genre_edges(genres, taxonomy=None):
+    """
+    Child -> parent edges of the hierarchy above genres.
+
+    A genre in the taxonomy gets its subclass-of parents, minus STOP_LABELS,
+    and goes directly under ROOT when none are left. One that isn't gets its
+    families from FAMILY_RULES (the families go under ROOT), or OTHER when no
+    rule matches.
+
+    Returns:
+        pd.DataFrame: child and parent labels.
+    """
+    taxonomy = load_taxonomy() if taxonomy is None else taxonomy
+    edges, seen, stack = [], set(), list(genres)
+    while stack:
+        genre = stack.pop()
+        if genre in seen or genre == ROOT:
+            continue
+        seen.add(genre)
+        if genre in taxonomy:
+            parents = [parent for parent in taxonomy[genre] if parent.lower() not in STOP_LABELS] or [ROOT]
+        elif genre in FAMILY_RULES or genre in (OTHER, NO_GENRE):
+            parents = [ROOT]
+        else:
+            parents = family_parents(genre) or [OTHER]
+        edges.extend((genre, parent) for parent in parents)
+        stack.extend(parents)
+    return pd.DataFrame(edges, columns=["child", "parent"]).drop_duplicates(ignore_index=True)
+
+
+# --- 2. Closure and cube ---
+
+def ancestor_closure(edges, nodes):
+    """
+    Sparse boolean nodes x nodes matrix: [i, j] is set when j is i or one of its ancestors.
+
+    Repeats reach = reach + reach @ parents until no new pair shows up, so a
+    cycle in the hierarchy can't make it loop forever.
+    """
+    index = pd.Index(nodes)
+    n = len(index)
+    parents = sparse.csr_matrix(
+        (np.ones(len(edges), dtype=bool), (index.get_indexer(edges["child"]), index.get_indexer(edges["parent"]))),
+        shape=(n, n)
+    )
+    reach = sparse.identity(n, dtype=bool, format="csr")
+    while True:
+        grown = (reach + reach @ parents).astype(bool)
+        if grown.nnz == reach.nnz:
+            return grown
+        reach = grown
+
+
+def _attach_cycles(edges, nodes, reach):
+    """
+    Edges from ROOT's missing children to ROOT.
+
+    A cycle in the subclass-of hierarchy ("rock music" and "popular music" as
+    each other's subclass) can leave genres with parents but no way up to ROOT.
+    Each such genre whose ancestors are all also its descendants is the top of
+    its cycle, and goes under ROOT.
+    """
+    root = nodes.get_loc(ROOT)
+    lost = np.flatnonzero(~np.asarray(reach[:, root].todense()).ravel())
+    tops = []
+    for node in lost:
+        ancestors = reach[node].indices
+        if np.asarray(reach[ancestors, node].todense()).all():
+            tops.append(nodes[node])
+    return pd.DataFrame({"child": tops, "parent": ROOT})
+
+
+def _levels(edges, nodes):
+    """Fewest steps from ROOT down to each node (breadth-first)."""
+    children = edges.groupby("parent")["child"].agg(list).to_dict()
+    levels, frontier, level = {ROOT: 0}, [ROOT], 0
+    while frontier:
+        level += 1
+        frontier = [child for node in frontier for child in children.get(node, []) if child not in levels]
+        for child in frontier:
+            levels.setdefault(child, level)
+    return np.array([levels.get(node, -1) for node in nodes])
+
+
+def build_genre_cube(data, taxonomy=None):
+    """
+    Builds the genre hierarchy and its genre x month pageview cube.
+
+    Args:
+        data (pd.DataFrame): Rows shaped like song_st.csv.
+        taxonomy (dict): Genre label -> parent labels (defaults to load_taxonomy()).
+
+    Returns:
+        dict:
+            nodes:    one row per genre in the hierarchy that has songs: genre,
+                      level (steps below ROOT), songs, total_pageviews, children
+                      and first_child/last_child (its range in child_index)
+            child_index: positions in nodes of every genre's children, grouped by parent
+            cube:     nodes x months array of pageviews
+            months:   the months of the cube's columns
+    """
+    # One genre per song (it never changes between months in song_st.csv)
+    genres = data["genre"].astype(object).fillna(NO_GENRE)
+    leaves = sorted(genres.unique())
+    edges = genre_edges(leaves, taxonomy)
+    nodes = pd.Index(sorted(set(leaves) | set(edges["child"]) | set(edges["parent"]) | {ROOT}))
+    reach = ancestor_closure(edges, nodes)
+    cycle_edges = _attach_cycles(edges, nodes, reach)
+    if len(cycle_edges):
+        edges = pd.concat([edges, cycle_edges], ignore_index=True)
+        reach = ancestor_closure(edges, nodes)
+
+    # Pageviews and songs of each leaf genre, spread up to every ancestor by the closure
+    months = np.sort(data["month"].unique())
+    leaf_codes = nodes.get_indexer(genres)
+    month_codes = np.searchsorted(months, data["month"].to_numpy())
+    leaf_months = sparse.csr_matrix(
+        (data["monthly_pageviews"].fillna(0).to_numpy(dtype=float), (leaf_codes, month_codes)),
+        shape=(len(nodes), len(months))
+    )
+    song_genres = pd.DataFrame({"qid": data["qid"].astype(object), "leaf": leaf_codes}).dropna().drop_duplicates("qid")
+    leaf_songs = np.bincount(song_genres["leaf"], minlength=len(nodes)).astype(float)
+
+    reach_t = reach.T.astype(float).tocsr()
+    cube = np.asarray((reach_t @ leaf_months).todense())
+    songs = reach_t @ leaf_songs
+
+    # Genres without songs (above nothing in the data) are dropped
+    keep = songs > 0
+    kept = nodes[keep]
+    cube = cube[keep]
+    edges = edges[edges["child"].isin(kept) & edges["parent"].isin(kept)]
+
+    # Children grouped by parent, biggest first, with each parent's range in the list
+    positions = pd.Series(np.arange(len(kept)), index=kept)
+    totals = cube.sum(axis=1)
+    edges = edges.assign(
+        parent_pos=positions[edges["parent"]].to_numpy(),
+        child_pos=positions[edges["child"]].to_numpy(),
+    )
+    edges = edges.assign(child_total=totals[edges["child_pos"]])
+    edges = edges.sort_values(["parent_pos", "child_total", "child"], ascending=[True, False, True])
+    counts = np.bincount(edges["parent_pos"], minlength=len(kept))
+    last = np.cumsum(counts)
+
+    node_table = pd.DataFrame({
+        "genre": kept,
+        "level": _levels(edges, kept),
+        "songs": songs[keep].astype(int),
+        "total_pageviews": totals,
+        "children": counts,
+        "first_child": last - counts,
+        "last_child": last,
+    })
+    return {
+        "nodes": node_table,
+        "child_index": edges["child_pos"].to_numpy(),
+        "cube": cube,
+        "months": months,
+    }
+
+
+def taxonomy_version(path=TAXONOMY_PATH):
+    """(mtime, size) of the taxonomy file, or None without it; changes whenever --fetch rewrites it."""
+    return _file_signature(path) if os.path.exists(path) else None
+
+
+def load_genre_cube(source="song_st.csv"):
+    """build_genre_cube() of a pageview source, cached until it or the taxonomy changes."""
+    # A new taxonomy file is a new entry
+    return load_cached(
+        songs_source(source),
+        lambda source_path: build_genre_cube(load_songs(source)),
+        name=f"genre_cube_{taxonomy_version()}"
+    )
+
+
+# --- 3. Drill-down and roll-up ---
+
+def node_position(genre_cube, genre):
+    """Position of genre in the cube's nodes."""
+    return genre_cube["nodes"].index[genre_cube["nodes"]["genre"] == genre][0]
+
+
+def children(genre_cube, genre):
+    """
+    The children of genre (one level of drill-down).
+
+    Only reads genre's own range of child_index, so it costs the same however
+    many rows the data has; genre_months() gives their months.
+
+    Returns:
+        pd.DataFrame: genre, songs, total_pageviews and children (their own
+        number of children), biggest first (empty for a genre without children).
+    """
+    nodes = genre_cube["nodes"]
+    row = nodes.iloc[node_position(genre_cube, genre)]
+    positions = genre_cube["child_index"][row["first_child"]:row["last_child"]]
+    return nodes.iloc[positions][["genre", "songs", "total_pageviews", "children"]].reset_index(drop=True)
+
+
+def genre_months(genre_cube, genres):
+    """
+    Pageviews per month of genres, in long form (genre, month, monthly_pageviews).
+    """
+    nodes = genre_cube["nodes"]
+    positions = [node_position(genre_cube, genre) for genre in genres]
+    frame = pd.DataFrame(genre_cube["cube"][positions], index=nodes["genre"].iloc[positions],
+                         columns=genre_cube["months"])
+    frame.index.name, frame.columns.name = "genre", "month"
+    return frame.stack().rename("monthly_pageviews").reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll the genres up into a hierarchy and print its top levels.")
+    parser.add_argument("--source", default="song_st.csv", help="Pageview table")
+    parser.add_argument("--fetch", action="store_true", help="Fetch the subclass-of hierarchy from Wikidata first")
+    parser.add_argument("--genre", default=ROOT, help="Genre whose children are listed")
+    args = parser.parse_args()
+
+    data = load_songs(args.source)
+    if args.fetch:
+        taxonomy = fetch_taxonomy(sorted(data["genre"].dropna().astype(str).unique()))
+        print(f"Saved the parents of {len(taxonomy):,} genres to {os.path.relpath(TAXONOMY_PATH, DATA_DIR)}")
+
+    genre_cube = build_genre_cube(data)
+    nodes = genre_cube["nodes"]
+    print(f"{len(nodes):,} genres in {nodes['level'].max()} levels, "
+          f"{'from the Wikidata hierarchy' if load_taxonomy() else 'by keyword families (no taxonomy cache)'}")
+    print(children(genre_cube, args.genre).to_string(index=False))
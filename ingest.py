@@ -0,0 +1,232 @@
+# Description: Incremental monthly ingestion from the DuckDB pageview database
+#
+# my_collection.ipynb builds articles_song3.csv with one big GROUP BY over the
+# whole year of daily pageviews. This script does the same aggregation, but it
+# remembers the last day it has already counted for every month (the
+# "high-water mark") and only aggregates the days after it. The new totals are
+# merged into the stored monthly table, so running it twice in a row does
+# nothing the second time, and running it after a new month of data only
+# touches that month.
+#
+# The high-water mark is stored as a last_date column inside each month's
+# Parquet file, so the totals and the mark are always replaced together.
+#
+# Usage:
+#     python ingest.py                      # the Wellesley CS 2024 database
+#     python ingest.py --database my.duckdb # a local copy
+#     python ingest.py --rebuild            # drop the stored months and start over
+import argparse
+import os
+import shutil
+import time
+
+import duckdb
+import pandas as pd
+
+from data_loader import DATA_DIR
+from song_catalog import CATALOG_PATH, build_catalog, split_titles, update_qid_list, write_catalog
+from storage import PAGEVIEWS_DIR, read_dataset, write_dataset
+
+DATABASE_URL = "https://cs.wellesley.edu/~eni/duckdb/2024_wiki_views.duckdb"
+
+# Only articles whose title ends with "(song)", like in the notebook
+ARTICLE_PATTERN = "%song)"
+
+# Monthly totals keyed by the raw article title (before cleaning), since cleaned
+# titles are not unique ("Gloria_(Them_song)" and "Gloria_(Umberto_Tozzi_song)")
+RAW_DATASET = os.path.join(PAGEVIEWS_DIR, "articles_raw")
+
+KEY_COLUMNS = ["year", "month", "article"]
+
+
+def connect(database):
+    """Opens a DuckDB connection to a local file or attaches a remote database read-only."""
+    if database.startswith("http://") or database.startswith("https://"):
+        conn = duckdb.connect()
+        # The HTTPFS extension is required to access remote files over the web
+        conn.execute("INSTALL httpfs;")
+        conn.execute("LOAD httpfs;")
+        conn.execute(f"ATTACH '{database}' AS web_db (READ_ONLY);")
+        conn.execute("USE web_db;")
+        return conn
+    return duckdb.connect(database, read_only=True)
+
+
+def load_watermarks(stored):
+    """Returns the high-water mark of every stored month ({"YYYY-MM": "YYYY-MM-DD"})."""
+    if stored is None or stored.empty:
+        return {}
+    last_dates = stored.groupby(["year", "month"])["last_date"].max()
+    return {
+        f"{int(year):04d}-{int(month):02d}": pd.Timestamp(last_date).strftime("%Y-%m-%d")
+        for (year, month), last_date in last_dates.items()
+    }
+
+
+def fetch_new_days(conn, months, pattern=ARTICLE_PATTERN):
+    """
+    Aggregates the daily pageviews that come after each month's high-water mark.
+
+    Args:
+        conn: DuckDB connection with a data_table(date, article, qid, pageviews).
+        months (dict): "YYYY-MM" -> last date already ingested for that month.
+        pattern (str): LIKE pattern for the article titles.
+
+    Returns:
+        pd.DataFrame: year, month, article, qid, monthly_pageviews, last_date
+        for the new days only.
+    """
+    conn.execute("CREATE OR REPLACE TEMP TABLE watermarks (year INTEGER, month INTEGER, last_date DATE)")
+    if months:
+        rows = [(int(key[:4]), int(key[5:7]), value) for key, value in months.items()]
+        conn.executemany("INSERT INTO watermarks VALUES (?, ?, CAST(? AS DATE))", rows)
+        # Every month before the oldest mark has been fully counted already, so
+        # DuckDB can skip those row groups without reading them
+        lowest_mark = min(months.values())
+    else:
+        lowest_mark = "0001-01-01"
+
+    query = """
+    SELECT
+        YEAR(t1.date) AS year,
+        MONTH(t1.date) AS month,
+        t1.article,
+        MIN(t1.qid) AS qid,
+        SUM(t1.pageviews) AS monthly_pageviews,
+        MAX(t1.date) AS last_date
+    FROM
+        data_table t1
+    LEFT JOIN watermarks w
+        ON w.year = YEAR(t1.date) AND w.month = MONTH(t1.date)
+    WHERE
+        t1.date > CAST(? AS DATE)
+        AND (w.last_date IS NULL OR t1.date > w.last_date)
+        AND t1.article LIKE ?
+    GROUP BY
+        YEAR(t1.date),
+        MONTH(t1.date),
+        t1.article
+    """
+    result = conn.execute(query, [lowest_mark, pattern]).df()
+    result["monthly_pageviews"] = result["monthly_pageviews"].astype("int64")
+    return result
+
+
+def merge_new_days(stored, new_rows):
+    """
+    Adds the new days' totals onto the stored monthly totals.
+
+    Returns:
+        pd.DataFrame: Only the (year, month) partitions that changed, with all of
+        their rows and the month's new high-water mark, ready to be written back.
+    """
+    columns = KEY_COLUMNS + ["qid", "monthly_pageviews", "last_date"]
+    new_rows = new_rows[columns]
+    touched = new_rows[["year", "month"]].drop_duplicates()
+
+    if stored is None or stored.empty:
+        old_rows = new_rows.iloc[0:0]
+    else:
+        old_rows = stored.merge(touched, on=["year", "month"])[columns]
+
+    combined = pd.concat([old_rows, new_rows], ignore_index=True)
+    combined["qid"] = combined["qid"].astype(object)
+    combined["last_date"] = pd.to_datetime(combined["last_date"])
+    merged = combined.groupby(KEY_COLUMNS, as_index=False).agg(
+        qid=("qid", "first"),
+        monthly_pageviews=("monthly_pageviews", "sum"),
+    )
+
+    # Every row of a month shares the month's mark, even articles with no new days
+    month_marks = combined.groupby(["year", "month"], as_index=False)["last_date"].max()
+    merged = merged.merge(month_marks, on=["year", "month"])
+    merged["last_date"] = merged["last_date"].dt.date
+    return merged.sort_values(
+        by=["year", "month", "monthly_pageviews"],
+        ascending=[True, True, False]
+    ).reset_index(drop=True)
+
+
+def clean_titles(articles, repair_encoding=True):
+    """
+    Turns raw titles like "Espresso_(Sabrina_Carpenter_song)" into "Espresso".
+
+    Args:
+        articles (pd.Series): Raw article titles.
+        repair_encoding (bool): Undo the Latin-1/UTF-8 mix-up of the 2024 database
+            (turn off for titles that are already proper UTF-8).
+    """
+    # Each distinct title is cleaned once (see song_catalog.py)
+    return split_titles(articles, repair_encoding)["title"].rename(articles.name)
+
+
+def write_outputs(stored, csv_path, qid_path, catalog_path=CATALOG_PATH):
+    """Writes articles_song3.csv and song_catalog.csv, and appends any new QIDs to qid_list3.txt."""
+    result = stored.sort_values(
+        by=["year", "month", "monthly_pageviews"],
+        ascending=[True, True, False]
+    ).reset_index(drop=True)
+
+    # One row per QID, in the order the QIDs first appear
+    catalog = build_catalog(result)
+    write_catalog(catalog, catalog_path)
+
+    result["article"] = clean_titles(result["article"])
+    result[["year", "month", "article", "qid", "monthly_pageviews"]].to_csv(csv_path, index=True, header=True)
+
+    # Keep the existing QID order and only add the ones we haven't seen yet
+    return update_qid_list(catalog, qid_path)
+
+
+def ingest(database=DATABASE_URL, csv_path=None, qid_path=None, rebuild=False):
+    """
+    Brings the stored monthly table up to date with the database.
+
+    Returns:
+        dict: Counts describing what changed.
+    """
+    if csv_path is None:
+        csv_path = os.path.join(DATA_DIR, "articles_song3.csv")
+    if qid_path is None:
+        qid_path = os.path.join(DATA_DIR, "qid_list3.txt")
+
+    if rebuild and os.path.isdir(RAW_DATASET):
+        # Start from an empty dataset so months that disappeared don't linger
+        shutil.rmtree(RAW_DATASET)
+
+    stored = read_dataset(RAW_DATASET) if os.path.isdir(RAW_DATASET) else None
+    months = load_watermarks(stored)
+
+    conn = connect(database)
+    try:
+        new_rows = fetch_new_days(conn, months)
+    finally:
+        conn.close()
+
+    summary = {"new_rows": len(new_rows), "months_updated": 0, "new_qids": 0}
+    if not new_rows.empty:
+        changed = merge_new_days(stored, new_rows)
+        # Only the changed year/month folders are replaced
+        write_dataset(changed, RAW_DATASET)
+        stored = read_dataset(RAW_DATASET)
+        summary["months_updated"] = len(changed[["year", "month"]].drop_duplicates())
+
+    # Also (re)written when nothing is new, in case a previous run stopped before this step
+    if stored is not None:
+        summary["new_qids"] = write_outputs(stored, csv_path, qid_path)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally aggregate new days of song pageviews.")
+    parser.add_argument("--database", default=DATABASE_URL, help="DuckDB file path or URL")
+    parser.add_argument("--csv", default=None, help="Output csv (default: articles_song3.csv)")
+    parser.add_argument("--qids", default=None, help="Output QID list (default: qid_list3.txt)")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the stored months and re-aggregate everything")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = ingest(args.database, args.csv, args.qids, rebuild=args.rebuild)
+    elapsed = time.perf_counter() - start
+    print(f"Aggregated {summary['new_rows']:,} new article-month rows across "
+          f"{summary['months_updated']} month(s), {summary['new_qids']} new QID(s) in {elapsed:.1f}s")
@@ -0,0 +1,322 @@
+# Description: Compiled, single-pass lyrics normalization
+#
+# song_classification.ipynb cleans lyrics with several regex-heavy functions
+# (clean_lyric_ultimate_final, clean_lyric_by_replacement, clean_lyrics,
+# extract_lyrics_after_marker) plus cleaning_stopwords, cleaning_punctuations
+# and a RegexpTokenizer, each applied with its own .apply pass over the column,
+# and most of them build their regex patterns again on every call.
+#
+# This module gives the same results, but:
+#   - every pattern is compiled once when the module is imported
+#   - the steps for a source are chained into one function, so the column is
+#     only walked once no matter how many steps there are
+#   - large columns can be split across several processes
+#
+# The output is meant to be identical to the notebook functions;
+# benchmarks/bench_lyrics_clean.py checks that and times both versions.
+import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# --- Compiled patterns ---
+
+# Patterns that start with \s* before a word are slow to search for, because the
+# regex engine retries them at every character. Each one gets a "hint": the same
+# pattern without the leading \s*. The real pattern can only match where the hint
+# does, starting at the whitespace right before it, so the hint gives exactly the
+# same result for a fraction of the cost.
+_INSTRUMENTAL_HINT = re.compile(r'Instrumental', re.IGNORECASE)
+_PROMO_HINT = re.compile(r'See\s*[\w\s]+Live|Get\s*tickets|You\s*might\s*also\s*like|Post\-', re.IGNORECASE | re.DOTALL)
+_SUFFIX_HINT = re.compile(
+    r'Instrumental|See\s*[\w\s]+Live|Get\s*tickets|You\s*might\s*also\s*like|Post\-',
+    re.IGNORECASE | re.DOTALL
+)
+
+# _TRAILING_ARTIFACTS only ever matches at the end of the text, so clean_lyrics
+# looks for its words there directly instead of trying every position
+_END_ARTIFACT = re.compile(r'(?:Edit|Report a problem)$', re.IGNORECASE)
+_THANKS = re.compile(r'Thanks to ', re.IGNORECASE)
+
+# clean_lyric_ultimate_final
+_SPLIT_PREFIX = re.compile(
+    r'(lyrics\s*:\s*[\w\s]*)|([\w\s]*?[:])|(\w*lyrics\s*[:\s\-\(\)\w]*)|(\w*Instrumental\s*[:\s\-\(\)\w]*)',
+    re.IGNORECASE | re.DOTALL
+)
+# The notebook's junk suffix pattern was
+#   (\s*Instrumental\s*[:\s\w]*|\s*See\s*[\w\s]+Live|\s*Get\s*tickets|
+#    \s*You\s*might\s*also\s*like|\s*Post\-\s*|^\s*$)[\w\W]*
+# which cuts the text at the first _SUFFIX_HINT (or empties blank text).
+_PRICE = re.compile(r'\$\d+')
+
+# clean_lyric_by_replacement (applied in this order), each with its hint or None.
+# The promotional pattern runs to the end of the text, so replacing it is the
+# same as cutting the text at its hint; it's marked with cut=True.
+_JUNK_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE | re.DOTALL), hint, cut) for pattern, hint, cut in [
+        (r'^[\W\s]*(?:Lyrics|Deutsch|Español|Türkçe|[\w\s]*?:)[\w\W]*?(?=[A-Z]{2,}\s|\n)', None, False),
+        (r'^\s*\w+\s*:\s*\w+[\s\w]*', None, False),
+        (r'^\s*Lyrics\s*:\s*[\w\s]*', None, False),
+        (r'(\s*Instrumental\s*[:\s\w]*)+', _INSTRUMENTAL_HINT, False),
+        (r'(\s*See\s*[\w\s]+Live|\s*Get\s*tickets|\s*You\s*might\s*also\s*like|\s*Post\-\s*)+[\w\W]*$', _PROMO_HINT, True),
+        (r'\$\d+', None, False),
+        (r'online\s+lyrics\s*:\s*', None, False),
+        (r'Lyrics\s*:\s*', None, False),
+        (r'Lyrics\s*Instrumental\s*', None, False),
+        (r'Lyrics\s*', None, False),
+    ]
+]
+_WHITESPACE = re.compile(r'\s+')
+
+# clean_lyrics (Spotify lyrics dataset)
+_AFTER_LYRICS = re.compile(r'lyrics\s*(.*)', re.IGNORECASE | re.DOTALL)
+_TRAILING_ARTIFACTS = re.compile(r'\s*(?:Edit|Report a problem|Thanks to .*\.)\s*$', re.IGNORECASE | re.DOTALL)
+_LINE_BREAKS = re.compile(r'[\r\n]+')
+
+# extract_lyrics_after_marker (compiled per marker the first time it's used)
+_MARKERS = {}
+
+# RegexpTokenizer(r'\w+')
+_WORDS = re.compile(r'\w+', re.UNICODE | re.MULTILINE | re.DOTALL)
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+# NLTK's English stopwords (the notebook used nltk.corpus.stopwords). NLTK is
+# used when it's installed with its data, otherwise this copy of the list.
+_ENGLISH_STOPWORDS = (
+    "i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself "
+    "yourselves he him his himself she she's her hers herself it it's its itself they them their "
+    "theirs themselves what which who whom this that that'll these those am is are was were be "
+    "been being have has had having do does did doing a an the and but if or because as until "
+    "while of at by for with about against between into through during before after above below "
+    "to from up down in out on off over under again further then once here there when where why "
+    "how all any both each few more most other some such no nor not only own same so than too "
+    "very s t can will just don don't should should've now d ll m o re ve y ain aren aren't "
+    "couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't ma "
+    "mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't weren "
+    "weren't won won't wouldn wouldn't"
+).split()
+
+try:
+    from nltk.corpus import stopwords as _nltk_stopwords
+    STOPWORDS = frozenset(_nltk_stopwords.words('english'))
+except (ImportError, LookupError):
+    STOPWORDS = frozenset(_ENGLISH_STOPWORDS)
+
+
+def _is_missing(text):
+    return not isinstance(text, str) or pd.isna(text)
+
+
+# --- Cleaning steps (same behavior as the notebook functions) ---
+
+def clean_lyric_ultimate_final(lyric_text):
+    """Cuts the "Lyrics: Artist"-style prefix and the promotional suffix off a lyric."""
+    if _is_missing(lyric_text):
+        return lyric_text
+
+    parts = _SPLIT_PREFIX.split(lyric_text, maxsplit=1)
+    clean_lyric = lyric_text
+
+    # Get the last non-empty string in the parts list, which is the clean content.
+    if len(parts) > 1:
+        for part in reversed(parts):
+            if isinstance(part, str) and part.strip():
+                clean_lyric = part.strip()
+                break
+
+    # Cut the promotional suffix (and everything after it)
+    match_suffix = _SUFFIX_HINT.search(clean_lyric)
+    if match_suffix:
+        clean_lyric = clean_lyric[:match_suffix.start()].strip()
+    else:
+        clean_lyric = clean_lyric.strip()
+
+    return _PRICE.sub('', clean_lyric).strip()
+
+
+def clean_lyric_by_replacement(lyric_text):
+    """Replaces every known junk pattern with a space and collapses whitespace."""
+    if _is_missing(lyric_text):
+        return lyric_text
+
+    clean_text = lyric_text
+    for pattern, hint, cut in _JUNK_PATTERNS:
+        if hint is None:
+            clean_text = pattern.sub(' ', clean_text).strip()
+            continue
+        match = hint.search(clean_text)
+        if match and cut:
+            clean_text = clean_text[:match.start()].strip()
+        elif match:
+            clean_text = pattern.sub(' ', clean_text).strip()
+        else:
+            # Nothing to replace, but the notebook version still strips
+            clean_text = clean_text.strip()
+    return _WHITESPACE.sub(' ', clean_text).strip()
+
+
+def _strip_trailing_artifacts(text):
+    """_TRAILING_ARTIFACTS.sub('', text) for text that is already stripped."""
+    starts = []
+    # "Edit" and "Report a problem" have to be the last characters
+    end = _END_ARTIFACT.search(text, max(0, len(text) - len('Report a problem')))
+    if end:
+        starts.append(end.start())
+    # "Thanks to ... ." has to be followed by a final period
+    if text.endswith('.'):
+        thanks = _THANKS.search(text, 0, len(text) - 1)
+        if thanks:
+            starts.append(thanks.start())
+    if not starts:
+        return text
+    # The match also takes the whitespace right before the artifact
+    return text[:min(starts)].rstrip()
+
+
+def clean_lyrics(text_data):
+    """Keeps what comes after the "lyrics" marker, minus trailing artifacts (Spotify dataset)."""
+    if not isinstance(text_data, str):
+        return ""
+
+    match = _AFTER_LYRICS.search(text_data)
+    if not match:
+        return ""
+
+    cleaned_lyrics = _strip_trailing_artifacts(match.group(1).strip())
+    return _LINE_BREAKS.sub('\n', cleaned_lyrics).strip()
+
+
+def extract_lyrics_after_marker(text, marker="lyrics"):
+    """Returns the text after the first (case-insensitive) marker, or the stripped text."""
+    if _is_missing(text):
+        return text
+
+    pattern = _MARKERS.get(marker)
+    if pattern is None:
+        pattern = _MARKERS[marker] = re.compile(re.escape(marker), re.IGNORECASE | re.DOTALL)
+
+    match = pattern.search(text)
+    if match:
+        extracted_text = text[match.end():].strip()
+        if extracted_text and extracted_text[0] in [':', '-', '>', '|', ' ']:
+            extracted_text = extracted_text.lstrip(':->| ').strip()
+        return extracted_text
+
+    return text.strip()
+
+
+def remove_line_breaks(text):
+    """Replaces runs of newlines with a single space (Billboard dataset)."""
+    if _is_missing(text):
+        return text
+    return _LINE_BREAKS.sub(' ', text)
+
+
+def cleaning_stopwords(text):
+    return " ".join([word for word in str(text).split() if word not in STOPWORDS])
+
+
+def cleaning_punctuations(text):
+    return text.translate(_PUNCTUATION)
+
+
+def tokenize(text):
+    return _WORDS.findall(text)
+
+
+STEPS = {
+    "ultimate": clean_lyric_ultimate_final,
+    "replacement": clean_lyric_by_replacement,
+    "clean_lyrics": clean_lyrics,
+    "marker": extract_lyrics_after_marker,
+    "line_breaks": remove_line_breaks,
+    "stopwords": cleaning_stopwords,
+    "punctuation": cleaning_punctuations,
+    "tokenize": tokenize,
+}
+
+# The steps the notebook ran on each lyrics source, in order
+SOURCE_PIPELINES = {
+    "kaggle1": ["stopwords", "punctuation", "tokenize"],  # top artist songs (2017-2024)
+    "kaggle2": ["clean_lyrics"],                          # Spotify lyrics dataset
+    "kaggle3": ["line_breaks"],                           # Billboard Hot-100 (2000-2023)
+    "merged": ["marker"],                                 # main.csv after the merge
+    "baseline": ["ultimate"],
+    "replacement": ["replacement"],
+}
+
+
+def make_pipeline(steps):
+    """Chains step names (see STEPS) into one function of a single text."""
+    functions = [STEPS[step] for step in steps]
+
+    def run(text):
+        for function in functions:
+            text = function(text)
+        return text
+
+    return run
+
+
+def _normalize_chunk(args):
+    steps, texts = args
+    run = make_pipeline(steps)
+    return [run(text) for text in texts]
+
+
+def normalize(texts, steps, workers=1, chunk_size=2000):
+    """
+    Runs every step on every text in a single pass.
+
+    Args:
+        texts (iterable): Lyrics.
+        steps (list): Step names from STEPS, or a key of SOURCE_PIPELINES.
+        workers (int): Processes to split the texts across (1 = this process only).
+        chunk_size (int): Texts per work item when using several processes.
+
+    Returns:
+        list: The cleaned texts, in the same order.
+    """
+    if isinstance(steps, str):
+        steps = SOURCE_PIPELINES[steps]
+    texts = list(texts)
+
+    if workers <= 1 or len(texts) <= chunk_size:
+        return _normalize_chunk((steps, texts))
+
+    chunks = [(steps, texts[start:start + chunk_size]) for start in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [text for chunk in pool.map(_normalize_chunk, chunks) for text in chunk]
+
+
+# Steps with an identical pandas string method, which runs in compiled code
+# instead of calling a Python function per text
+COLUMN_STEPS = {
+    "line_breaks": lambda series: series.str.replace(r'[\r\n]+', ' ', regex=True),
+}
+
+
+def normalize_column(series, steps, workers=1, chunk_size=2000):
+    """normalize() for a pandas column, keeping its index and name."""
+    if isinstance(steps, str):
+        steps = SOURCE_PIPELINES[steps]
+    steps = list(steps)
+
+    # Leading steps that have a column version run on the whole column first
+    # (only for text columns, since .str turns other values into NaN)
+    if pd.api.types.is_string_dtype(series):
+        while steps and steps[0] in COLUMN_STEPS:
+            series = COLUMN_STEPS[steps.pop(0)](series)
+    if not steps:
+        return series.astype(object)
+
+    cleaned = normalize(series.tolist(), steps, workers, chunk_size)
+    if all(step in COLUMN_STEPS for step in steps):
+        # The notebook ran these as .str methods, which keep missing values as they are
+        return pd.Series(cleaned, index=series.index, name=series.name, dtype=object)
+    # Through map() so pandas converts the results exactly as the notebook's
+    # .apply() did (e.g. a None next to text comes back as NaN)
+    positions = pd.Series(range(len(cleaned)), index=series.index, name=series.name)
+    return positions.map(cleaned.__getitem__).astype(object)
@@ -0,0 +1,400 @@
+# Description: Lyrics embedding index for "songs like this" and a prototype theme labeller
+#
+# clean_classification.csv has the lyrics of every song, but the only thing
+# taken from them is one theme per song, from three passes of the large MNLI
+# model (see theme_classifier.py). This module embeds each lyric once with a
+# small sentence-embedding model that runs well on a CPU, and keeps the vectors
+# on disk:
+#
+#     embeddings/<model>/vectors.npy   distinct lyrics x dimensions, float16
+#     embeddings/<model>/hashes.txt    lyrics hash of each row of vectors.npy
+#     embeddings/<model>/songs.csv     qid, song, artist, lyrics_hash, row
+#     embeddings/<model>/meta.json     model, dimensions, window size
+#
+# Rows are keyed by a hash of the lyrics (theme_classifier.lyrics_hash), so a
+# lyric is only embedded once, songs sharing a lyric share its row, and adding
+# a song to the csv only embeds that song: the rows already there are copied
+# over as they are. The matrix is opened memory-mapped, and vectors are unit
+# length, so:
+#   - "songs like this" is one matrix-vector product over the rows (cosine
+#     similarity), a few milliseconds for thousands of songs
+#   - PrototypeLabeller labels a song by the closest theme prototype, the mean
+#     vector of the songs MNLI gave that theme, instead of running MNLI on it
+#
+# Usage:
+#     python lyrics_embeddings.py                       # clean_classification.csv -> embeddings/all-MiniLM-L6-v2/
+#     python lyrics_embeddings.py --model hashing       # no model download (word hashing, weaker)
+#     python lyrics_embeddings.py --similar Q21172725   # songs like Adele's "Hello"
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, load_cached
+from lyrics_clean import STOPWORDS
+from theme_classifier import lyrics_hash
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, "embeddings")
+
+# The model reads at most 256 word pieces, so longer lyrics are embedded in
+# windows of this many words and the windows are averaged
+WINDOW_WORDS = 200
+
+# Rows multiplied at a time when searching, to bound the float32 copy
+SEARCH_CHUNK_ROWS = 65536
+
+# Indexes up to this size keep a float32 copy of the matrix in memory, since
+# converting float16 on every search costs more than the search itself
+FLOAT32_COPY_BYTES = 64 * 1024 * 1024
+
+_WORDS = re.compile(r"\w+", re.UNICODE)
+
+
+# --- 1. Embedding models ---
+
+class SentenceTransformerEmbedder:
+    """
+    Embeds texts with a sentence-transformers model on the CPU.
+
+    Only loads the model the first time it's used.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, threads=None):
+        self.model_name = model_name
+        self.threads = threads
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def __call__(self, texts):
+        """Returns a len(texts) x dimensions float32 array."""
+        return self._load().encode(list(texts), batch_size=64, convert_to_numpy=True).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Embeds texts without a model: counts of words and word pairs (stopwords
+    left out) hashed into a fixed number of dimensions.
+
+    Much weaker than a sentence model (it only sees shared words), but needs no
+    download, so the index and the app panel can be tried anywhere.
+    """
+
+    model_name = "hashing"
+
+    def __init__(self, dimensions=512):
+        self.dimensions = dimensions
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for index, text in enumerate(texts):
+            words = [word for word in _WORDS.findall(str(text).lower()) if word not in STOPWORDS]
+            counts = {}
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                code = zlib.crc32(term.encode("utf-8"))
+                # One bit of the hash picks the sign, so collisions cancel out on average
+                sign = 1.0 if code & 1 else -1.0
+                vectors[index, (code >> 1) % self.dimensions] += sign * (1.0 + np.log(count))
+        return vectors
+
+
+def make_embedder(model_name=MODEL_NAME, threads=None):
+    """The embedder for a model name ("hashing" or a sentence-transformers model)."""
+    if model_name == "hashing":
+        return HashingEmbedder()
+    return SentenceTransformerEmbedder(model_name, threads)
+
+
+def _normalize(vectors):
+    """Rows scaled to unit length (all-zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def embed_lyrics(texts, embedder, window_words=WINDOW_WORDS):
+    """
+    One unit-length vector per lyric.
+
+    Every window of every lyric goes to the model in one call, and each
+    lyric's vector is the word-weighted mean of its windows.
+
+    Returns:
+        np.ndarray: len(texts) x dimensions, float32.
+    """
+    windows, owners, weights = [], [], []
+    for index, text in enumerate(texts):
+        words = "" if text is None or (isinstance(text, float) and pd.isna(text)) else str(text)
+        words = words.split()
+        for start in range(0, max(len(words), 1), window_words):
+            chunk = words[start:start + window_words]
+            windows.append(" ".join(chunk))
+            owners.append(index)
+            weights.append(max(len(chunk), 1))
+
+    window_vectors = _normalize(np.asarray(embedder(windows), dtype=np.float32))
+    vectors = np.zeros((len(texts), window_vectors.shape[1]), dtype=np.float32)
+    np.add.at(vectors, np.asarray(owners), window_vectors * np.asarray(weights, dtype=np.float32)[:, None])
+    return _normalize(vectors)
+
+
+# --- 2. Building the index ---
+
+def index_path(model_name=MODEL_NAME, root=EMBEDDINGS_DIR):
+    """Folder of a model's index (the part of the model name after the last "/")."""
+    return os.path.join(root, model_name.rsplit("/", 1)[-1])
+
+
+def build_index(songs, out_dir, embedder, window_words=WINDOW_WORDS, text_column="lyrics"):
+    """
+    Writes (or updates) the embedding index of songs, embedding only lyrics it doesn't have yet.
+
+    Args:
+        songs (pd.DataFrame): qid, song, artist and lyrics (clean_classification.csv).
+        out_dir (str): Index folder.
+        embedder (callable): Takes a list of texts and returns one vector per text.
+        window_words (int): Words per window (see embed_lyrics()).
+        text_column (str): Column with the lyrics.
+
+    Returns:
+        dict: rows (distinct lyrics), songs, embedded (new rows) and seconds spent embedding.
+    """
+    songs = songs.dropna(subset=[text_column]).drop_duplicates(subset="qid").reset_index(drop=True)
+    hashes = [lyrics_hash(text) for text in songs[text_column]]
+    settings = {"model": getattr(embedder, "model_name", type(embedder).__name__), "window_words": window_words}
+
+    # Rows already embedded with the same settings are kept
+    known, old = [], None
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if {key: meta.get(key) for key in settings} == settings:
+            old = np.load(os.path.join(out_dir, "vectors.npy"), mmap_mode="r")
+            with open(os.path.join(out_dir, "hashes.txt")) as file:
+                known = [line.strip() for line in file if line.strip()][:len(old)]
+
+    # Each new distinct lyric is embedded once
+    rows = {key: row for row, key in enumerate(known)}
+    todo = {}
+    for key, text in zip(hashes, songs[text_column]):
+        if key not in rows and key not in todo:
+            todo[key] = text
+    start = time.perf_counter()
+    new = embed_lyrics(list(todo.values()), embedder, window_words) if todo else None
+    seconds = time.perf_counter() - start
+    for key in todo:
+        rows[key] = len(rows)
+
+    os.makedirs(out_dir, exist_ok=True)
+    if new is not None or old is None:
+        dimensions = new.shape[1] if new is not None else 0
+        if old is not None:
+            dimensions = old.shape[1]
+        # Written next to the old matrix and swapped in, so a reader never sees half of it
+        tmp_path = os.path.join(out_dir, "vectors.tmp.npy")
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(len(rows), dimensions))
+        if old is not None:
+            for start in range(0, len(old), SEARCH_CHUNK_ROWS):
+                stop = min(start + SEARCH_CHUNK_ROWS, len(old))
+                matrix[start:stop] = old[start:stop]
+        if new is not None:
+            matrix[len(known):] = new.astype(np.float16)
+        matrix.flush()
+        del matrix, old
+        os.replace(tmp_path, os.path.join(out_dir, "vectors.npy"))
+        with open(os.path.join(out_dir, "hashes.txt"), "w") as file:
+            file.writelines(f"{key}\n" for key in rows)
+        with open(meta_path, "w") as file:
+            json.dump({**settings, "dimensions": dimensions, "rows": len(rows)}, file)
+
+    table = songs[["qid", "song", "artist"]].assign(lyrics_hash=hashes)
+    table["row"] = table["lyrics_hash"].map(rows).astype(np.int64)
+    table.to_csv(os.path.join(out_dir, "songs.csv"), index=False)
+    return {"rows": len(rows), "songs": len(table), "embedded": len(todo), "seconds": seconds}
+
+
+# --- 3. Reading the index ---
+
+class LyricsIndex:
+    """
+    Memory-mapped lyrics vectors with a QID index.
+
+    Open one with load_lyrics_index().
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as file:
+            self.meta = json.load(file)
+        self.path = path
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.songs = pd.read_csv(os.path.join(path, "songs.csv"), dtype={"qid": str, "song": str, "artist": str})
+        self._rows = dict(zip(self.songs["qid"], self.songs["row"]))
+        self._song_rows = self.songs["row"].to_numpy()
+        self._qids = self.songs["qid"].to_numpy()
+        self._titles = self.songs["song"].to_numpy()
+        self._artists = self.songs["artist"].to_numpy()
+        self._float32 = None
+        if self.vectors.size * 4 <= FLOAT32_COPY_BYTES:
+            self._float32 = np.asarray(self.vectors, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.songs)
+
+    @property
+    def nbytes(self):
+        """Memory held outside the memory-mapped matrix, for the data_loader cache budget."""
+        copy = self._float32.nbytes if self._float32 is not None else 0
+        return int(self.songs.memory_usage(deep=True).sum()) + copy
+
+    def vector(self, qid):
+        """Unit vector of a song's lyrics (float32)."""
+        return np.asarray(self.vectors[self._rows[qid]], dtype=np.float32)
+
+    def similarities(self, vector):
+        """Cosine similarity of vector with every row (read in chunks without the float32 copy)."""
+        if self._float32 is not None:
+            return self._float32 @ vector
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(self.vectors[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + len(chunk)] = chunk @ vector
+        return scores
+
+    def nearest(self, vector, k=10, exclude_row=None):
+        """
+        The k songs whose lyrics are closest to vector.
+
+        Returns:
+            pd.DataFrame: qid, song, artist and similarity, closest first.
+        """
+        # Songs sharing a lyric share a row, so the scores are spread to songs by row
+        song_scores = self.similarities(np.asarray(vector, dtype=np.float32))[self._song_rows]
+        if exclude_row is not None:
+            song_scores[self._song_rows == exclude_row] = -np.inf
+        k = min(k, int(np.isfinite(song_scores).sum()))
+        top = np.argpartition(-song_scores, k - 1)[:k] if k else np.array([], dtype=np.int64)
+        top = top[np.argsort(-song_scores[top], kind="stable")]
+        return pd.DataFrame({
+            "qid": self._qids[top],
+            "song": self._titles[top],
+            "artist": self._artists[top],
+            "similarity": song_scores[top],
+        })
+
+    def similar(self, qid, k=10):
+        """The k songs most like qid's lyrics (leaving out songs with the very same lyrics)."""
+        return self.nearest(self.vector(qid), k, exclude_row=self._rows[qid])
+
+
+def load_lyrics_index(model_name=None):
+    """
+    Returns the LyricsIndex of a model, cached per process, or None if it wasn't built.
+
+    Without a model name, the sentence model's index is used, or the hashing
+    one when only that was built.
+    """
+    for name in [model_name] if model_name else [MODEL_NAME, "hashing"]:
+        path = index_path(name)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return load_cached(path, LyricsIndex, name="lyrics_index")
+    return None
+
+
+# --- 4. Prototype theme labeller ---
+
+class PrototypeLabeller:
+    """
+    Labels lyrics by their closest theme prototype.
+
+    A theme's prototype is the normalized mean vector of the songs already
+    labelled with it (the MNLI themes of clean_classification.csv), so a new
+    song needs one embedding and a dot product per theme instead of an MNLI
+    pass per theme.
+
+    Args:
+        index (LyricsIndex): Index the labelled songs are in.
+        themes (pd.Series): Theme of each labelled song, indexed by qid.
+    """
+
+    def __init__(self, index, themes):
+        themes = themes[themes.index.isin(index.songs["qid"])].dropna()
+        self.labels = sorted(themes.unique())
+        self._themes = themes
+        self._vectors = np.stack([index.vector(qid) for qid in themes.index])
+        codes = pd.Categorical(themes, categories=self.labels).codes
+        self._codes = codes
+        # Sum of the vectors of each theme (kept to leave one song out in evaluate())
+        self._sums = np.zeros((len(self.labels), self._vectors.shape[1]), dtype=np.float32)
+        np.add.at(self._sums, codes, self._vectors)
+        self.prototypes = _normalize(self._sums)
+
+    def scores(self, vectors):
+        """Cosine similarity of each vector with each prototype (rows x labels)."""
+        return np.atleast_2d(vectors) @ self.prototypes.T
+
+    def predict(self, vectors):
+        """The closest theme of each vector."""
+        return [self.labels[code] for code in self.scores(vectors).argmax(axis=1)]
+
+    def label_texts(self, texts, embedder, window_words=WINDOW_WORDS):
+        """Themes of new lyrics (one embedding each)."""
+        return self.predict(embed_lyrics(list(texts), embedder, window_words))
+
+    def evaluate(self):
+        """
+        Share of the labelled songs whose prototype theme matches their own,
+        with each song left out of its own theme's prototype.
+        """
+        own = self._sums[self._codes] - self._vectors
+        own_norms = np.linalg.norm(own, axis=1)
+        dots = self._vectors @ self._sums.T
+        norms = np.broadcast_to(np.linalg.norm(self._sums, axis=1), dots.shape).copy()
+        rows = np.arange(len(self._codes))
+        dots[rows, self._codes] = np.einsum("ij,ij->i", self._vectors, own)
+        norms[rows, self._codes] = own_norms
+        predicted = (dots / np.where(norms > 0, norms, 1.0)).argmax(axis=1)
+        return float((predicted == self._codes).mean())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the lyrics and compare prototype themes with the MNLI themes.")
+    parser.add_argument("input", nargs="?", default=os.path.join(DATA_DIR, "clean_classification.csv"))
+    parser.add_argument("--model", default=MODEL_NAME, help='sentence-transformers model, or "hashing"')
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads")
+    parser.add_argument("--window-words", type=int, default=WINDOW_WORDS)
+    parser.add_argument("--similar", default=None, help="QID to list similar songs for")
+    parser.add_argument("--top", type=int, default=10, help="Similar songs listed")
+    args = parser.parse_args()
+
+    songs = pd.read_csv(args.input, usecols=lambda col: not col.startswith("Unnamed"))
+    out_dir = index_path(args.model)
+    result = build_index(songs, out_dir, make_embedder(args.model, args.threads), args.window_words)
+    print(f"{result['songs']:,} songs, {result['rows']:,} distinct lyrics; embedded {result['embedded']:,} new "
+          f"in {result['seconds']:.1f}s -> {os.path.relpath(out_dir, DATA_DIR)}")
+
+    index = LyricsIndex(out_dir)
+    qid = args.similar or index.songs["qid"].iloc[0]
+    start = time.perf_counter()
+    similar = index.similar(qid, args.top)
+    lookup = time.perf_counter() - start
+
+    labeller = PrototypeLabeller(index, songs.drop_duplicates("qid").set_index("qid")["theme"])
+    print(f"Prototype themes agree with the MNLI themes on {labeller.evaluate():.1%} of songs (leave-one-out)")
+    print(f"\nSongs like {index.songs.loc[index.songs['qid'] == qid, 'song'].iloc[0]} ({lookup * 1000:.2f} ms):")
+    print(similar.to_string(index=False))
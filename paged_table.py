@@ -0,0 +1,179 @@
+# Description: Server-side paged table for the large DataFrames in the Streamlit app
+#
+# st.dataframe(df) sends every row of df to the browser on every rerun, and for
+# main.csv and the classification results that includes every full lyric.
+# paged_table() keeps the table on the server: filtering and sorting happen in
+# pandas, only the rows of the current page are sent, and long text columns are
+# cut to a short preview. The full text of one row can be opened on demand.
+#
+# The filtered and sorted row order is cached per table, so turning pages
+# doesn't filter or sort again.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Characters of a text column shown in the table
+PREVIEW_CHARS = 120
+
+# Columns shown as a preview instead of their full text
+TEXT_COLUMNS = ("lyrics",)
+
+# Number of (table, filter, sort) row orders kept
+MAX_CACHED_ORDERS = 32
+
+# (key, filter, filter column, sort column, ascending) -> (DataFrame, positions)
+_orders = OrderedDict()
+_lock = threading.Lock()
+
+
+def preview(text, chars=PREVIEW_CHARS):
+    """Cuts text to at most chars characters, ending with "…" when it was cut."""
+    if not isinstance(text, str) or len(text) <= chars:
+        return text
+    return text[:chars].rstrip() + "…"
+
+
+def filter_sort(df, query="", filter_column=None, sort_column=None, ascending=True, key=None):
+    """
+    Returns the row positions of df that match the filter, in sorted order.
+
+    Args:
+        df (pd.DataFrame): The full table.
+        query (str): Case-insensitive text the filter column has to contain ("" = no filter).
+        filter_column (str): Column to search (None = no filter).
+        sort_column (str): Column to sort by (None = keep the table order).
+        ascending (bool): Sort direction.
+        key (str): Name of the table; when given, the result is cached.
+
+    Returns:
+        np.ndarray: Positions for df.iloc.
+    """
+    cache_key = (key, query, filter_column, sort_column, ascending)
+    if key is not None:
+        with _lock:
+            cached = _orders.get(cache_key)
+            # The cached order only counts for the same DataFrame object, so a
+            # reloaded csv (a new object from data_loader) is filtered again
+            if cached is not None and cached[0] is df:
+                _orders.move_to_end(cache_key)
+                return cached[1]
+
+    positions = np.arange(len(df))
+    if query and filter_column is not None:
+        values = df[filter_column].astype(str)
+        positions = positions[values.str.contains(query, case=False, regex=False, na=False).to_numpy()]
+
+    if sort_column is not None:
+        values = df[sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index
+        positions = positions[order.to_numpy()]
+
+    if key is not None:
+        with _lock:
+            _orders[cache_key] = (df, positions)
+            _orders.move_to_end(cache_key)
+            while len(_orders) > MAX_CACHED_ORDERS:
+                _orders.popitem(last=False)
+    return positions
+
+
+def page_frame(df, positions, page, page_size, text_columns=TEXT_COLUMNS, preview_chars=PREVIEW_CHARS):
+    """
+    Returns the rows of one page, with text columns cut to a preview.
+
+    Args:
+        df (pd.DataFrame): The full table.
+        positions (np.ndarray): Row order from filter_sort().
+        page (int): Page number, starting at 1.
+        page_size (int): Rows per page.
+        text_columns (tuple): Columns shown as a preview.
+        preview_chars (int): Characters kept of each text.
+
+    Returns:
+        pd.DataFrame: At most page_size rows.
+    """
+    start = (page - 1) * page_size
+    rows = df.iloc[positions[start:start + page_size]].copy()
+    for column in text_columns:
+        if column in rows.columns:
+            rows[column] = rows[column].map(lambda text: preview(text, preview_chars))
+    return rows
+
+
+def paged_table(df, key, columns=None, text_columns=TEXT_COLUMNS, label_column=None,
+                page_size=25, preview_chars=PREVIEW_CHARS, hide_index=False):
+    """
+    Shows df one page at a time, with server-side filtering and sorting.
+
+    Args:
+        df (pd.DataFrame): The full table (e.g. a cached DataFrame from data_loader).
+        key (str): Unique name for this table's widgets.
+        columns (list): Columns to show (default: all of them).
+        text_columns (tuple): Columns shown as a preview, with the full text on demand.
+        label_column (str): Column used to pick a row for the full text
+            (default: the first column that isn't a text column).
+        page_size (int): Rows per page to start with.
+        preview_chars (int): Characters of each text shown in the table.
+        hide_index (bool): Hide the DataFrame index like st.dataframe(hide_index=True).
+    """
+    # Filtering and sorting run on df itself, so the cached order is found again
+    # next rerun; only the shown rows are cut down to columns
+    table = df[columns] if columns is not None else df
+    text_columns = tuple(column for column in text_columns if column in table.columns)
+    if label_column is None:
+        label_column = next((column for column in table.columns if column not in text_columns), None)
+
+    # --- 1. Filter and sort controls ---
+    filter_col, search_col, sort_col, order_col = st.columns([2, 3, 2, 1])
+    with filter_col:
+        # Searching the label column (e.g. the song title) first is the most useful default
+        search_index = list(table.columns).index(label_column) if label_column is not None else 0
+        filter_column = st.selectbox("Search in", table.columns, index=search_index, key=f"{key}_filter_column")
+    with search_col:
+        query = st.text_input("Contains", key=f"{key}_query").strip()
+    with sort_col:
+        sort_column = st.selectbox("Sort by", ["(table order)"] + list(table.columns), key=f"{key}_sort")
+    with order_col:
+        ascending = st.radio("Order", ["Asc", "Desc"], key=f"{key}_order", horizontal=True) == "Asc"
+    if sort_column == "(table order)":
+        sort_column = None
+
+    positions = filter_sort(df, query, filter_column, sort_column, ascending, key=key)
+
+    # --- 2. Page controls ---
+    size_col, page_col, count_col = st.columns([1, 1, 3])
+    with size_col:
+        size_index = PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 0
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=size_index, key=f"{key}_page_size")
+    page_count = max(1, -(-len(positions) // page_size))
+    # A narrower filter can leave the remembered page past the last one
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = page_count
+    with page_col:
+        page = int(st.number_input("Page", min_value=1, max_value=page_count, step=1, key=f"{key}_page"))
+    first_row = (page - 1) * page_size
+    with count_col:
+        st.caption(
+            f"Rows {min(first_row + 1, len(positions)):,}–{min(first_row + page_size, len(positions)):,} "
+            f"of {len(positions):,} (page {page:,} of {page_count:,})"
+        )
+
+    # --- 3. The visible page only ---
+    rows = page_frame(table, positions, page, page_size, text_columns, preview_chars)
+    st.dataframe(rows, use_container_width=True, hide_index=hide_index)
+
+    # --- 4. Full text of one row, only when asked for ---
+    if text_columns and len(rows) and st.checkbox("Show the full text of a row", key=f"{key}_expand"):
+        labels = [f"Row {first_row + number + 1}" for number in range(len(rows))]
+        if label_column is not None:
+            labels = [f"{label}: {value}" for label, value in zip(labels, rows[label_column].tolist())]
+        choice = st.selectbox("Row", range(len(rows)), format_func=lambda number: labels[number], key=f"{key}_row")
+        full_row = table.iloc[positions[first_row + choice]]
+        for column in text_columns:
+            text = full_row[column]
+            st.markdown(f"**{column}**")
+            st.text(text if isinstance(text, str) else "")
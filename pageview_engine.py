@@ -0,0 +1,278 @@
+# Description: Multi-year, multi-language pageview queries over local Parquet dumps
+#
+# my_collection.ipynb and ingest.py read one DuckDB database: 2024, English
+# Wikipedia, titles ending in "(song)". This module runs the same monthly
+# aggregation over daily pageview dumps stored as Parquet, for any year and any
+# wiki ("project"). The dumps are laid out as
+#
+#     dumps/project=en.wikipedia/year=2024/*.parquet
+#     dumps/project=de.wikipedia/year=2023/*.parquet
+#     ...
+#
+# with the same columns as the database's data_table (date, article, qid,
+# pageviews). DuckDB reads the Parquet files directly and does the filtering
+# and the GROUP BY, so the daily rows never reach pandas. Each (project, year)
+# partition is its own query, and the partitions run in parallel threads.
+#
+# The result has the columns of song_st.csv (year, month, article, qid,
+# monthly_pageviews, genre, artist). build_source() saves it as a Parquet
+# dataset that data_loader.load_songs() and aggregates.load_aggregates() can
+# read like song_st.csv.
+#
+# Usage:
+#     python pageview_engine.py                                   # lists the partitions
+#     python pageview_engine.py --years 2023 2024 --projects en.wikipedia de.wikipedia
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import pandas as pd
+
+from data_loader import DATA_DIR, _file_signature, load_cached
+from entity_extract import attach_entities, extract_entities
+from song_catalog import catalog_titles, load_catalog
+from storage import dataset_path, publish_dir, staging_dir, write_dataset
+
+# Folder with the daily dumps (see the layout above)
+DUMPS_DIR = os.environ.get("SONGS_DUMPS_DIR", os.path.join(DATA_DIR, "dumps"))
+
+# The database the app was built on: song_st.csv is this project and year
+DEFAULT_PROJECT = "en.wikipedia"
+DEFAULT_YEAR = 2024
+
+# LIKE pattern for the song articles of each wiki (the disambiguator differs by language)
+PROJECT_PATTERNS = {
+    "en.wikipedia": "%song)",
+    "de.wikipedia": "%Lied)",
+    "fr.wikipedia": "%chanson)",
+    "es.wikipedia": "%canción)",
+    "it.wikipedia": "%brano musicale)",
+    "nl.wikipedia": "%nummer)",
+    "pt.wikipedia": "%canção)",
+}
+
+# Titles from the 2024 database were stored as Latin-1 decoded UTF-8 and need
+# repairing (see ingest.clean_titles); dumps written from it keep that problem
+REPAIR_TITLES = {"en.wikipedia"}
+
+ENTITIES_PATH = os.path.join(DATA_DIR, "entity_results3.jsonl")
+
+MONTHLY_QUERY = """
+SELECT
+    YEAR(date) AS year,
+    MONTH(date) AS month,
+    article,
+    MIN(qid) AS qid,
+    SUM(pageviews) AS monthly_pageviews
+FROM
+    read_parquet(?)
+WHERE
+    article LIKE ?
+    AND date >= make_date(?, 1, 1)
+    AND date < make_date(? + 1, 1, 1)
+GROUP BY
+    YEAR(date),
+    MONTH(date),
+    article
+ORDER BY
+    year,
+    month,
+    monthly_pageviews DESC
+"""
+
+
+def available_partitions(root=DUMPS_DIR):
+    """
+    Returns every (project, year) that has dump files.
+
+    Returns:
+        list: (project, year) pairs, sorted.
+    """
+    partitions = []
+    if not os.path.isdir(root):
+        return partitions
+    for project_dir in sorted(os.listdir(root)):
+        if not project_dir.startswith("project="):
+            continue
+        project = project_dir[len("project="):]
+        for year_dir in sorted(os.listdir(os.path.join(root, project_dir))):
+            if year_dir.startswith("year=") and year_dir[len("year="):].isdigit():
+                folder = os.path.join(root, project_dir, year_dir)
+                if any(name.endswith(".parquet") for name in os.listdir(folder)):
+                    partitions.append((project, int(year_dir[len("year="):])))
+    return partitions
+
+
+def partition_path(project, year, root=DUMPS_DIR):
+    """Folder with the dump files of one project and year."""
+    return os.path.join(root, f"project={project}", f"year={year}")
+
+
+def query_partition(project, year, root=DUMPS_DIR, pattern=None, threads=None):
+    """
+    Aggregates one project-year of daily dumps into monthly totals inside DuckDB.
+
+    Args:
+        project (str): Wiki, e.g. "en.wikipedia".
+        year (int): Year to aggregate.
+        root (str): Dumps folder.
+        pattern (str): LIKE pattern for the titles (default: PROJECT_PATTERNS[project]).
+        threads (int): DuckDB threads for this query (default: DuckDB's own choice).
+
+    Returns:
+        pd.DataFrame: year, month, article (raw title), qid, monthly_pageviews.
+    """
+    if pattern is None:
+        pattern = PROJECT_PATTERNS.get(project, "%song)")
+    files = os.path.join(partition_path(project, year, root), "*.parquet")
+
+    # One connection per query, so partitions can run at the same time
+    conn = duckdb.connect()
+    try:
+        if threads:
+            conn.execute(f"SET threads = {int(threads)}")
+        result = conn.execute(MONTHLY_QUERY, [files, pattern, year, year]).df()
+    finally:
+        conn.close()
+
+    result["year"] = result["year"].astype("int32")
+    result["month"] = result["month"].astype("int32")
+    result["monthly_pageviews"] = result["monthly_pageviews"].astype("int64")
+    return result
+
+
+def _entities():
+    """Genre and artist of every QID, parsed once per process."""
+    return load_cached(ENTITIES_PATH, extract_entities, name="entities")
+
+
+def monthly_pageviews(years, projects=(DEFAULT_PROJECT,), root=DUMPS_DIR, workers=None, with_entities=True):
+    """
+    Monthly pageviews per song for several years and wikis, shaped like song_st.csv.
+
+    Args:
+        years (list): Years to include.
+        projects (list): Wikis to include.
+        root (str): Dumps folder.
+        workers (int): Partitions queried at the same time (default: one per CPU, at most
+            the number of partitions). DuckDB's threads are split between them.
+        with_entities (bool): Attach genre and artist from entity_results3.jsonl.
+
+    Returns:
+        pd.DataFrame: year, month, article, qid, monthly_pageviews, genre, artist
+        and project, sorted by project, year, month and views.
+    """
+    partitions = [(project, int(year)) for project in projects for year in years]
+    missing = [f"{project} {year}" for project, year in partitions
+               if not os.path.isdir(partition_path(project, year, root))]
+    if missing:
+        raise FileNotFoundError(f"No dumps in {root} for: {', '.join(missing)}")
+
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = min(cpus, len(partitions))
+    workers = max(1, workers)
+    threads = max(1, cpus // workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda partition: query_partition(partition[0], partition[1], root, threads=threads),
+            partitions
+        ))
+
+    frames = []
+    for (project, year), result in zip(partitions, results):
+        # The catalog was built from the English Wikipedia, so only its songs are renamed by QID
+        catalog = load_catalog() if project == DEFAULT_PROJECT else None
+        result["article"] = catalog_titles(result, catalog, repair_encoding=project in REPAIR_TITLES)
+        result["project"] = project
+        frames.append(result)
+    data = pd.concat(frames, ignore_index=True)
+
+    if with_entities and os.path.exists(ENTITIES_PATH):
+        data = attach_entities(data, _entities(), columns=["genre", "artist"])
+    else:
+        data["genre"] = pd.Categorical([None] * len(data))
+        data["artist"] = pd.Categorical([None] * len(data))
+
+    data["qid"] = data["qid"].astype("category")
+    data["project"] = data["project"].astype("category")
+    return data[["year", "month", "article", "qid", "monthly_pageviews", "genre", "artist", "project"]]
+
+
+def source_name(project, year):
+    """Dataset name of one project-year, e.g. "songs_en_wikipedia_2023"."""
+    return f"songs_{project.replace('.', '_')}_{year}"
+
+
+def save_source(data, out_dir):
+    """
+    Writes a project-year's monthly table as the Parquet dataset out_dir.
+
+    The dataset is written to a folder of its own and published with
+    storage.publish_dir(), so two sessions building the same source at once
+    never write into the same folder, and a reader always finds a complete
+    dataset at out_dir.
+    """
+    tmp_dir = staging_dir(out_dir)
+    try:
+        write_dataset(data.drop(columns=["project"], errors="ignore"), tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return publish_dir(tmp_dir, out_dir)
+
+
+def build_source(project=DEFAULT_PROJECT, year=DEFAULT_YEAR, root=DUMPS_DIR, force=False):
+    """
+    Returns a path that load_songs() and load_aggregates() accept for one project-year.
+
+    The 2024 English data is song_st.csv itself. Other partitions are queried
+    from the dumps and saved as a Parquet dataset the first time (and again
+    whenever the dumps change).
+    """
+    if project == DEFAULT_PROJECT and year == DEFAULT_YEAR and not os.path.isdir(partition_path(project, year, root)):
+        return "song_st.csv"
+
+    out_dir = dataset_path(source_name(project, year))
+    dumps = partition_path(project, year, root)
+    fresh = (
+        os.path.isdir(out_dir)
+        and _file_signature(out_dir)[0] >= _file_signature(dumps)[0]
+    )
+    if force or not fresh:
+        save_source(monthly_pageviews([year], [project], root), out_dir)
+    return out_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate daily pageview dumps into monthly song tables.")
+    parser.add_argument("--root", default=DUMPS_DIR, help="Dumps folder")
+    parser.add_argument("--years", type=int, nargs="*", help="Years to aggregate")
+    parser.add_argument("--projects", nargs="*", default=[DEFAULT_PROJECT], help="Wikis to aggregate")
+    parser.add_argument("--workers", type=int, default=None, help="Partitions queried at the same time")
+    parser.add_argument("--out", default=None, help="Also write the combined table to this csv")
+    args = parser.parse_args()
+
+    if not args.years:
+        partitions = available_partitions(args.root)
+        print(f"{len(partitions)} partition(s) in {args.root}")
+        for project, year in partitions:
+            print(f"  {project} {year}")
+    else:
+        start = time.perf_counter()
+        table = monthly_pageviews(args.years, args.projects, args.root, workers=args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"{len(table):,} song-month rows from {len(args.years) * len(args.projects)} partition(s) in {elapsed:.2f}s")
+        print(table.groupby(["project", "year"], observed=True)["monthly_pageviews"].agg(["count", "sum"]).to_string())
+
+        # Save each project-year for the app (see build_source)
+        for (project, year), part in table.groupby(["project", "year"], observed=True):
+            out_dir = save_source(part, dataset_path(source_name(project, year)))
+            print(f"Saved {os.path.relpath(out_dir, DATA_DIR)}")
+        if args.out:
+            table.to_csv(args.out, index=False)
+            print(f"Saved to {args.out}")
@@ -0,0 +1,397 @@
+# Description: Opt-in per-rerun profiling of the Streamlit app
+#
+# Every widget interaction reruns 2024_Songs.py from the top (or just the open
+# section, see run_section() there). With profiling turned on, the app times
+# each part of a rerun (data loads, groupbys, chart builds, tables) as nested
+# spans, and records:
+#   - how much memory the DataFrames loaded or shown by a span use
+#   - how many bytes a table or chart sends to the browser (the Arrow table of
+#     an st.dataframe, the JSON spec of an Altair or Plotly chart)
+# At the end of the rerun the sidebar shows a waterfall of the spans, and the
+# spans are appended to a JSON lines log, one line per rerun.
+#
+# Profiling is off unless the SONGS_PROFILE environment variable is set or the
+# page is opened with ?profile=1. When it's off, every span is a shared no-op
+# object, so the app pays almost nothing for the instrumentation.
+#
+# Sizes are measured when the rerun ends, not inside the spans, so measuring
+# them doesn't inflate the timings. A section that reruns on its own (a
+# fragment) is logged as a rerun of its own, with its time shown under it.
+#
+# Usage:
+#     SONGS_PROFILE=1 streamlit run 2024_Songs.py     # or open the app with ?profile=1
+#     python profiling.py                             # slowest spans over every logged rerun
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, _frame_bytes
+
+# Log the spans are appended to (one JSON object per rerun)
+LOG_PATH = os.environ.get("SONGS_PROFILE_LOG", os.path.join(DATA_DIR, "profiles", "spans.jsonl"))
+
+# Query parameter that turns profiling on for one browser tab
+QUERY_PARAM = "profile"
+
+_log_lock = threading.Lock()
+
+
+def profiling_enabled():
+    """True when SONGS_PROFILE is set or the page was opened with ?profile=1."""
+    if os.environ.get("SONGS_PROFILE", "") not in ("", "0"):
+        return True
+    import streamlit as st
+    return st.query_params.get(QUERY_PARAM, "0") not in ("", "0")
+
+
+# --- 1. Sizes ---
+
+def memory_bytes(value):
+    """Memory used by a DataFrame (or a dict of them, or an object with nbytes); None for anything else."""
+    try:
+        return _frame_bytes(value)
+    except (AttributeError, TypeError):
+        return None
+
+
+def payload_bytes(value):
+    """
+    Bytes a value sends to the browser: the Arrow stream of a DataFrame, or the
+    JSON spec of an Altair chart or Plotly figure. None when it can't be measured.
+    """
+    if isinstance(value, pd.DataFrame):
+        import pyarrow as pa
+        try:
+            table = pa.Table.from_pandas(value)
+        except (pa.ArrowException, TypeError, ValueError):
+            return None
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().size
+    if hasattr(value, "to_json"):
+        # Altair charts and Plotly figures, with their data inlined in the spec
+        return len(value.to_json().encode("utf-8"))
+    if isinstance(value, dict):
+        # A finished Vega-Lite or Plotly spec
+        return len(json.dumps(value, default=str).encode("utf-8"))
+    return None
+
+
+# --- 2. Spans ---
+
+class Span:
+    """One timed section of a rerun."""
+
+    def __init__(self, profiler, name, parent, depth):
+        self.profiler = profiler
+        self.name = name
+        self.parent = parent
+        self.depth = depth
+        self.start = self.end = None
+        # Values whose sizes are measured when the rerun ends
+        self._memory_of = None
+        self._payload_of = None
+
+    def __enter__(self):
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.end = time.perf_counter()
+        self.profiler._stack.pop()
+        return False
+
+    def measure(self, value):
+        """Records the memory used by value (a DataFrame or a dict of them)."""
+        self._memory_of = value
+        return value
+
+    def payload(self, value):
+        """Records the bytes value sends to the browser."""
+        self._payload_of = value
+        return value
+
+
+class _NullSpan:
+    """Span used while profiling is off: does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def measure(self, value):
+        return value
+
+    def payload(self, value):
+        return value
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Spans of one rerun.
+
+    Args:
+        enabled (bool): When False, span() returns a no-op and finish() does nothing.
+        log_path (str): JSON lines file the spans are appended to (None = no log).
+    """
+
+    def __init__(self, enabled=False, log_path=LOG_PATH):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.spans = []
+        self._stack = []
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def span(self, name):
+        """Context manager timing a section; spans opened inside it become its children."""
+        if not self.enabled:
+            return _NULL_SPAN
+        parent = self._stack[-1] if self._stack else None
+        span = Span(self, name, parent, len(self._stack))
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def section(self, name):
+        """
+        Span around a section of the app that can also rerun alone as a fragment.
+
+        A fragment rerun reuses the profiler of the full rerun, which has
+        already finished by then, so the section is timed and logged as a new
+        rerun (its time is shown under it, since a fragment can't write to the sidebar).
+        """
+        if not (self.enabled and self.finished):
+            with self.span(name):
+                yield
+            return
+
+        self.spans, self._stack, self.started, self.finished = [], [], time.perf_counter(), False
+        with self.span(name):
+            yield
+        self.finish(sidebar=False)
+
+    def show(self, name, render, value, **kwargs):
+        """
+        Calls render(value, **kwargs) (st.dataframe, st.altair_chart, st.plotly_chart...)
+        inside a span, recording what value sends to the browser.
+
+        Returns:
+            Whatever render returns.
+        """
+        with self.span(name) as span:
+            span.payload(value)
+            if isinstance(value, pd.DataFrame):
+                span.measure(value)
+            return render(value, **kwargs)
+
+    def table(self):
+        """
+        The finished spans, in the order they started.
+
+        Returns:
+            pd.DataFrame: name, parent, depth, section (the top-level span),
+            start_ms, duration_ms, memory_bytes and payload_bytes.
+        """
+        rows = []
+        for span in self.spans:
+            if span.end is None:
+                continue
+            section = span
+            while section.parent is not None:
+                section = section.parent
+            rows.append({
+                "name": span.name,
+                "parent": span.parent.name if span.parent is not None else None,
+                "depth": span.depth,
+                "section": section.name,
+                "start_ms": (span.start - self.started) * 1000,
+                "duration_ms": (span.end - span.start) * 1000,
+                "memory_bytes": memory_bytes(span._memory_of) if span._memory_of is not None else None,
+                "payload_bytes": payload_bytes(span._payload_of) if span._payload_of is not None else None,
+            })
+        return pd.DataFrame(rows, columns=["name", "parent", "depth", "section", "start_ms",
+                                           "duration_ms", "memory_bytes", "payload_bytes"])
+
+    def export(self, spans, total_ms, session=None, metrics=None):
+        """Appends one rerun's spans (and any extra metric tables) to the log as a single JSON line."""
+        if self.log_path is None:
+            return
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "session": session,
+            "total_ms": total_ms,
+            # NaN sizes become null
+            "spans": json.loads(spans.to_json(orient="records")),
+        }
+        if metrics:
+            record["metrics"] = {name: json.loads(table.to_json(orient="records")) for name, table in metrics.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with _log_lock, open(self.log_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def finish(self, sidebar=True, metrics=None):
+        """
+        Measures the spans, shows the waterfall in the sidebar and writes the log.
+
+        Args:
+            sidebar (bool): Show the waterfall in the sidebar (False: one caption where it's called).
+            metrics (dict): Title -> function returning a DataFrame of extra metrics
+                (e.g. cache hit rates), shown and logged with the spans.
+        """
+        if not self.enabled:
+            return
+        import streamlit as st
+
+        self.finished = True
+        total_ms = (time.perf_counter() - self.started) * 1000
+        spans = self.table()
+        metrics = {title: table() for title, table in (metrics or {}).items()}
+        session = st.session_state.setdefault("profile_session", uuid.uuid4().hex[:12])
+        self.export(spans, total_ms, session, metrics)
+
+        if not sidebar:
+            st.caption(f"⏱ Section rerun: {total_ms:,.0f} ms (logged to {self.log_path})")
+            return
+
+        with st.sidebar.expander("⏱ Profiling", expanded=True):
+            st.metric("Rerun time", f"{total_ms:,.0f} ms")
+            if spans.empty:
+                return
+            sections = spans[spans["depth"] == 0][["name", "duration_ms"]]
+            st.dataframe(sections.rename(columns={"name": "Section", "duration_ms": "ms"}),
+                         hide_index=True, use_container_width=True,
+                         column_config={"ms": st.column_config.NumberColumn(format="%.1f")})
+            st.plotly_chart(waterfall_figure(spans), use_container_width=True)
+            st.dataframe(
+                spans[["name", "duration_ms", "memory_bytes", "payload_bytes"]].assign(
+                    memory_bytes=spans["memory_bytes"] / 1e6, payload_bytes=spans["payload_bytes"] / 1e3
+                ),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "name": "Span",
+                    "duration_ms": st.column_config.NumberColumn("ms", format="%.1f"),
+                    "memory_bytes": st.column_config.NumberColumn("Memory (MB)", format="%.2f"),
+                    "payload_bytes": st.column_config.NumberColumn("Sent (KB)", format="%.1f"),
+                }
+            )
+            for title, table in metrics.items():
+                st.caption(title)
+                st.dataframe(table, hide_index=True, use_container_width=True)
+            if self.log_path is not None:
+                st.caption(f"Logged to {self.log_path}")
+
+
+def start_profiler():
+    """Profiler for the current rerun (on only when profiling_enabled())."""
+    return Profiler(enabled=profiling_enabled())
+
+
+# --- 3. Waterfall ---
+
+def waterfall_figure(spans):
+    """
+    Horizontal bars from each span's start to its end, children indented under
+    their parents and colored by top-level section.
+    """
+    import plotly.express as px
+
+    frame = spans.assign(
+        label=[f"{'  ' * depth}{name} #{number}" for number, (depth, name) in
+               enumerate(zip(spans["depth"], spans["name"]))],
+    )
+    figure = px.bar(
+        frame,
+        x="duration_ms",
+        y="label",
+        base="start_ms",
+        color="section",
+        orientation="h",
+        hover_data={"duration_ms": ":.1f", "start_ms": ":.1f", "label": False},
+        labels={"duration_ms": "ms", "start_ms": "Started at (ms)", "section": "Section"},
+    )
+    figure.update_yaxes(autorange="reversed", title=None, showticklabels=False)
+    figure.update_layout(
+        height=max(200, 16 * len(frame)), showlegend=False, margin={"l": 0, "r": 0, "t": 10, "b": 0},
+        xaxis_title="ms since the rerun started"
+    )
+    return figure
+
+
+# --- 4. Reading the log ---
+
+def read_log(path=LOG_PATH):
+    """
+    Every logged span.
+
+    Returns:
+        pd.DataFrame: The span columns of Profiler.table(), plus rerun (line
+        number in the log), time, session and total_ms.
+    """
+    frames = []
+    with open(path, encoding="utf-8") as file:
+        for rerun, line in enumerate(file):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            spans = pd.DataFrame(record["spans"])
+            frames.append(spans.assign(rerun=rerun, time=record["time"], session=record["session"],
+                                       total_ms=record["total_ms"]))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def summarize_log(log):
+    """
+    Time per span name across reruns.
+
+    Returns:
+        pd.DataFrame: reruns, median_ms, p95_ms, max_ms, share (median % of the
+        rerun time), memory_mb and sent_kb per span, slowest median first.
+    """
+    log = log.assign(share=log["duration_ms"] / log["total_ms"] * 100)
+    summary = log.groupby(["section", "name"], sort=False).agg(
+        reruns=("rerun", "nunique"),
+        median_ms=("duration_ms", "median"),
+        p95_ms=("duration_ms", lambda values: float(np.percentile(values, 95))),
+        max_ms=("duration_ms", "max"),
+        share=("share", "median"),
+        memory_mb=("memory_bytes", "max"),
+        sent_kb=("payload_bytes", "max"),
+    ).reset_index()
+    summary["memory_mb"] = summary["memory_mb"] / 1e6
+    summary["sent_kb"] = summary["sent_kb"] / 1e3
+    return summary.sort_values("median_ms", ascending=False).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the spans logged by the app's profiler.")
+    parser.add_argument("--log", default=LOG_PATH, help="JSON lines log written by the app")
+    parser.add_argument("--top", type=int, default=20, help="Spans listed")
+    parser.add_argument("--sections", action="store_true", help="Only list the top-level sections (the tabs)")
+    args = parser.parse_args()
+
+    log = read_log(args.log)
+    if log.empty:
+        print(f"No reruns logged in {args.log}")
+    else:
+        if args.sections:
+            log = log[log["depth"] == 0]
+        print(f"{log['rerun'].nunique():,} reruns from {log['session'].nunique():,} sessions, "
+              f"median rerun {log.drop_duplicates('rerun')['total_ms'].median():,.0f} ms\n")
+        print(summarize_log(log).head(args.top).to_string(index=False, float_format=lambda value: f"{value:,.1f}"))
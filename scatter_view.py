@@ -0,0 +1,227 @@
+# Description: Downsampled WebGL scatter for the "Viral Hits vs. Steady Favorites" chart
+#
+# px.scatter draws every song as its own SVG marker with full hover data, so
+# the chart gets slower (and the page heavier) with every song added. This
+# module draws the same chart with a bounded number of markers:
+#   - the top songs and the outliers are plotted as individual points
+#   - every other song is counted into hexagonal bins, drawn as one marker per
+#     non-empty bin, colored by how many songs it holds
+#   - both layers use scattergl (WebGL)
+# When the user zooms in (by drawing a box), the songs inside the new window are
+# split and binned again, so detail appears as the window gets smaller. A window
+# with few enough songs shows all of them as points.
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Hexagons across the plot width
+GRID_SIZE = 40
+
+# Most songs plotted as individual points
+MAX_POINTS = 400
+
+# Songs that are always points: the top N by each axis
+TOP_N = 50
+
+# Robust z-score (in log space) above which a song counts as an outlier
+OUTLIER_Z = 3.5
+
+
+def hexbin(x, y, x_range, y_range, gridsize=GRID_SIZE):
+    """
+    Counts points into a grid of regular hexagons covering the window.
+
+    Args:
+        x, y (np.ndarray): Point coordinates.
+        x_range, y_range (tuple): (min, max) of the window.
+        gridsize (int): Hexagons across the window.
+
+    Returns:
+        pd.DataFrame: x, y (center of each non-empty hexagon) and count.
+    """
+    if not len(x):
+        return pd.DataFrame({"x": [], "y": [], "count": []})
+
+    x_span = (x_range[1] - x_range[0]) or 1.0
+    y_span = (y_range[1] - y_range[0]) or 1.0
+    rows = max(1, int(round(gridsize / np.sqrt(3))))
+
+    # Same lattice as matplotlib's hexbin: two offset rectangular grids, and
+    # each point goes to the closer of its two candidate centers
+    sx = (x - x_range[0]) / x_span * gridsize
+    sy = (y - y_range[0]) / y_span * rows
+    ix1, iy1 = np.round(sx), np.round(sy)
+    ix2, iy2 = np.floor(sx) + 0.5, np.floor(sy) + 0.5
+    first = (sx - ix1) ** 2 + 3 * (sy - iy1) ** 2 <= (sx - ix2) ** 2 + 3 * (sy - iy2) ** 2
+    cx = np.where(first, ix1, ix2)
+    cy = np.where(first, iy1, iy2)
+
+    cells = pd.DataFrame({"cx": cx, "cy": cy}).value_counts().reset_index(name="count")
+    return pd.DataFrame({
+        "x": x_range[0] + cells["cx"].to_numpy() / gridsize * x_span,
+        "y": y_range[0] + cells["cy"].to_numpy() / rows * y_span,
+        "count": cells["count"].to_numpy(),
+    })
+
+
+def _robust_z(values):
+    """How far each value is from the median, in (scaled) median absolute deviations."""
+    logs = np.log1p(np.maximum(values, 0))
+    median = np.median(logs)
+    mad = np.median(np.abs(logs - median)) * 1.4826
+    if not mad:
+        return np.zeros(len(values))
+    return np.abs(logs - median) / mad
+
+
+def point_mask(df, x, y, top_n=TOP_N, max_points=MAX_POINTS, outlier_z=OUTLIER_Z):
+    """
+    Picks the songs drawn as individual points.
+
+    The top_n songs by x and by y, and every song whose x, y or y/x ratio is an
+    outlier, are points. If that's more than max_points, the ones with the
+    highest x are kept. A window with at most max_points songs is all points.
+
+    Returns:
+        np.ndarray: Boolean mask over the rows of df.
+    """
+    count = len(df)
+    if count <= max_points:
+        return np.ones(count, dtype=bool)
+
+    x_values = df[x].to_numpy(dtype=float)
+    y_values = df[y].to_numpy(dtype=float)
+    mask = np.zeros(count, dtype=bool)
+    mask[np.argsort(-x_values, kind="stable")[:top_n]] = True
+    mask[np.argsort(-y_values, kind="stable")[:top_n]] = True
+
+    # Viral songs have a peak close to their total; steady ones a low ratio
+    ratio = np.divide(y_values, x_values, out=np.zeros(count), where=x_values > 0)
+    mask |= _robust_z(x_values) > outlier_z
+    mask |= _robust_z(y_values) > outlier_z
+    mask |= _robust_z(ratio * 1000) > outlier_z
+
+    chosen = np.flatnonzero(mask)
+    if len(chosen) > max_points:
+        keep = chosen[np.argsort(-x_values[chosen], kind="stable")[:max_points]]
+        mask[:] = False
+        mask[keep] = True
+    return mask
+
+
+def scatter_figure(df, x, y, hover_name, hover_data=(), labels=None, title=None,
+                   window=None, gridsize=GRID_SIZE, max_points=MAX_POINTS, color='#29b5e8'):
+    """
+    Builds the downsampled scatter.
+
+    Args:
+        df (pd.DataFrame): One row per song.
+        x, y (str): Columns on each axis.
+        hover_name (str): Column shown as the title of a point's hover box.
+        hover_data (tuple): Other columns shown when hovering a point.
+        labels (dict): Column -> axis/hover label.
+        title (str): Chart title.
+        window (dict): {"x": (min, max), "y": (min, max)} to zoom into, or None.
+        gridsize (int): Hexagons across the window.
+        max_points (int): Most songs plotted individually.
+        color (str): Color of the individual points.
+
+    Returns:
+        (go.Figure, dict): The figure and counts of songs, points and bins.
+    """
+    labels = labels or {}
+    x_all = df[x].to_numpy(dtype=float)
+    y_all = df[y].to_numpy(dtype=float)
+
+    # --- 1. Songs inside the window ---
+    if window:
+        x_range, y_range = tuple(window["x"]), tuple(window["y"])
+        inside = (
+            (x_all >= x_range[0]) & (x_all <= x_range[1])
+            & (y_all >= y_range[0]) & (y_all <= y_range[1])
+        )
+        df = df[inside]
+        x_all, y_all = x_all[inside], y_all[inside]
+    else:
+        x_range = (float(x_all.min()), float(x_all.max())) if len(x_all) else (0.0, 1.0)
+        y_range = (float(y_all.min()), float(y_all.max())) if len(y_all) else (0.0, 1.0)
+
+    # --- 2. Split into points and binned songs ---
+    mask = point_mask(df, x, y, max_points=max_points)
+    points = df[mask]
+    bins = hexbin(x_all[~mask], y_all[~mask], x_range, y_range, gridsize)
+
+    fig = go.Figure()
+    if len(bins):
+        fig.add_trace(go.Scattergl(
+            x=bins["x"],
+            y=bins["y"],
+            mode="markers",
+            name="Binned songs",
+            marker=dict(
+                symbol="hexagon",
+                size=max(6, int(900 / gridsize)),
+                color=np.log10(bins["count"]),
+                colorscale="Blues",
+                cmin=0,
+                colorbar=dict(title="Songs", tickvals=[0, 1, 2, 3, 4], ticktext=["1", "10", "100", "1k", "10k"]),
+                opacity=0.8,
+            ),
+            customdata=bins["count"],
+            hovertemplate="%{customdata:,} songs<extra></extra>",
+        ))
+
+    # Hover box like px.scatter: the song as the title, then the hover columns
+    hover_lines = ["<b>%{customdata[0]}</b>"]
+    custom_columns = [hover_name]
+    for column in hover_data:
+        if column in (x, y):
+            continue
+        custom_columns.append(column)
+        hover_lines.append(f"{labels.get(column, column)}=%{{customdata[{len(custom_columns) - 1}]}}")
+    hover_lines.append(f"{labels.get(x, x)}=%{{x:,}}")
+    hover_lines.append(f"{labels.get(y, y)}=%{{y:,}}")
+
+    fig.add_trace(go.Scattergl(
+        x=points[x],
+        y=points[y],
+        mode="markers",
+        name="Top songs and outliers" if len(bins) else "Songs",
+        marker=dict(size=12, color=color, opacity=0.7),
+        customdata=points[custom_columns].astype(object).to_numpy(),
+        hovertemplate="<br>".join(hover_lines) + "<extra></extra>",
+    ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        dragmode="select",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, x=0),
+    )
+    if window:
+        fig.update_xaxes(range=list(x_range))
+        fig.update_yaxes(range=list(y_range))
+
+    stats = {"songs": len(df), "points": int(mask.sum()), "bins": len(bins), "binned_songs": int((~mask).sum())}
+    return fig, stats
+
+
+def selected_window(event):
+    """
+    The box the user drew on the chart, as a window for scatter_figure(), or None.
+
+    Args:
+        event: What st.plotly_chart(..., on_select="rerun") returned.
+    """
+    try:
+        boxes = event["selection"]["box"]
+    except (KeyError, TypeError):
+        return None
+    if not boxes:
+        return None
+    box = boxes[0]
+    x_values, y_values = box.get("x"), box.get("y")
+    if not x_values or not y_values:
+        return None
+    return {"x": (min(x_values), max(x_values)), "y": (min(y_values), max(y_values))}
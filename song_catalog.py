@@ -0,0 +1,194 @@
+# Description: Song catalog: one row per QID with its clean title and disambiguator
+#
+# my_collection.ipynb repaired the raw article titles in three full passes over
+# every row (re-decoding Latin-1 as UTF-8, split("_(") through .apply, then
+# replacing "_") and built qid_list3.txt with an "if qid not in unique_list"
+# loop, which gets quadratically slower as the list grows. This module does
+# the same in one linear, order-preserving pass:
+#   - every distinct raw title is cleaned once (pd.factorize), and the result is
+#     spread back over the rows by code, so a title repeated in every month
+#     costs one clean, not twelve
+#   - the title is split at its first "_(" into the title ("Espresso") and the
+#     disambiguator ("Sabrina Carpenter song")
+#   - QIDs are deduplicated with a hash (drop_duplicates), keeping the order in
+#     which they first appear, like the notebook's loop
+#
+# The result is a song dimension table keyed by QID (song_catalog.csv) that the
+# other steps join against; qid_list3.txt is its qid column.
+#
+# Usage:
+#     python song_catalog.py                              # from pageviews/articles_raw (see ingest.py)
+#     python song_catalog.py --source articles_raw.csv --no-repair
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR, load_csv
+
+CATALOG_PATH = os.path.join(DATA_DIR, "song_catalog.csv")
+QID_LIST_PATH = os.path.join(DATA_DIR, "qid_list3.txt")
+
+CATALOG_COLUMNS = ["qid", "title", "disambiguator", "article"]
+
+CATALOG_DTYPES = {
+    "qid": "object",
+    "title": "object",
+    "disambiguator": "object",
+    "article": "object",
+}
+
+
+# --- 1. Titles ---
+
+def split_titles(articles, repair_encoding=True):
+    """
+    Splits raw titles like "Espresso_(Sabrina_Carpenter_song)" into
+    "Espresso" and "Sabrina Carpenter song".
+
+    Args:
+        articles (pd.Series): Raw article titles.
+        repair_encoding (bool): Undo the Latin-1/UTF-8 mix-up of the 2024 database
+            (turn off for titles that are already proper UTF-8).
+
+    Returns:
+        pd.DataFrame: title and disambiguator ("" when there is none), with the
+        index of articles.
+    """
+    # Each distinct title is cleaned once, then spread back over the rows
+    codes, uniques = pd.factorize(articles.astype(str))
+    titles = pd.Series(uniques, dtype=object)
+    if repair_encoding:
+        titles = (
+            titles.str
+            .encode('latin-1', errors='replace')  # Treat the string characters as raw 'latin-1' bytes
+            .str.decode('utf-8', errors='replace')  # Re-decode the resulting bytes as UTF-8
+        )
+
+    # Only the first "_(" splits, like split("_(")[0] in the notebook
+    parts = titles.str.partition("_(")
+    title = parts[0].str.replace("_", " ", regex=False)
+    disambiguator = parts[2].str.removesuffix(")").str.replace("_", " ", regex=False)
+
+    return pd.DataFrame({
+        "title": title.to_numpy()[codes],
+        "disambiguator": disambiguator.to_numpy()[codes],
+    }, index=articles.index)
+
+
+# --- 2. Catalog ---
+
+def build_catalog(rows, repair_encoding=True):
+    """
+    One row per QID, in the order the QIDs first appear in rows.
+
+    Rows without a QID are left out (there is nothing to join them on). When
+    several raw titles share a QID (a song moved to a new title during the
+    year), the first one is kept, so sort rows by importance first.
+
+    Args:
+        rows (pd.DataFrame): Raw article and qid per row (e.g. the monthly pageviews).
+        repair_encoding (bool): Passed on to split_titles().
+
+    Returns:
+        pd.DataFrame: qid, title, disambiguator and article (the raw title).
+    """
+    keyed = rows.loc[rows["qid"].notna(), ["qid", "article"]]
+    first = keyed.astype({"qid": str}).drop_duplicates(subset="qid").reset_index(drop=True)
+    return pd.concat([first[["qid"]], split_titles(first["article"], repair_encoding), first[["article"]]],
+                     axis=1)[CATALOG_COLUMNS]
+
+
+def attach_catalog(frame, catalog, on="qid"):
+    """
+    Adds the catalog's title and disambiguator to frame by QID.
+
+    Returns:
+        pd.DataFrame: frame with title and disambiguator (NaN for QIDs not in the catalog).
+    """
+    return frame.merge(
+        catalog[["qid", "title", "disambiguator"]].rename(columns={"qid": on}),
+        on=on, how="left", validate="many_to_one"
+    )
+
+
+def write_catalog(catalog, path=CATALOG_PATH):
+    catalog.to_csv(path, index=False)
+
+
+def load_catalog(path=CATALOG_PATH):
+    """The song catalog (song_catalog.csv), cached like the other csv files, or None if it wasn't built."""
+    if not os.path.exists(path):
+        return None
+    return load_csv(path, CATALOG_DTYPES)
+
+
+def catalog_titles(rows, catalog=None, repair_encoding=True):
+    """
+    Clean title of each row: the catalog's title for its QID, so a song keeps
+    one title however its article was named, or the row's own title split by
+    split_titles() when its QID isn't in the catalog.
+
+    Args:
+        rows (pd.DataFrame): Raw article and qid per row.
+        catalog (pd.DataFrame): load_catalog() (None = only the rows' own titles).
+        repair_encoding (bool): Passed on to split_titles().
+
+    Returns:
+        pd.Series: Titles with the index of rows.
+    """
+    own = split_titles(rows["article"], repair_encoding)["title"].rename(rows["article"].name)
+    if catalog is None:
+        return own
+    joined = attach_catalog(rows[["qid"]].astype({"qid": object}), catalog)["title"].to_numpy()
+    return pd.Series(np.where(pd.isna(joined), own.to_numpy(), joined), index=rows.index, name=own.name)
+
+
+def update_qid_list(catalog, path=QID_LIST_PATH):
+    """
+    Appends the catalog's QIDs that aren't in the QID list yet, keeping the
+    existing order.
+
+    Returns:
+        int: Number of QIDs added.
+    """
+    known = set()
+    if os.path.exists(path):
+        with open(path) as file:
+            known = {line.strip() for line in file if line.strip()}
+    new_qids = catalog.loc[~catalog["qid"].isin(known), "qid"].tolist()
+    with open(path, "a") as file:
+        for qid in new_qids:
+            file.write(f"{qid}\n")
+    return len(new_qids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the song catalog (one row per QID).")
+    parser.add_argument("--source", default=None, help="csv or Parquet dataset with raw article and qid "
+                                                       "(default: ingest.py's pageviews/articles_raw)")
+    parser.add_argument("--out", default=CATALOG_PATH, help="Catalog csv")
+    parser.add_argument("--qids", default=QID_LIST_PATH, help="QID list to append new QIDs to")
+    parser.add_argument("--no-repair", action="store_true", help="Titles are already proper UTF-8")
+    args = parser.parse_args()
+
+    if args.source is None or os.path.isdir(args.source):
+        from ingest import RAW_DATASET
+        from storage import read_dataset
+        rows = read_dataset(args.source or RAW_DATASET)
+    else:
+        rows = pd.read_csv(args.source, usecols=lambda col: not col.startswith("Unnamed"))
+    # Same order as articles_song3.csv (see ingest.write_outputs), so a QID with
+    # several titles keeps the one most viewed in its first month
+    if {"year", "month", "monthly_pageviews"} <= set(rows.columns):
+        rows = rows.sort_values(by=["year", "month", "monthly_pageviews"], ascending=[True, True, False])
+
+    start = time.perf_counter()
+    catalog = build_catalog(rows, repair_encoding=not args.no_repair)
+    elapsed = time.perf_counter() - start
+    write_catalog(catalog, args.out)
+    added = update_qid_list(catalog, args.qids)
+    print(f"{len(rows):,} rows -> {len(catalog):,} songs in {elapsed * 1000:.1f} ms "
+          f"({(catalog['disambiguator'] != '').sum():,} with a disambiguator, {added:,} new QIDs)")
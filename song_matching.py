@@ -0,0 +1,446 @@
+# Description: Fuzzy matching of Wikipedia songs to the Kaggle lyrics datasets
+#
+# song_classification.ipynb stacks the three Kaggle lyrics datasets, drops
+# duplicate (song, artist) pairs, and attaches lyrics with an exact
+# pd.merge(on=['artist', 'song']). Exact keys miss most songs: "Crazy in Love"
+# by "Beyoncé" doesn't equal "Crazy In Love (feat. JAY-Z)" by "Beyonce", so only
+# 963 of the ~4,400 songs end up with lyrics.
+#
+# This module matches songs in two stages:
+#   1. Normalized keys: case, accents, punctuation, "feat." credits and
+#      "(Remastered 2011)"-style version notes are removed from both sides, and
+#      the pairs with equal keys are joined with one merge.
+#   2. MinHash: every remaining title is turned into a short signature of its
+#      character 3-grams. Titles that share a band of the signature become
+#      candidates, and only the candidates are scored, so the cost grows with
+#      the number of songs instead of songs x lyrics.
+#
+# A candidate's score mixes how similar the titles are (Jaccard of 3-grams) and
+# how much the artists have in common (shared words), so a song with the right
+# title but a different artist ("Hello" by Adele vs. Lionel Richie) is rejected.
+#
+# Usage:
+#     python song_matching.py lyrics1.csv lyrics2.csv              # prints a match report
+#     python song_matching.py lyrics1.csv --out main.csv           # also writes the matched songs
+import argparse
+import os
+import re
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_DIR
+
+# --- Normalization ---
+
+# "feat. X", "ft X", "featuring X" and everything after it
+_FEATURING = re.compile(r'[\(\[]?\s*\b(?:feat|ft|featuring)\b\.?.*$', re.IGNORECASE | re.DOTALL)
+# "(Remastered 2011)", "[Live]"
+_BRACKETS = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+# " - Remastered 2015", " - Radio Edit", " - Live at Wembley"
+_VERSION_SUFFIX = re.compile(
+    r'\s+-\s+.*\b(?:remaster(?:ed)?|live|remix|mix|version|edit|mono|stereo|acoustic|demo|single)\b.*$',
+    re.IGNORECASE | re.DOTALL
+)
+_NOT_ALPHANUMERIC = re.compile(r'[\W_]+')
+_LEADING_THE = re.compile(r'^the ')
+
+
+def _fold(text):
+    """Lowercases, removes accents, turns "&" into "and" and punctuation into spaces."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold().replace('&', ' and ')
+    # Apostrophes join words ("don't" -> "dont") instead of splitting them
+    text = text.replace("'", '').replace('’', '')
+    return _NOT_ALPHANUMERIC.sub(' ', text).strip()
+
+
+def normalize_title(title):
+    """
+    Returns the matching key of a song title.
+
+    Args:
+        title (str): A title like "Crazy In Love (feat. JAY-Z) - Remastered".
+
+    Returns:
+        str: The key ("crazy in love"), or "" for a missing title.
+    """
+    if not isinstance(title, str):
+        return ""
+    title = _FEATURING.sub('', title)
+    title = _VERSION_SUFFIX.sub('', title)
+    stripped = _BRACKETS.sub(' ', title)
+    # A title that is nothing but brackets keeps its words
+    if stripped.strip():
+        title = stripped
+    return _fold(title)
+
+
+def normalize_artist(artist):
+    """
+    Returns the matching key of the main artist (featured artists removed).
+
+    Args:
+        artist (str): An artist like "The Beatles" or "Beyoncé feat. JAY-Z".
+
+    Returns:
+        str: The key ("beatles", "beyonce"), or "" for a missing artist.
+    """
+    if not isinstance(artist, str):
+        return ""
+    return _LEADING_THE.sub('', _fold(_FEATURING.sub('', artist)))
+
+
+def _artist_words(artist):
+    """Every word of the artist credit, featured artists included."""
+    if not isinstance(artist, str):
+        return frozenset()
+    return frozenset(_fold(artist).split()) - {"the", "and", "feat", "ft", "featuring", "with", "x"}
+
+
+def _trigrams(key):
+    padded = f" {key} "
+    return frozenset(padded[start:start + 3] for start in range(len(padded) - 2))
+
+
+def title_similarity(left, right):
+    """Jaccard similarity of the 3-grams of two title keys (0 to 1)."""
+    if not left or not right:
+        return 0.0
+    left, right = _trigrams(left), _trigrams(right)
+    return len(left & right) / len(left | right)
+
+
+def artist_similarity(left, right):
+    """Share of the shorter artist credit's words found in the other one (0 to 1)."""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / min(len(left), len(right))
+
+
+# --- MinHash signatures ---
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def _minhash(keys, hash_a, hash_b):
+    """
+    MinHash signatures of the 3-gram sets of many keys at once.
+
+    Returns:
+        np.ndarray: One row per key, one uint64 column per hash function.
+        Empty keys get a row of the maximum value, which never shares a band.
+    """
+    owners, hashes = [], []
+    for owner, key in enumerate(keys):
+        if key:
+            for gram in _trigrams(key):
+                owners.append(owner)
+                hashes.append(zlib.crc32(gram.encode('utf-8')))
+
+    signatures = np.full((len(keys), len(hash_a)), np.iinfo(np.uint64).max, dtype=np.uint64)
+    if not hashes:
+        return signatures
+
+    owners = np.asarray(owners, dtype=np.int64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    # The 3-grams are grouped by owner already, so each owner's minimum is one reduceat
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    for column, (a, b) in enumerate(zip(hash_a, hash_b)):
+        # a and hash are both < 2^32, so a * hash + b stays below 2^64
+        values = (a * hashes + b) % _PRIME
+        signatures[owners[starts], column] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def _band_keys(signatures, bands):
+    """Combines each band of the signature into a single number."""
+    rows = signatures.shape[1] // bands
+    weights = (np.arange(1, rows + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+    keys = np.empty((len(signatures), bands), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            block = signatures[:, band * rows:(band + 1) * rows]
+            keys[:, band] = (block * weights).sum(axis=1, dtype=np.uint64)
+    return keys
+
+
+class LyricsIndex:
+    """
+    Lyrics from one or more datasets, indexed for matching against song titles.
+
+    Datasets are added one at a time with add(). A (song, artist) pair that is
+    already in the index is skipped, so the first dataset wins, like the
+    notebook's drop_duplicates(keep='first').
+    """
+
+    def __init__(self, num_perm=64, bands=16, seed=234):
+        """
+        Args:
+            num_perm (int): Hash functions per MinHash signature.
+            bands (int): Bands the signature is split into. With 64 hashes in
+                16 bands, titles whose 3-grams overlap by about half or more
+                usually become candidates.
+            seed (int): Seed for the hash functions.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._hash_b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self.entries = pd.DataFrame(columns=["song", "artist", "lyrics", "source", "title_key", "artist_key"])
+        self._artist_words = []
+        self._band_table = pd.DataFrame({
+            "band": pd.Series(dtype="int16"),
+            "band_key": pd.Series(dtype="uint64"),
+            "entry": pd.Series(dtype="int64"),
+        })
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, lyrics, source="", song="song", artist="artist", text="lyrics"):
+        """
+        Adds a lyrics dataset to the index.
+
+        Args:
+            lyrics (pd.DataFrame): One row per song with title, artist and lyrics columns.
+            source (str): Name stored with every entry (shows up in the match report).
+            song, artist, text (str): Column names in lyrics.
+
+        Returns:
+            int: Number of new entries (duplicates of earlier entries are skipped).
+        """
+        new = pd.DataFrame({
+            "song": lyrics[song].astype(object),
+            "artist": lyrics[artist].astype(object),
+            "lyrics": lyrics[text].astype(object),
+            "source": source,
+        })
+        new["title_key"] = new["song"].map(normalize_title)
+        new["artist_key"] = new["artist"].map(normalize_artist)
+        new = new[new["title_key"] != ""]
+
+        keys = ["title_key", "artist_key"]
+        new = new.drop_duplicates(subset=keys, keep="first")
+        if len(self.entries):
+            seen = pd.MultiIndex.from_frame(self.entries[keys])
+            new = new[~pd.MultiIndex.from_frame(new[keys]).isin(seen)]
+        if new.empty:
+            return 0
+
+        first = len(self.entries)
+        new.index = pd.RangeIndex(first, first + len(new))
+        self._artist_words.extend(new["artist"].map(_artist_words))
+
+        band_keys = _band_keys(_minhash(new["title_key"].tolist(), self._hash_a, self._hash_b), self.bands)
+        bands = pd.DataFrame({
+            "band": np.tile(np.arange(self.bands, dtype=np.int16), len(new)),
+            "band_key": band_keys.ravel(),
+            "entry": np.repeat(new.index.to_numpy(dtype=np.int64), self.bands),
+        })
+        self.entries = new if not first else pd.concat([self.entries, new])
+        self._band_table = pd.concat([self._band_table, bands], ignore_index=True)
+        return len(new)
+
+    def _candidates(self, title_keys):
+        """(song row, entry) pairs whose titles share at least one MinHash band."""
+        band_keys = _band_keys(_minhash(title_keys, self._hash_a, self._hash_b), self.bands)
+        query = pd.DataFrame({
+            "band": np.tile(np.arange(self.bands, dtype=np.int16), len(title_keys)),
+            "band_key": band_keys.ravel(),
+            "row": np.repeat(np.arange(len(title_keys), dtype=np.int64), self.bands),
+        })
+        pairs = query.merge(self._band_table, on=["band", "band_key"])
+        return pairs[["row", "entry"]].drop_duplicates()
+
+    def match(self, songs, song="article", artist="artist", threshold=0.75, title_weight=0.6):
+        """
+        Finds the best lyrics entry for every song.
+
+        Args:
+            songs (pd.DataFrame): Songs to match (e.g. the unique article/artist pairs of song_st.csv).
+            song, artist (str): Column names in songs.
+            threshold (float): Lowest score accepted for a fuzzy match (0 to 1).
+            title_weight (float): Weight of the title similarity in the score
+                (the artist similarity gets the rest).
+
+        Returns:
+            pd.DataFrame: One row per song with the same index, and the columns
+            entry (index into self.entries, -1 if unmatched), method ("exact",
+            "fuzzy" or "none"), score, title_score and artist_score.
+        """
+        title_keys = songs[song].map(normalize_title).tolist()
+        artist_keys = songs[artist].map(normalize_artist).tolist()
+        count = len(songs)
+
+        result = pd.DataFrame({
+            "entry": np.full(count, -1, dtype=np.int64),
+            "method": "none",
+            "score": np.zeros(count),
+            "title_score": np.zeros(count),
+            "artist_score": np.zeros(count),
+        })
+
+        # --- 1. Equal normalized keys ---
+        keys = pd.DataFrame({"title_key": title_keys, "artist_key": artist_keys, "row": np.arange(count)})
+        lookup = self.entries[["title_key", "artist_key"]].rename_axis("entry").reset_index()
+        exact = keys[keys["title_key"] != ""].merge(lookup, on=["title_key", "artist_key"])
+        rows = exact["row"].to_numpy()
+        result.loc[rows, "entry"] = exact["entry"].to_numpy()
+        result.loc[rows, ["method"]] = "exact"
+        result.loc[rows, ["score", "title_score", "artist_score"]] = 1.0
+
+        # --- 2. MinHash candidates for the rest ---
+        remaining = np.flatnonzero(result["entry"].to_numpy() < 0)
+        if len(remaining) and len(self.entries):
+            candidates = self._candidates([title_keys[row] for row in remaining])
+            candidates["row"] = remaining[candidates["row"].to_numpy()]
+
+            song_words = songs[artist].map(_artist_words).tolist()
+            entry_titles = self.entries["title_key"]
+            title_scores, artist_scores = [], []
+            for row, entry in zip(candidates["row"].tolist(), candidates["entry"].tolist()):
+                title_scores.append(title_similarity(title_keys[row], entry_titles.at[entry]))
+                artist_scores.append(artist_similarity(song_words[row], self._artist_words[entry]))
+            candidates["title_score"] = title_scores
+            candidates["artist_score"] = artist_scores
+            candidates["score"] = (
+                title_weight * candidates["title_score"]
+                + (1 - title_weight) * candidates["artist_score"]
+            )
+
+            # Best candidate per song; ties go to the entry added first
+            best = (
+                candidates[candidates["score"] >= threshold]
+                .sort_values(["row", "score", "entry"], ascending=[True, False, True])
+                .drop_duplicates(subset="row")
+            )
+            rows = best["row"].to_numpy()
+            result.loc[rows, "entry"] = best["entry"].to_numpy()
+            result.loc[rows, ["method"]] = "fuzzy"
+            for column in ("score", "title_score", "artist_score"):
+                result.loc[rows, column] = best[column].to_numpy()
+
+        result.index = songs.index
+        return result
+
+
+def attach_lyrics(songs, index, song="article", artist="artist", threshold=0.75, how="inner"):
+    """
+    Adds the matched lyrics to the songs (replaces the notebook's exact merge).
+
+    Args:
+        songs (pd.DataFrame): Rows shaped like song_st.csv.
+        index (LyricsIndex): Lyrics to match against.
+        song, artist (str): Column names in songs.
+        threshold (float): Lowest score accepted for a fuzzy match.
+        how (str): "inner" keeps only matched songs (like the notebook),
+            "left" keeps every song.
+
+    Returns:
+        pd.DataFrame: The song rows plus lyrics, lyrics_song, lyrics_artist,
+        lyrics_source, match_method and match_score.
+    """
+    # Every row of a song has the same title and artist, so match each pair once
+    pairs = songs[[song, artist]].astype(object).drop_duplicates().reset_index(drop=True)
+    matches = index.match(pairs, song=song, artist=artist, threshold=threshold)
+
+    matched = matches["entry"].to_numpy() >= 0
+    entries = index.entries.reindex(matches["entry"].where(matched))
+    pairs["lyrics"] = entries["lyrics"].to_numpy()
+    pairs["lyrics_song"] = entries["song"].to_numpy()
+    pairs["lyrics_artist"] = entries["artist"].to_numpy()
+    pairs["lyrics_source"] = entries["source"].to_numpy()
+    pairs["match_method"] = matches["method"].to_numpy()
+    pairs["match_score"] = matches["score"].to_numpy()
+    if how == "inner":
+        pairs = pairs[matched]
+
+    keys = songs[[song, artist]].astype(object)
+    merged = songs.drop(columns=[song, artist]).join(keys).merge(pairs, on=[song, artist], how=how)
+    return merged[list(songs.columns) + [col for col in pairs.columns if col not in (song, artist)]]
+
+
+def match_report(matches, index=None):
+    """
+    Summarizes a match() result.
+
+    Args:
+        matches (pd.DataFrame): Output of LyricsIndex.match().
+        index (LyricsIndex): The index that was matched against, to count matches per source.
+
+    Returns:
+        dict: total, matched, coverage, counts per method, a histogram of the
+        fuzzy scores and (with index) counts per source.
+    """
+    total = len(matches)
+    methods = matches["method"].value_counts()
+    matched = int(total - methods.get("none", 0))
+    fuzzy_scores = matches.loc[matches["method"] == "fuzzy", "score"]
+    histogram = pd.cut(
+        fuzzy_scores,
+        bins=[0.0, 0.8, 0.85, 0.9, 0.95, 1.0],
+        labels=["below 0.80", "0.80-0.85", "0.85-0.90", "0.90-0.95", "0.95-1.00"],
+        include_lowest=True,
+    ).value_counts(sort=False)
+
+    report = {
+        "total": total,
+        "matched": matched,
+        "coverage": matched / total if total else 0.0,
+        "exact": int(methods.get("exact", 0)),
+        "fuzzy": int(methods.get("fuzzy", 0)),
+        "unmatched": int(methods.get("none", 0)),
+        "fuzzy_scores": {str(interval): int(count) for interval, count in histogram.items()},
+    }
+    if index is not None:
+        entries = matches.loc[matches["entry"] >= 0, "entry"]
+        report["sources"] = index.entries.loc[entries, "source"].value_counts().to_dict()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match the Wikipedia songs to lyrics datasets.")
+    parser.add_argument("lyrics", nargs="*",
+                        help="Lyrics csv files with song, artist and lyrics columns, in priority order "
+                             "(default: clean_classification.csv)")
+    parser.add_argument("--songs", default=os.path.join(DATA_DIR, "song_st.csv"), help="Songs to match")
+    parser.add_argument("--threshold", type=float, default=0.75, help="Lowest fuzzy match score")
+    parser.add_argument("--out", default=None, help="Write the matched song rows to this csv (like main.csv)")
+    args = parser.parse_args()
+
+    paths = args.lyrics or [os.path.join(DATA_DIR, "clean_classification.csv")]
+    start = time.perf_counter()
+    lyrics_index = LyricsIndex()
+    for path in paths:
+        added = lyrics_index.add(pd.read_csv(path), source=os.path.basename(path))
+        print(f"{os.path.basename(path)}: {added:,} new lyrics")
+    indexed = time.perf_counter() - start
+
+    songs = pd.read_csv(args.songs)
+    songs = songs.drop(columns=[col for col in songs.columns if col.startswith("Unnamed")])
+    start = time.perf_counter()
+    pairs = songs[["article", "artist"]].drop_duplicates()
+    report = match_report(lyrics_index.match(pairs, threshold=args.threshold), lyrics_index)
+    matched_in = time.perf_counter() - start
+
+    print(f"Indexed {len(lyrics_index):,} lyrics in {indexed:.2f}s, matched {report['total']:,} songs in {matched_in:.2f}s")
+    print(f"Matched {report['matched']:,} ({report['coverage']:.1%}): "
+          f"{report['exact']:,} exact, {report['fuzzy']:,} fuzzy, {report['unmatched']:,} unmatched")
+    for interval, count in report["fuzzy_scores"].items():
+        print(f"  fuzzy score {interval}: {count:,}")
+    for source, count in report.get("sources", {}).items():
+        print(f"  from {source}: {count:,}")
+
+    if args.out:
+        result = attach_lyrics(songs, lyrics_index, threshold=args.threshold)
+        result = result.rename(columns={"article": "song"})
+        result.to_csv(args.out, index=False)
+        print(f"Saved {len(result):,} rows to {args.out}")
@@ -0,0 +1,222 @@
+# Description: Typeahead search over song titles, artists and QIDs
+#
+# The Custom Song Comparison multiselect used to send every title to the
+# browser as an option. This index is built once per process (and rebuilt when
+# the data changes) and answers "which songs match what was typed" with the
+# top k results ranked by total pageviews, so the widget only ever holds a
+# handful of options.
+#
+# Every song (title + artist) gets a number: its rank by total pageviews. Two
+# lookups work on those numbers:
+#   - prefix: every word of the title and artist, and the QID, is stored in one
+#     sorted array, so the songs with a word starting with the query are one
+#     binary search away. The best-ranked ones are the smallest numbers.
+#   - trigram: when a query isn't the start of a word ("ssian", "wift"), the
+#     songs that have every 3-letter piece of it are intersected and then
+#     checked for the whole text.
+#
+# Usage:
+#     python song_search.py "taylor love"
+import bisect
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import load_cached, songs_source
+from song_matching import _fold
+
+
+class SongSearchIndex:
+    """
+    Prefix and trigram index over songs, ranked by total pageviews.
+
+    Build it with build_search_index() or load_search_index().
+    """
+
+    def __init__(self, songs):
+        """
+        Args:
+            songs (pd.DataFrame): One row per song with article, artist, qid and
+                total_pageviews columns.
+        """
+        songs = songs.sort_values(
+            by=['total_pageviews', 'article'],
+            ascending=[False, True],
+            kind='mergesort'
+        ).reset_index(drop=True)
+        self.articles = songs['article'].astype(object).tolist()
+        self.artists = songs['artist'].astype(object).tolist()
+        self.qids = songs['qid'].astype(object).tolist()
+        self.pageviews = songs['total_pageviews'].to_numpy()
+
+        # Folded text of every song, for the final substring check
+        self.texts = [
+            " ".join(part for part in (_fold(str(article)), _fold(str(artist)), str(qid).lower()) if part)
+            for article, artist, qid in zip(self.articles, self.artists, self.qids)
+        ]
+
+        # --- 1. Sorted words for prefix lookups ---
+        words, owners = [], []
+        for number, text in enumerate(self.texts):
+            for word in set(text.split()):
+                words.append(word)
+                owners.append(number)
+        order = sorted(range(len(words)), key=words.__getitem__)
+        self._words = [words[position] for position in order]
+        self._word_owners = np.asarray(owners, dtype=np.int32)[order] if owners else np.zeros(0, dtype=np.int32)
+
+        # --- 2. Trigram postings for everything else ---
+        postings = {}
+        for number, text in enumerate(self.texts):
+            for gram in {text[start:start + 3] for start in range(len(text) - 2)}:
+                postings.setdefault(gram, []).append(number)
+        self._trigrams = {gram: np.asarray(numbers, dtype=np.int32) for gram, numbers in postings.items()}
+
+    def __len__(self):
+        return len(self.articles)
+
+    @property
+    def nbytes(self):
+        """Rough memory use, for the data_loader cache budget."""
+        text_bytes = sum(len(text) for text in self.texts) * 3
+        return int(
+            text_bytes
+            + self._word_owners.nbytes
+            + sum(postings.nbytes for postings in self._trigrams.values())
+            + 100 * len(self.articles)
+        )
+
+    def _prefix_owners(self, word):
+        """Songs with a word starting with word (may repeat a song)."""
+        start = bisect.bisect_left(self._words, word)
+        # Every word with this prefix sorts before word + the highest character
+        stop = bisect.bisect_left(self._words, word + "\U0010ffff", lo=start)
+        return self._word_owners[start:stop]
+
+    def _best(self, numbers, k):
+        """The k smallest distinct song numbers, without sorting all of them."""
+        if len(numbers) > 4 * k:
+            numbers = np.partition(numbers, 4 * k)[:4 * k]
+            best = np.unique(numbers)
+            if len(best) >= k:
+                return best[:k]
+        return np.unique(numbers)[:k]
+
+    def _prefix_search(self, words, k):
+        groups = sorted((self._prefix_owners(word) for word in words), key=len)
+        matches = groups[0]
+        for group in groups[1:]:
+            if not len(matches):
+                break
+            matches = matches[np.isin(matches, group)]
+        return self._best(matches, k) if len(matches) else matches
+
+    def _trigram_search(self, text, k, exclude=()):
+        grams = {text[start:start + 3] for start in range(len(text) - 2)}
+        if not grams:
+            return []
+        postings = sorted((self._trigrams.get(gram) for gram in grams), key=lambda p: 0 if p is None else len(p))
+        if postings[0] is None:
+            return []
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return []
+
+        found = []
+        for number in candidates.tolist():
+            if number not in exclude and text in self.texts[number]:
+                found.append(number)
+                if len(found) == k:
+                    break
+        return found
+
+    def match(self, query, k=20):
+        """
+        Returns the numbers (ranks) of the k best-ranked songs matching query.
+
+        Args:
+            query (str): Words typed by the user. Every word has to start a word
+                of the song's title, artist or QID; if that finds fewer than k
+                songs, songs containing the whole query anywhere are added.
+            k (int): Number of results.
+
+        Returns:
+            list: Song numbers, best first (0 is the most viewed song).
+        """
+        text = _fold(query or "")
+        if not text:
+            return list(range(min(k, len(self))))
+
+        numbers = self._prefix_search(text.split(), k).tolist()
+        if len(numbers) < k and len(text) >= 3:
+            numbers += self._trigram_search(text, k - len(numbers), exclude=set(numbers))
+            numbers.sort()
+        return numbers
+
+    def titles(self, query, k=20):
+        """Song titles of match(), without repeats (two artists can share a title)."""
+        return list(dict.fromkeys(self.articles[number] for number in self.match(query, k)))
+
+    def search(self, query, k=20):
+        """
+        match() as a DataFrame.
+
+        Returns:
+            pd.DataFrame: article, artist, qid, total_pageviews, best first.
+        """
+        numbers = self.match(query, k)
+        return pd.DataFrame({
+            'article': [self.articles[number] for number in numbers],
+            'artist': [self.artists[number] for number in numbers],
+            'qid': [self.qids[number] for number in numbers],
+            'total_pageviews': self.pageviews[numbers] if numbers else np.zeros(0, dtype=self.pageviews.dtype),
+        })
+
+
+def build_search_index(data):
+    """
+    Builds the search index from the monthly pageview table.
+
+    Args:
+        data (pd.DataFrame): Rows with article, artist, qid and monthly_pageviews
+            (song_st.csv, or the monthly_ranked rollup).
+
+    Returns:
+        SongSearchIndex
+    """
+    # dropna=False keeps songs without a known artist, which still have to be found by title
+    songs = data.groupby(['article', 'artist'], observed=True, sort=False, dropna=False).agg(
+        qid=('qid', 'first'),
+        total_pageviews=('monthly_pageviews', 'sum'),
+    ).reset_index()
+    for column in ('artist', 'qid'):
+        songs[column] = songs[column].astype(object).fillna("")
+    return SongSearchIndex(songs)
+
+
+def load_search_index(source="song_st.csv"):
+    """Returns the search index for source, cached for the whole server process."""
+    from aggregates import load_aggregates
+
+    return load_cached(
+        songs_source(source),
+        lambda source_path: build_search_index(load_aggregates(source)['monthly_ranked']),
+        name="search"
+    )
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    index = load_search_index()
+    built = time.perf_counter() - start
+    query = " ".join(sys.argv[1:])
+
+    start = time.perf_counter()
+    results = index.search(query)
+    elapsed = time.perf_counter() - start
+    print(f"{len(index):,} songs indexed in {built:.2f}s; \"{query}\" took {elapsed * 1000:.2f} ms")
+    print(results.to_string(index=False))
@@ -0,0 +1,204 @@
+# Description: Columnar (Parquet) storage for the monthly pageview tables
+#
+# song_st.csv and articles_song3.csv repeat the article, qid, genre and artist
+# strings on every monthly row and carry a leftover index column and a constant
+# year column. This module rewrites them as dictionary-encoded Parquet datasets
+# partitioned by year and month:
+#
+#     pageviews/song_st/year=2024/month=1/part-0.parquet
+#     pageviews/song_st/year=2024/month=2/part-0.parquet
+#     ...
+#
+# Convert both csv files with:
+#     python storage.py
+# data_loader.load_songs() reads the dataset instead of the csv once it exists.
+import fcntl
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from data_loader import DATA_DIR, _read_csv, SONG_DTYPES
+
+PAGEVIEWS_DIR = os.path.join(DATA_DIR, "pageviews")
+
+# Replaced versions of a published folder are kept this long (see publish_dir())
+KEEP_VERSIONS_SECONDS = 60
+
+# year and month are stored in the folder names, not inside the files
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int32()), ("month", pa.int32())]),
+    flavor="hive"
+)
+
+# Columns stored inside each partition file. Repeated strings are dictionary
+# encoded, so each distinct value is only written once per file.
+PAGEVIEW_SCHEMA = pa.schema([
+    ("year", pa.int32()),
+    ("month", pa.int32()),
+    ("article", pa.dictionary(pa.int32(), pa.string())),
+    ("qid", pa.dictionary(pa.int32(), pa.string())),
+    ("monthly_pageviews", pa.int64()),
+    ("genre", pa.dictionary(pa.int32(), pa.string())),
+    ("artist", pa.dictionary(pa.int32(), pa.string())),
+    # Last day counted in the month (only written by ingest.py)
+    ("last_date", pa.date32()),
+])
+
+
+def dataset_path(name):
+    """Folder of the Parquet dataset for a table name (e.g. "song_st")."""
+    return os.path.join(PAGEVIEWS_DIR, name)
+
+
+def staging_dir(out_dir):
+    """A new folder name next to out_dir to build a replacement in (see publish_dir())."""
+    return f"{out_dir}.tmp-{uuid.uuid4().hex}"
+
+
+def publish_dir(tmp_dir, out_dir):
+    """
+    Makes the folder tmp_dir (from staging_dir()) the new out_dir.
+
+    out_dir is a symlink to a versioned folder (out_dir.v-<id>). tmp_dir becomes
+    the next version and the link is switched to it with os.replace, so a
+    reader opening out_dir sees either the old or the new folder in full, never
+    a missing or half-written one. Readers should resolve the link once
+    (os.path.realpath) and open every file through that folder. The version it
+    replaces, and any version younger than KEEP_VERSIONS_SECONDS, is kept for
+    readers still opening it; older ones are removed. Sessions publishing the
+    same out_dir at once take turns on a lock file; the last one wins.
+
+    Returns:
+        str: out_dir.
+    """
+    parent, name = os.path.split(os.path.abspath(out_dir))
+    with open(os.path.join(parent, f".{name}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        version = f"{name}.v-{uuid.uuid4().hex}"
+        os.rename(tmp_dir, os.path.join(parent, version))
+
+        previous = os.readlink(out_dir) if os.path.islink(out_dir) else None
+        if previous is None and os.path.isdir(out_dir):
+            # A folder written before out_dir was a link: it becomes the previous version
+            previous = f"{name}.v-{uuid.uuid4().hex}"
+            os.rename(out_dir, os.path.join(parent, previous))
+
+        link = os.path.join(parent, f".{name}.link-{uuid.uuid4().hex}")
+        os.symlink(version, link)
+        os.replace(link, out_dir)
+
+        expired = time.time() - KEEP_VERSIONS_SECONDS
+        for entry in os.listdir(parent):
+            path = os.path.join(parent, entry)
+            if (entry.startswith(f"{name}.v-") and entry not in (version, previous)
+                    and os.path.getmtime(path) < expired):
+                shutil.rmtree(path, ignore_errors=True)
+    return out_dir
+
+
+def _schema_for(columns):
+    return pa.schema([field for field in PAGEVIEW_SCHEMA if field.name in columns])
+
+
+def write_dataset(df, out_dir):
+    """
+    Writes a monthly pageview table as a year/month partitioned Parquet dataset.
+
+    Any existing files in out_dir are replaced.
+
+    Args:
+        df (pd.DataFrame): Rows shaped like song_st.csv or articles_song3.csv.
+        out_dir (str): Dataset folder.
+    """
+    table = pa.Table.from_pandas(df, schema=_schema_for(df.columns), preserve_index=False)
+    ds.write_dataset(
+        table,
+        out_dir,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+
+
+def convert_csv(csv_path, name=None):
+    """Converts one monthly csv (song_st.csv, articles_song3.csv) to a Parquet dataset."""
+    if name is None:
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+    df = _read_csv(csv_path, SONG_DTYPES)
+    out_dir = dataset_path(name)
+    write_dataset(df, out_dir)
+    return out_dir
+
+
+def read_dataset(path, year=None, month=None, columns=None):
+    """
+    Reads a partitioned dataset into pandas, optionally for a single year and/or month.
+
+    Filtering on year or month only opens the matching partition folders.
+
+    Args:
+        path (str): Dataset folder.
+        year (int): Only read this year.
+        month (int): Only read this month.
+        columns (list): Only read these columns.
+
+    Returns:
+        pd.DataFrame: Rows with the same columns and types as data_loader.load_songs().
+    """
+    # One version of a published folder for the whole read (see publish_dir())
+    dataset = ds.dataset(os.path.realpath(path), format="parquet", partitioning=PARTITIONING)
+
+    condition = None
+    if year is not None:
+        condition = ds.field("year") == year
+    if month is not None:
+        month_condition = ds.field("month") == month
+        condition = month_condition if condition is None else condition & month_condition
+
+    table = dataset.to_table(columns=columns, filter=condition)
+    df = table.to_pandas()
+
+    # Song titles are mostly unique, so keep them as plain strings like the csv loader does
+    if "article" in df.columns:
+        df["article"] = df["article"].astype(object)
+
+    # Same column order as the csv, with the partition columns first
+    df = df[[col for col in PAGEVIEW_SCHEMA.names if col in df.columns]]
+
+    # Partition files are read in folder order, so put the rows back in month order
+    sort_cols = [col for col in ("year", "month") if col in df.columns]
+    if sort_cols:
+        df = df.sort_values(sort_cols, kind="mergesort").reset_index(drop=True)
+
+    return df
+
+
+def read_month(name, year, month, columns=None):
+    """Reads one month of a dataset, e.g. read_month("song_st", 2024, 4)."""
+    return read_dataset(dataset_path(name), year=year, month=month, columns=columns)
+
+
+def file_sizes(path):
+    """Total size in bytes of every Parquet file in a dataset folder."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            if file.endswith(".parquet"):
+                total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+if __name__ == "__main__":
+    csv_files = sys.argv[1:] or ["song_st.csv", "articles_song3.csv"]
+    for csv_file in csv_files:
+        csv_path = os.path.join(DATA_DIR, csv_file)
+        out_dir = convert_csv(csv_path)
+        print(f"{csv_file}: {os.path.getsize(csv_path):,} bytes -> "
+              f"{file_sizes(out_dir):,} bytes in {os.path.relpath(out_dir, DATA_DIR)}")
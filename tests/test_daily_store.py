@@ -0,0 +1,67 @@
+# Description: Tests for daily_store.py: rebuilding the store and its spike metrics
+#
+# Usage:
+#     python -m pytest tests/test_daily_store.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_store import SPIKE_MIN_HISTORY, DailyStore, build_daily_store, detect_spikes, longest_runs  # noqa: E402
+import storage  # noqa: E402
+
+
+def test_flat_series_has_no_spikes():
+    # A steady song, well above the minimum views from January 1 on
+    views = np.full((3, 366), 50_000, dtype=np.int32)
+    spikes = detect_spikes(views)
+    assert not spikes.any()
+    assert (longest_runs(spikes) == 0).all()
+
+
+def test_first_days_are_never_spikes():
+    # Nothing at all, then a big day before there is enough history to compare with
+    views = np.zeros((1, 366), dtype=np.int32)
+    views[0, SPIKE_MIN_HISTORY - 1] = 1_000_000
+    assert not detect_spikes(views).any()
+
+
+def test_release_day_is_a_spike():
+    views = np.full((1, 366), 2_000, dtype=np.int32)
+    views[0, 100:103] = 40_000
+    spikes = detect_spikes(views)
+    assert np.flatnonzero(spikes[0]).tolist() == [100, 101, 102]
+    assert longest_runs(spikes).tolist() == [3]
+
+
+def make_daily(songs):
+    """fetch_daily() rows: song i gets i + 1 views on each of the first 10 days."""
+    return pd.DataFrame({
+        "key": [f"Q{song}" for song in range(songs) for day in range(10)],
+        "qid": [f"Q{song}" for song in range(songs) for day in range(10)],
+        "article": [f"Song_{song}_(song)" for song in range(songs) for day in range(10)],
+        "day": [day for song in range(songs) for day in range(10)],
+        "views": [song + 1 for song in range(songs) for day in range(10)],
+    })
+
+
+def test_rebuild_leaves_open_stores_intact(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "KEEP_VERSIONS_SECONDS", 0)
+    out_dir = str(tmp_path / "daily")
+    build_daily_store(make_daily(5), 2024, out_dir, repair_encoding=False)
+    before = DailyStore(out_dir)
+
+    # Fewer songs: rewriting views.npy in place would cut the open memory map short
+    build_daily_store(make_daily(2), 2024, out_dir, repair_encoding=False)
+    build_daily_store(make_daily(3), 2024, out_dir, repair_encoding=False)
+    after = DailyStore(out_dir)
+
+    assert before.views.shape == (5, 366)
+    assert before.views[:, :10].sum(axis=1).tolist() == [50, 40, 30, 20, 10]
+    assert after.songs["article"].tolist() == ["Song 2", "Song 1", "Song 0"]
+    assert after.views[:, :10].sum(axis=1).tolist() == [30, 20, 10]
+    # Only the current store and the one it replaced are kept
+    assert len([entry for entry in os.listdir(tmp_path) if entry.startswith("daily.v-")]) == 2
@@ -0,0 +1,76 @@
+# Description: Golden-output tests for lyrics_clean.py
+#
+# Every SOURCE_PIPELINES entry is run on a small fixed lyrics sample and must
+# give exactly the same output as the notebook's cleaning functions (kept
+# verbatim in benchmarks/bench_lyrics_clean.py), so a faster version can't
+# quietly change the cleaned text.
+#
+# Usage:
+#     python -m pytest tests/test_lyrics_clean.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import lyrics_clean  # noqa: E402
+from bench_lyrics_clean import local_sources, reference  # noqa: E402
+
+# Hand-picked texts that hit each rule of the notebook functions
+EDGE_CASES = [
+    np.nan,
+    None,
+    "",
+    "   ",
+    "no marker at all",
+    "Espresso Lyrics\r\n\r\nNow he's thinkin' 'bout me every night, oh\nIs it that sweet?\nEdit",
+    "Song Lyrics\nfirst line\n\n\nsecond line Report a problem",
+    "Song Lyrics line one\nline two Thanks to Anna for the correction.",
+    "LYRICS: shouted marker\nand text",
+    "Contributors Title Lyrics -> arrow marker",
+    "Lyrics : Artist Name\nI know, I know, I know (ooh) You might also like $5 more",
+    "Lyrics : Artist\nverse $12 with money See Them Live tonight",
+    "Deutsch Lyrics: Übersetzung\nEIN Lied über Café und Straße",
+    "Intro: Instrumental\nCHORUS yeah\nPost- credits",
+    "Türkçe: çok güzel\nGet tickets now",
+    "The, the; a an! punctuation... and stopwords?\tTabs\tand  double  spaces",
+    "unicode — dashes – and “quotes” and emoji 🎵 and naïve façade",
+    "online lyrics : text\nLyrics Instrumental",
+    "line\rbreaks\r\rin\n\rmixed\n\nstyles",
+    "x" * 50 + " lyrics " + "y" * 50,
+]
+
+
+def sample(source):
+    """EDGE_CASES plus the first 40 local lyrics dressed up like source."""
+    dressed = local_sources()[source].head(40)
+    return pd.concat([pd.Series(EDGE_CASES, dtype=object), dressed.astype(object)], ignore_index=True)
+
+
+def assert_identical(expected, actual):
+    assert len(expected) == len(actual)
+    for position, (a, b) in enumerate(zip(expected, actual)):
+        if isinstance(a, float) and a != a:
+            assert isinstance(b, float) and b != b, position
+            continue
+        assert type(a) is type(b), (position, a, b)
+        assert a == b, (position, a, b)
+
+
+@pytest.mark.parametrize("source", list(lyrics_clean.SOURCE_PIPELINES))
+def test_pipeline_matches_the_notebook(source):
+    column = sample(source)
+    expected = reference(source, column).tolist()
+    assert_identical(expected, lyrics_clean.normalize_column(column, source).tolist())
+
+
+@pytest.mark.parametrize("source", ["kaggle2", "baseline"])
+def test_workers_give_the_same_output(source):
+    column = sample(source)
+    expected = reference(source, column).tolist()
+    assert_identical(expected, lyrics_clean.normalize_column(column, source, workers=2, chunk_size=16).tolist())
@@ -0,0 +1,37 @@
+# Description: Tests for song_search.py
+#
+# Usage:
+#     python -m pytest tests/test_song_search.py
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import load_songs  # noqa: E402
+from song_search import build_search_index  # noqa: E402
+
+
+def test_songs_without_an_artist_are_indexed():
+    data = pd.DataFrame({
+        'article': ["Espresso", "Espresso", "One Spark"],
+        'artist': pd.Categorical(["Sabrina Carpenter", "Sabrina Carpenter", None]),
+        'qid': pd.Categorical(["Q1", "Q1", None]),
+        'monthly_pageviews': [10, 20, 5],
+    })
+    index = build_search_index(data)
+
+    assert len(index) == 2
+    results = index.search("one spark")
+    assert results['article'].tolist() == ["One Spark"]
+    assert results['artist'].tolist() == [""]
+    assert index.search("nan").empty
+
+
+def test_every_article_is_found_by_its_title():
+    data = load_songs("song_st.csv")
+    index = build_search_index(data)
+
+    missing = [article for article in data['article'].unique() if article not in index.titles(article, k=len(index))]
+    assert missing == []
@@ -0,0 +1,66 @@
+# Description: Tests for publishing datasets with storage.publish_dir()
+#
+# Usage:
+#     python -m pytest tests/test_storage.py
+import os
+import sys
+import threading
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pageview_engine import save_source  # noqa: E402
+from storage import read_dataset  # noqa: E402
+
+
+def make_month(views):
+    return pd.DataFrame({
+        "year": [2023] * 3,
+        "month": [1, 2, 3],
+        "article": ["A", "B", "C"],
+        "qid": ["Q1", "Q2", "Q3"],
+        "monthly_pageviews": [views] * 3,
+        "genre": ["pop"] * 3,
+        "artist": ["X"] * 3,
+        "project": ["en.wikipedia"] * 3,
+    })
+
+
+def test_concurrent_saves_never_hide_the_dataset(tmp_path):
+    out_dir = str(tmp_path / "songs_en_wikipedia_2023")
+    save_source(make_month(0), out_dir)
+
+    errors, reads = [], []
+    done = threading.Event()
+
+    def build(views):
+        try:
+            for _ in range(5):
+                save_source(make_month(views), out_dir)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        while not done.is_set():
+            try:
+                reads.append(read_dataset(out_dir)["monthly_pageviews"].tolist())
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    builders = [threading.Thread(target=build, args=(views,)) for views in (1, 2, 3)]
+    for thread in readers + builders:
+        thread.start()
+    for thread in builders:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    # Every read saw one whole dataset
+    assert reads and all(len(set(values)) == 1 and len(values) == 3 for values in reads)
+    assert read_dataset(out_dir)["monthly_pageviews"].nunique() == 1
+    assert os.path.islink(out_dir) and os.path.isdir(os.path.realpath(out_dir))
+    assert not [entry for entry in os.listdir(tmp_path) if ".tmp-" in entry]
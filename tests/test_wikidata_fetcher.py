@@ -0,0 +1,188 @@
+# Description: Tests for wikidata_fetcher.py against a local stub of the Wikidata API
+#
+# The stub is an http.server on localhost that answers wbgetentities calls
+# from a small in-memory set of entities, and can be told to fail the next
+# calls (HTTP 500 or a maxlag error) or every call that asks for a given QID.
+#
+# Usage:
+#     python -m pytest tests/test_wikidata_fetcher.py
+import json
+import os
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wikidata_fetcher import BATCH_SIZE, WikidataFetcher  # noqa: E402
+
+GENRE = "Q188450"
+
+
+def make_song(qid, revision=1):
+    return {
+        "id": qid,
+        "lastrevid": revision,
+        "labels": {"en": {"language": "en", "value": f"Song {qid}"}},
+        "descriptions": {"en": {"language": "en", "value": "song"}},
+        "claims": {"P136": [{"mainsnak": {"datavalue": {"type": "wikibase-entityid", "value": {"id": GENRE}}}}]},
+    }
+
+
+class StubWikidata:
+    """What the stub server answers with, and every call it got."""
+
+    def __init__(self):
+        self.entities = {
+            GENRE: {"id": GENRE, "lastrevid": 1, "labels": {"en": {"value": "pop music"}}},
+            "P136": {"id": "P136", "lastrevid": 1, "labels": {"en": {"value": "genre"}}},
+        }
+        self.calls = []
+        # "500" or "maxlag" for each of the next calls
+        self.fail_next = []
+        # Every call asking for one of these QIDs gets an HTTP 500
+        self.broken = set()
+        self.lock = threading.Lock()
+
+    def answer(self, params):
+        ids = params["ids"].split("|")
+        with self.lock:
+            self.calls.append({"ids": ids, "props": params.get("props", "")})
+            failure = self.fail_next.pop(0) if self.fail_next else None
+        if failure == "500" or self.broken & set(ids):
+            return 500, {}
+        if failure == "maxlag":
+            return 200, {"error": {"code": "maxlag", "info": "Waiting for a database server: 6 seconds lagged"}}
+        entities = {}
+        for entity_id in ids:
+            entity = self.entities.get(entity_id)
+            entities[entity_id] = dict(entity) if entity else {"id": entity_id, "missing": ""}
+        return 200, {"entities": entities}
+
+    def entity_calls(self):
+        """Calls that downloaded full entities (not just their revisions or labels)."""
+        return [call for call in self.calls if "claims" in call["props"] and "info" in call["props"]]
+
+
+@pytest.fixture
+def stub():
+    state = StubWikidata()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+            status, body = state.answer(params)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}/w/api.php"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def make_fetcher(stub, cache_dir, **kwargs):
+    settings = {"requests_per_second": 0, "backoff": 0.01, "max_retries": 3, "timeout": 5}
+    settings.update(kwargs)
+    return WikidataFetcher(api_url=stub.url, cache_dir=str(cache_dir), **settings)
+
+
+def add_songs(stub, count):
+    qids = [f"Q{number}" for number in range(1000, 1000 + count)]
+    for qid in qids:
+        stub.entities[qid] = make_song(qid)
+    return qids
+
+
+def test_batches_of_50_ids(stub, tmp_path):
+    qids = add_songs(stub, 120)
+    records = make_fetcher(stub, tmp_path).refresh(qids)
+
+    assert sorted(len(call["ids"]) for call in stub.entity_calls()) == [20, BATCH_SIZE, BATCH_SIZE]
+    assert all(len(call["ids"]) <= BATCH_SIZE for call in stub.calls)
+    assert [record["QID"] for record in records] == qids
+    assert all(record["status"] == "success" for record in records)
+    assert records[0]["attributes"] == {"genre": "pop music"}
+
+
+def test_retries_server_errors(stub, tmp_path):
+    qids = add_songs(stub, 3)
+    stub.fail_next = ["500", "500"]
+    fetcher = make_fetcher(stub, tmp_path)
+    records = fetcher.refresh(qids)
+
+    assert all(record["status"] == "success" for record in records)
+    assert fetcher.stats["retries"] == 2
+
+
+def test_retries_maxlag(stub, tmp_path):
+    qids = add_songs(stub, 3)
+    stub.fail_next = ["maxlag"]
+    fetcher = make_fetcher(stub, tmp_path)
+    records = fetcher.refresh(qids)
+
+    assert all(record["status"] == "success" for record in records)
+    assert fetcher.stats["retries"] == 1
+
+
+def test_gives_up_after_max_retries(stub, tmp_path):
+    qids = add_songs(stub, 3)
+    stub.fail_next = ["maxlag"] * 3
+    fetcher = make_fetcher(stub, tmp_path, max_retries=2)
+    records = fetcher.refresh(qids)
+
+    assert [record["status"] for record in records] == ["failed"] * 3
+    assert fetcher.stats["retries"] == 2
+
+
+def test_skips_entities_whose_revision_is_cached(stub, tmp_path):
+    qids = add_songs(stub, 60)
+    make_fetcher(stub, tmp_path).refresh(qids)
+    stub.calls.clear()
+
+    # Same revisions: only the revision check, no entity downloads
+    fetcher = make_fetcher(stub, tmp_path)
+    records = fetcher.refresh(qids)
+    assert stub.entity_calls() == []
+    assert fetcher.stats["cached"] == 60 and fetcher.stats["downloaded"] == 0
+    assert all(record["status"] == "success" for record in records)
+
+    # A new revision of one song downloads just that song
+    stub.entities[qids[7]] = make_song(qids[7], revision=2)
+    stub.calls.clear()
+    fetcher = make_fetcher(stub, tmp_path)
+    fetcher.refresh(qids)
+    assert [call["ids"] for call in stub.entity_calls()] == [[qids[7]]]
+    assert fetcher.stats["downloaded"] == 1
+
+
+def test_failed_ids_are_retried_on_the_next_run(stub, tmp_path):
+    qids = add_songs(stub, 60)
+    # The second batch (10 songs) fails every time in the first run
+    stub.broken = {qids[55]}
+    fetcher = make_fetcher(stub, tmp_path, max_retries=1)
+    records = fetcher.refresh(qids)
+    failed = [record["QID"] for record in records if record["status"] == "failed"]
+    assert failed == qids[BATCH_SIZE:]
+    assert fetcher.stats["failed"] == 10
+
+    stub.broken = set()
+    stub.calls.clear()
+    fetcher = make_fetcher(stub, tmp_path)
+    records = fetcher.refresh(qids)
+    assert all(record["status"] == "success" for record in records)
+    assert [call["ids"] for call in stub.entity_calls()] == [qids[BATCH_SIZE:]]
+    assert fetcher.stats["cached"] == 50 and fetcher.stats["downloaded"] == 10
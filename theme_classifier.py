@@ -0,0 +1,393 @@
+# Description: Batched, cached zero-shot theme classification for song lyrics
+#
+# The notebook labels every lyric with one big call to
+# pipeline("zero-shot-classification", model="facebook/bart-large-mnli"),
+# scoring all three themes against the full, untruncated lyrics, and has to redo
+# every song whenever one is added. This module is the reusable version for
+# CPU-only machines:
+#   - lyrics are split into token windows (BART only reads 1024 tokens), every
+#     window is scored and the window scores are averaged per song
+#   - windows are sorted by length and grouped into batches with a token budget,
+#     so short songs aren't padded up to the longest one
+#   - results are saved in theme_cache.jsonl, keyed by a hash of the lyrics plus
+#     the model, labels and settings, so only new or changed songs get scored
+#   - the work can optionally be split across several processes
+#
+# Songs are identified by their qid the whole way through (never by the lyrics
+# text), and the scores of every label are kept in theme_scores.csv, so the
+# themes can be re-assigned with a different threshold without the model.
+#
+# Usage:
+#     python theme_classifier.py                    # main.csv -> theme_scores.csv + clean_classification.csv
+#     python theme_classifier.py main.csv --workers 2 --threads 4
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+
+from data_loader import DATA_DIR
+
+MODEL_NAME = "facebook/bart-large-mnli"
+SONG_LABELS = ["love", "politics", "actualization"]
+HYPOTHESIS_TEMPLATE = "The theme of this song is {}."
+CACHE_PATH = os.path.join(DATA_DIR, "theme_cache.jsonl")
+SCORES_PATH = os.path.join(DATA_DIR, "theme_scores.csv")
+
+
+def lyrics_hash(text):
+    """Short, stable key for a lyric text."""
+    return hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+
+
+class HuggingFaceScorer:
+    """
+    Scores texts with a transformers zero-shot pipeline on the CPU.
+
+    Only loads the model the first time it's used, so the class can be created
+    (and sent to a worker process) cheaply.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, threads=None):
+        self.model_name = model_name
+        self.threads = threads
+        self._pipeline = None
+
+    def _load(self):
+        if self._pipeline is None:
+            import torch
+            from transformers import pipeline
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            self._pipeline = pipeline("zero-shot-classification", model=self.model_name, device=-1)
+        return self._pipeline
+
+    @property
+    def tokenizer(self):
+        return self._load().tokenizer
+
+    def __call__(self, texts, labels, template):
+        """Returns one {label: score} dict per text."""
+        classifier = self._load()
+        results = classifier(
+            texts,
+            candidate_labels=labels,
+            hypothesis_template=template,
+            multi_label=False,
+            batch_size=len(texts),
+        )
+        if isinstance(results, dict):
+            results = [results]
+        return [dict(zip(result["labels"], result["scores"])) for result in results]
+
+
+# The scorer used inside each worker process (set by _init_worker)
+_worker_scorer = None
+
+
+def _init_worker(scorer):
+    global _worker_scorer
+    _worker_scorer = scorer
+
+
+def _score_shard(args):
+    classifier_settings, texts = args
+    classifier = ThemeClassifier(scorer=_worker_scorer, cache_path=None, **classifier_settings)
+    return classifier._score(texts)
+
+
+class ThemeClassifier:
+    """
+    Zero-shot theme classifier with length-bucketed batching, chunking and a result cache.
+
+    Args:
+        labels (list): Candidate themes.
+        template (str): Hypothesis template passed to the model.
+        model_name (str): Hugging Face model id (also part of the cache key).
+        scorer (callable): Takes (texts, labels, template) and returns one
+            {label: score} dict per text. Defaults to HuggingFaceScorer(model_name).
+        max_chunk_tokens (int): Longest window of lyrics scored at once.
+        batch_tokens (int): Token budget per batch (longest window x batch size).
+        max_batch_size (int): Upper limit on windows per batch.
+        cache_path (str): jsonl file for cached scores (None disables the cache).
+        workers (int): Processes to split the scoring across (1 = this process only).
+        threads (int): Torch threads per worker process.
+    """
+
+    def __init__(self, labels=None, template=HYPOTHESIS_TEMPLATE, model_name=MODEL_NAME, scorer=None,
+                 max_chunk_tokens=512, batch_tokens=8192, max_batch_size=32,
+                 cache_path=CACHE_PATH, workers=1, threads=None):
+        self.labels = list(labels) if labels is not None else list(SONG_LABELS)
+        self.template = template
+        self.model_name = model_name
+        self.scorer = scorer if scorer is not None else HuggingFaceScorer(model_name, threads)
+        self.max_chunk_tokens = max_chunk_tokens
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.cache_path = cache_path
+        self.workers = workers
+        self.threads = threads
+
+        self.config_key = lyrics_hash(json.dumps({
+            "model": model_name,
+            "labels": sorted(self.labels),
+            "template": template,
+            "max_chunk_tokens": max_chunk_tokens,
+        }, sort_keys=True))
+        self.cache = self._read_cache()
+        self.stats = {}
+
+    # --- Cache ---
+
+    def _read_cache(self):
+        cache = {}
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return cache
+        with open(self.cache_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run that was killed mid-write can leave a partial last line
+                    continue
+                if entry.get("config") == self.config_key:
+                    cache[entry["lyrics_hash"]] = entry["scores"]
+        return cache
+
+    def _write_cache(self, new_scores):
+        if not self.cache_path or not new_scores:
+            return
+        with open(self.cache_path, "a", encoding="utf-8") as file:
+            for key, scores in new_scores.items():
+                file.write(json.dumps({"config": self.config_key, "lyrics_hash": key, "scores": scores}) + "\n")
+
+    # --- Tokens and chunks ---
+
+    def _tokenizer(self):
+        return getattr(self.scorer, "tokenizer", None)
+
+    def _chunks(self, text):
+        """Splits a lyric into windows of at most max_chunk_tokens tokens."""
+        text = "" if text is None or (isinstance(text, float) and pd.isna(text)) else str(text)
+        tokenizer = self._tokenizer()
+
+        if tokenizer is None:
+            # Custom scorers without a tokenizer: count words instead
+            words = text.split()
+            if not words:
+                return [(text, 1)]
+            return [
+                (" ".join(words[start:start + self.max_chunk_tokens]), len(words[start:start + self.max_chunk_tokens]))
+                for start in range(0, len(words), self.max_chunk_tokens)
+            ]
+
+        ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+        if len(ids) <= self.max_chunk_tokens:
+            return [(text, max(len(ids), 1))]
+        return [
+            (tokenizer.decode(ids[start:start + self.max_chunk_tokens]), len(ids[start:start + self.max_chunk_tokens]))
+            for start in range(0, len(ids), self.max_chunk_tokens)
+        ]
+
+    def _batches(self, windows):
+        """Groups (song index, text, tokens) windows into length-sorted batches under the token budget."""
+        ordered = sorted(windows, key=lambda window: window[2])
+        batch, longest = [], 0
+        for window in ordered:
+            longest_if_added = max(longest, window[2])
+            if batch and (longest_if_added * (len(batch) + 1) > self.batch_tokens
+                          or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, longest_if_added = [], window[2]
+            batch.append(window)
+            longest = longest_if_added
+        if batch:
+            yield batch
+
+    # --- Scoring ---
+
+    def _score(self, texts):
+        """Scores texts (no cache). Returns one {label: score} dict per text."""
+        windows = []
+        for index, text in enumerate(texts):
+            for chunk, tokens in self._chunks(text):
+                windows.append((index, chunk, tokens))
+
+        # Token-weighted average of the window scores of each song
+        totals = [dict.fromkeys(self.labels, 0.0) for _ in texts]
+        weights = [0 for _ in texts]
+        for batch in self._batches(windows):
+            results = self.scorer([window[1] for window in batch], self.labels, self.template)
+            for (index, _, tokens), scores in zip(batch, results):
+                for label in self.labels:
+                    totals[index][label] += scores.get(label, 0.0) * tokens
+                weights[index] += tokens
+
+        return [
+            {label: total / weights[index] for label, total in totals[index].items()}
+            for index in range(len(texts))
+        ]
+
+    def _score_parallel(self, texts):
+        settings = {
+            "labels": self.labels,
+            "template": self.template,
+            "model_name": self.model_name,
+            "max_chunk_tokens": self.max_chunk_tokens,
+            "batch_tokens": self.batch_tokens,
+            "max_batch_size": self.max_batch_size,
+        }
+        shard_size = -(-len(texts) // self.workers)
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(len(shards), initializer=_init_worker, initargs=(self.scorer,)) as pool:
+            results = pool.map(_score_shard, [(settings, shard) for shard in shards])
+        return [scores for shard in results for scores in shard]
+
+    def classify(self, texts):
+        """
+        Returns one {label: score} dict per text, only running the model on uncached lyrics.
+
+        Also fills self.stats with the number of songs, cache hits and songs per second.
+        """
+        start = time.perf_counter()
+        texts = list(texts)
+        keys = [lyrics_hash(text) for text in texts]
+
+        # Each distinct lyric is scored once, even if several songs share it
+        todo = {}
+        for key, text in zip(keys, texts):
+            if key not in self.cache and key not in todo:
+                todo[key] = text
+
+        new_scores = {}
+        if todo:
+            todo_texts = list(todo.values())
+            if self.workers > 1 and len(todo_texts) > 1:
+                scored = self._score_parallel(todo_texts)
+            else:
+                scored = self._score(todo_texts)
+            new_scores = dict(zip(todo.keys(), scored))
+            self.cache.update(new_scores)
+            self._write_cache(new_scores)
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "songs": len(texts),
+            "cached": len(texts) - sum(1 for key in keys if key in new_scores),
+            "scored": len(new_scores),
+            "seconds": elapsed,
+            "songs_per_second": len(new_scores) / elapsed if new_scores and elapsed > 0 else 0.0,
+        }
+        return [self.cache[key] for key in keys]
+
+    def classify_frame(self, df, text_column="lyrics"):
+        """Adds one score_<label> column per label and the winning "theme" to a copy of df."""
+        scores = self.classify(df[text_column].tolist())
+        result = df.copy()
+        for label in self.labels:
+            result[f"score_{label}"] = [song_scores[label] for song_scores in scores]
+        result["theme"] = assign_themes(result, self.labels)
+        return result
+
+
+def score_columns(scores):
+    """The score_<label> columns of a scores table."""
+    return [col for col in scores.columns if col.startswith("score_")]
+
+
+def assign_themes(scores, labels=None, min_score=None, fallback="other"):
+    """
+    Picks each song's theme from its stored scores (no model needed).
+
+    Args:
+        scores (pd.DataFrame): Output of classify_songs() or theme_scores.csv.
+        labels (list): Only choose between these labels (default: all of them).
+        min_score (float): Songs whose best score is below this get the fallback theme.
+        fallback (str): Theme for songs below min_score.
+
+    Returns:
+        pd.Series: The theme of each row.
+    """
+    columns = [f"score_{label}" for label in labels] if labels is not None else score_columns(scores)
+    themes = scores[columns].idxmax(axis=1).str.replace("score_", "", regex=False)
+    if min_score is not None:
+        themes = themes.where(scores[columns].max(axis=1) >= min_score, fallback)
+    return themes
+
+
+def classify_songs(songs, classifier=None, key="qid", text_column="lyrics"):
+    """
+    Classifies each song once and returns its scores keyed by qid.
+
+    Args:
+        songs (pd.DataFrame): Songs with a key column and lyrics (monthly rows are fine).
+        classifier (ThemeClassifier): Defaults to a ThemeClassifier() with the usual labels.
+        key (str): Column that identifies a song.
+        text_column (str): Column with the lyrics.
+
+    Returns:
+        pd.DataFrame: key, one score_<label> column per label, and theme.
+    """
+    if classifier is None:
+        classifier = ThemeClassifier()
+    unique = songs.drop_duplicates(subset=key)[[key, text_column]].reset_index(drop=True)
+    scored = classifier.classify_frame(unique, text_column)
+    return scored.drop(columns=[text_column])
+
+
+def attach_themes(songs, scores, key="qid", columns=None):
+    """
+    Adds the theme (and optionally the scores) to songs with a many-to-one join on key.
+
+    Args:
+        songs (pd.DataFrame): e.g. song_st.csv rows or unique songs.
+        scores (pd.DataFrame): Output of classify_songs() or theme_scores.csv.
+        key (str): Column both tables share.
+        columns (list): Score-table columns to add (default: just "theme").
+
+    Returns:
+        pd.DataFrame: songs with the extra columns (empty where a song has no lyrics).
+    """
+    if columns is None:
+        columns = ["theme"]
+    # validate makes sure a song can never be duplicated by the join
+    return songs.merge(scores[[key] + columns], on=key, how="left", validate="many_to_one")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zero-shot theme classification of song lyrics.")
+    parser.add_argument("input", nargs="?", default=os.path.join(DATA_DIR, "main.csv"))
+    parser.add_argument("--scores", default=SCORES_PATH, help="Where to save the per-label scores")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "clean_classification.csv"),
+                        help="Unique songs with their theme")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to split the scoring across")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per process")
+    parser.add_argument("--max-chunk-tokens", type=int, default=512)
+    parser.add_argument("--batch-tokens", type=int, default=8192)
+    args = parser.parse_args()
+
+    songs = pd.read_csv(args.input)
+
+    classifier = ThemeClassifier(
+        workers=args.workers,
+        threads=args.threads,
+        max_chunk_tokens=args.max_chunk_tokens,
+        batch_tokens=args.batch_tokens,
+    )
+    scores = classify_songs(songs, classifier)
+    scores.to_csv(args.scores, index=False)
+
+    # Same columns as before: one row per song, without the monthly pageviews
+    unique_songs = songs.drop(columns=["year", "month", "monthly_pageviews"], errors="ignore")
+    unique_songs = unique_songs.drop_duplicates(subset="qid")
+    attach_themes(unique_songs, scores).to_csv(args.output, index=False)
+
+    stats = classifier.stats
+    print(f"{stats['songs']:,} songs ({stats['cached']:,} cached, {stats['scored']:,} scored) "
+          f"in {stats['seconds']:.1f}s -> {stats['songs_per_second']:.2f} songs/s")
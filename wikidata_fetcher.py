@@ -0,0 +1,442 @@
+# Description: Concurrent, cached and resumable Wikidata lookups for entity_results3.jsonl
+#
+# Every QID in qid_list3.txt is looked up on Wikidata to get its label,
+# description and attributes (genre, performer, ...). Instead of asking for one
+# entity at a time, this fetcher:
+#   - asks for up to 50 QIDs per wbgetentities call, with a few calls running at once
+#   - spaces the calls out (rate limit) and retries failed batches with backoff
+#   - saves each entity to wikidata_cache/ together with its revision number, so
+#     a re-run only downloads entities that changed on Wikidata since last time
+#
+# A run that gets interrupted can simply be started again, since every finished
+# batch is already in the cache.
+#
+# Usage:
+#     python wikidata_fetcher.py                       # qid_list3.txt -> entity_results3.jsonl
+#     python wikidata_fetcher.py my_qids.txt out.jsonl
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from data_loader import DATA_DIR
+
+API_URL = "https://www.wikidata.org/w/api.php"
+USER_AGENT = "CS234-song-pageviews/1.0 (Wellesley College course project)"
+CACHE_DIR = os.path.join(DATA_DIR, "wikidata_cache")
+
+# wbgetentities accepts at most 50 ids per call
+BATCH_SIZE = 50
+
+QID_PATTERN = re.compile(r"^Q\d+$")
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RateLimiter:
+    """Lets at most `rate` requests start per second across every running task."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class WikidataFetcher:
+    """
+    Looks up Wikidata entities in batches and keeps an on-disk cache of the results.
+
+    Args:
+        api_url (str): MediaWiki API endpoint.
+        cache_dir (str): Folder for the entity and label cache.
+        concurrency (int): Number of API calls allowed in flight at once.
+        requests_per_second (float): Rate limit for starting API calls.
+        max_retries (int): Retries for a batch that fails before giving up on it.
+        backoff (float): Seconds to wait before the first retry (doubled every time).
+        language (str): Language for labels and descriptions.
+        multi_valued (tuple): Attributes (e.g. "performer", "genre") that keep every
+            value as a list when an entity has more than one. Everything else keeps
+            the first value only, like entity_results3.jsonl always has.
+    """
+
+    def __init__(self, api_url=API_URL, cache_dir=CACHE_DIR, concurrency=4,
+                 requests_per_second=5, max_retries=4, backoff=1.0, language="en", timeout=60,
+                 multi_valued=()):
+        self.api_url = api_url
+        self.cache_dir = cache_dir
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.language = language
+        self.timeout = timeout
+        self.multi_valued = set(multi_valued)
+
+        self.entity_dir = os.path.join(cache_dir, "entities")
+        self.labels_path = os.path.join(cache_dir, "labels.json")
+        self.subclass_path = os.path.join(cache_dir, "subclass_of.json")
+        os.makedirs(self.entity_dir, exist_ok=True)
+        self.labels = self._read_json(self.labels_path, {})
+        # QID -> its "subclass of" (P279) parents, for the genre taxonomy
+        self.subclass_of = self._read_json(self.subclass_path, {})
+
+        self.stats = {"requests": 0, "retries": 0, "cached": 0, "downloaded": 0, "failed": 0}
+
+    # --- Cache helpers ---
+
+    @staticmethod
+    def _read_json(path, default=None):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return default
+
+    @staticmethod
+    def _write_json(path, value):
+        # Write to a temp file first so an interrupted run never leaves half a file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(value, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _cache_path(self, qid):
+        return os.path.join(self.entity_dir, f"{qid}.json")
+
+    def cached(self, qid):
+        """Returns the cached {"revision", "record"} for a QID, or None."""
+        return self._read_json(self._cache_path(qid))
+
+    # --- HTTP ---
+
+    def _request(self, params):
+        query = urllib.parse.urlencode({**params, "format": "json", "maxlag": 5})
+        request = urllib.request.Request(f"{self.api_url}?{query}", headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    async def _get(self, params):
+        """Calls the API, retrying with exponential backoff on errors and maxlag responses."""
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._limiter.wait()
+                self.stats["requests"] += 1
+                try:
+                    data = await asyncio.to_thread(self._request, params)
+                    error = data.get("error")
+                    if error is None:
+                        return data
+                    if error.get("code") != "maxlag":
+                        raise RuntimeError(error.get("info", error.get("code")))
+                    failure = RuntimeError(error.get("info", "maxlag"))
+                except (urllib.error.URLError, TimeoutError, ValueError, OSError) as e:
+                    failure = e
+
+            if attempt == self.max_retries:
+                raise failure
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    # --- Wikidata calls ---
+
+    async def _revisions(self, qids):
+        """Current revision id of every QID (None when Wikidata has no such entity)."""
+        revisions = {}
+
+        async def one_batch(batch):
+            data = await self._get({"action": "wbgetentities", "ids": "|".join(batch), "props": "info"})
+            for qid, entity in data.get("entities", {}).items():
+                revisions[qid] = None if "missing" in entity else entity.get("lastrevid")
+
+        await asyncio.gather(*(one_batch(batch) for batch in _batches(qids)), return_exceptions=True)
+        return revisions
+
+    async def _entities(self, qids):
+        """Full entities for the QIDs. Returns ({qid: entity}, {qid: error message})."""
+        entities, errors = {}, {}
+
+        async def one_batch(batch):
+            try:
+                data = await self._get({
+                    "action": "wbgetentities",
+                    "ids": "|".join(batch),
+                    "props": "info|labels|descriptions|claims",
+                    "languages": self.language,
+                })
+            except Exception as e:
+                for qid in batch:
+                    errors[qid] = f"API Error for {qid}: {e}"
+                return
+            for qid in batch:
+                entity = data.get("entities", {}).get(qid)
+                if entity is None or "missing" in entity:
+                    errors[qid] = f'API Error for {qid}: Could not find an entity with the ID "{qid}".'
+                else:
+                    entities[qid] = entity
+
+        await asyncio.gather(*(one_batch(batch) for batch in _batches(qids)))
+        return entities, errors
+
+    async def _fetch_labels(self, ids):
+        """Adds the labels of properties and linked entities to the label cache."""
+        missing = sorted(set(ids) - set(self.labels))
+
+        async def one_batch(batch):
+            try:
+                data = await self._get({
+                    "action": "wbgetentities",
+                    "ids": "|".join(batch),
+                    "props": "labels",
+                    "languages": self.language,
+                })
+            except Exception:
+                # The record just falls back to showing the id
+                return
+            for entity_id, entity in data.get("entities", {}).items():
+                label = entity.get("labels", {}).get(self.language, {}).get("value")
+                if label is not None:
+                    self.labels[entity_id] = label
+
+        await asyncio.gather(*(one_batch(batch) for batch in _batches(missing)))
+        if missing:
+            self._write_json(self.labels_path, self.labels)
+
+    async def _fetch_subclass_of(self, ids):
+        """Adds the "subclass of" (P279) parents and the labels of entities to the caches."""
+        missing = sorted(set(ids) - set(self.subclass_of))
+
+        async def one_batch(batch):
+            try:
+                data = await self._get({
+                    "action": "wbgetentities",
+                    "ids": "|".join(batch),
+                    "props": "labels|claims",
+                    "languages": self.language,
+                })
+            except Exception:
+                # Not cached, so the next run asks again
+                return
+            for entity_id, entity in data.get("entities", {}).items():
+                if "missing" in entity:
+                    continue
+                parents = self._datavalues(entity.get("claims", {}).get("P279", []))
+                self.subclass_of[entity_id] = [
+                    datavalue["value"].get("id") for datavalue in parents
+                    if datavalue.get("type") == "wikibase-entityid" and datavalue["value"].get("id")
+                ]
+                label = entity.get("labels", {}).get(self.language, {}).get("value")
+                if label is not None:
+                    self.labels[entity_id] = label
+
+        await asyncio.gather(*(one_batch(batch) for batch in _batches(missing)))
+        if missing:
+            self._write_json(self.subclass_path, self.subclass_of)
+            self._write_json(self.labels_path, self.labels)
+
+    # --- Turning an entity into a record ---
+
+    @staticmethod
+    def _datavalues(claims):
+        """The datavalues of every statement that has one, in order."""
+        datavalues = []
+        for claim in claims:
+            datavalue = claim.get("mainsnak", {}).get("datavalue")
+            if datavalue is not None:
+                datavalues.append(datavalue)
+        return datavalues
+
+    @staticmethod
+    def _referenced_ids(entity):
+        """Property ids and linked entity ids whose labels the record needs."""
+        ids = []
+        for prop, claims in entity.get("claims", {}).items():
+            ids.append(prop)
+            for datavalue in WikidataFetcher._datavalues(claims):
+                if datavalue.get("type") == "wikibase-entityid":
+                    ids.append(datavalue["value"].get("id"))
+        return [entity_id for entity_id in ids if entity_id]
+
+    def _format_value(self, datavalue):
+        value = datavalue.get("value")
+        kind = datavalue.get("type")
+        if kind == "wikibase-entityid":
+            entity_id = value.get("id")
+            return self.labels.get(entity_id, entity_id)
+        if kind == "time":
+            return value.get("time")
+        if kind == "monolingualtext":
+            return value.get("text")
+        if kind == "quantity":
+            return value.get("amount")
+        if kind == "globecoordinate":
+            return f"{value.get('latitude')}, {value.get('longitude')}"
+        return value if isinstance(value, str) else json.dumps(value)
+
+    def _to_record(self, qid, entity):
+        attributes = {}
+        for prop, claims in entity.get("claims", {}).items():
+            datavalues = self._datavalues(claims)
+            if not datavalues:
+                continue
+            name = self.labels.get(prop, prop)
+            if name in self.multi_valued and len(datavalues) > 1:
+                attributes[name] = [self._format_value(datavalue) for datavalue in datavalues]
+            else:
+                attributes[name] = self._format_value(datavalues[0])
+        return {
+            "QID": qid,
+            "status": "success",
+            "label": entity.get("labels", {}).get(self.language, {}).get("value"),
+            "description": entity.get("descriptions", {}).get(self.language, {}).get("value"),
+            "attributes": attributes,
+        }
+
+    # --- Main entry point ---
+
+    async def refresh_async(self, qids):
+        """
+        Returns one record per QID (in the given order), downloading only what changed.
+
+        Args:
+            qids (list): QIDs to look up (duplicates are ignored).
+
+        Returns:
+            list: Records shaped like the lines of entity_results3.jsonl.
+        """
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = RateLimiter(self.requests_per_second)
+
+        qids = list(dict.fromkeys(str(qid) for qid in qids))
+        records, errors = {}, {}
+
+        # Anything that isn't a QID would make Wikidata reject the whole batch
+        valid = []
+        for qid in qids:
+            if QID_PATTERN.match(qid):
+                valid.append(qid)
+            else:
+                errors[qid] = f'API Error for {qid}: Could not find an entity with the ID "{qid}".'
+
+        # 1. Check the revision of everything we already have cached
+        cache = {qid: self.cached(qid) for qid in valid}
+        cached_qids = [qid for qid in valid if cache[qid] is not None]
+        revisions = await self._revisions(cached_qids) if cached_qids else {}
+
+        stale = []
+        for qid in valid:
+            entry = cache[qid]
+            if (entry is not None and qid in revisions and revisions[qid] == entry.get("revision")
+                    and entry.get("multi_valued", []) == sorted(self.multi_valued)):
+                records[qid] = entry["record"]
+            else:
+                stale.append(qid)
+        self.stats["cached"] = len(records)
+
+        # 2. Download the new and changed entities
+        entities, fetch_errors = await self._entities(stale)
+        errors.update(fetch_errors)
+
+        # 3. Look up the labels of their properties and linked entities
+        referenced = [entity_id for entity in entities.values() for entity_id in self._referenced_ids(entity)]
+        await self._fetch_labels(referenced)
+
+        for qid, entity in entities.items():
+            record = self._to_record(qid, entity)
+            records[qid] = record
+            self._write_json(self._cache_path(qid), {
+                "revision": entity.get("lastrevid"),
+                "multi_valued": sorted(self.multi_valued),
+                "record": record,
+            })
+        self.stats["downloaded"] = len(entities)
+
+        # Failed entities are not cached, so the next run tries them again
+        for qid, message in errors.items():
+            records[qid] = {"QID": qid, "status": "failed", "error_message": message}
+        self.stats["failed"] = len(errors)
+
+        return [records[qid] for qid in qids]
+
+    def refresh(self, qids):
+        """Synchronous wrapper around refresh_async()."""
+        return asyncio.run(self.refresh_async(qids))
+
+    def fetch_labels(self, ids):
+        """
+        Returns the labels of entities or properties, downloading only the ones not in the label cache.
+
+        Args:
+            ids (list): QIDs or property ids.
+
+        Returns:
+            dict: id -> label for every id Wikidata has a label for.
+        """
+        async def run():
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._limiter = RateLimiter(self.requests_per_second)
+            await self._fetch_labels(ids)
+
+        asyncio.run(run())
+        return {entity_id: self.labels[entity_id] for entity_id in ids if entity_id in self.labels}
+
+    def fetch_subclass_of(self, ids):
+        """
+        Returns the "subclass of" parents of entities, downloading only the ones not cached yet.
+
+        Args:
+            ids (list): QIDs.
+
+        Returns:
+            dict: QID -> list of parent QIDs, for every QID Wikidata has.
+        """
+        async def run():
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._limiter = RateLimiter(self.requests_per_second)
+            await self._fetch_subclass_of(ids)
+
+        asyncio.run(run())
+        return {entity_id: self.subclass_of[entity_id] for entity_id in ids if entity_id in self.subclass_of}
+
+
+def read_qids(path):
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def write_jsonl(records, path):
+    with open(path, "w", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    qid_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, "qid_list3.txt")
+    out_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(DATA_DIR, "entity_results3.jsonl")
+
+    start = time.perf_counter()
+    fetcher = WikidataFetcher()
+    results = fetcher.refresh(read_qids(qid_path))
+    write_jsonl(results, out_path)
+
+    stats = fetcher.stats
+    print(f"{len(results):,} entities in {time.perf_counter() - start:.1f}s: "
+          f"{stats['cached']:,} unchanged, {stats['downloaded']:,} downloaded, {stats['failed']:,} failed "
+          f"({stats['requests']:,} API calls, {stats['retries']:,} retries)")